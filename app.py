@@ -8,11 +8,18 @@ import io
 import json
 import os
 import copy
-from datetime import datetime
+from datetime import datetime, timedelta
 # from google.cloud import firestore
 # from google.oauth2 import service_account
 # import json
-from revenue_logic import run_revenue_model
+from ingestion import STRATEGY_KEYS
+from input_cache import load_input_cached
+from sizing_sweep import run_sweep, sweep_grid, surfaces, SWEEP_METRICS
+from jobs import JobManager
+from chart_data import add_line, line_figure, window, DEFAULT_MAX_POINTS
+from rollups import build_rollups, rollup
+from project_store import ProjectStore, PROJECTS_DIR, LEGACY_FILE
+from financial_engine import calculate_all_kpis
 import streamlit as st
 import base64
 import os
@@ -364,8 +371,21 @@ def find_total_result_column(df):
             return col
     return None
 
+def chart_zoom_range(index, key):
+    """
+    Tijdvenster voor de tijdreeks grafieken (None = alles). Een kleiner venster wordt opnieuw
+    gedecimeerd en toont dus fijnere data; korte reeksen krijgen geen slider.
+    """
+    if not isinstance(index, pd.DatetimeIndex) or len(index) <= DEFAULT_MAX_POINTS:
+        return None
+    start, end = index.min().to_pydatetime(), index.max().to_pydatetime()
+    zoom = st.slider("Zoom to period", min_value=start, max_value=end, value=(start, end),
+                     step=timedelta(hours=1), format="DD-MM-YYYY HH:mm", key=key)
+    return None if zoom == (start, end) else zoom
+
+
 def resample_data(df, resolution):
-    """Resamples the DataFrame to the specified time resolution."""
+    """Resamples the DataFrame to the specified time resolution (per-column aggregation, see rollups.py)."""
     # Ensure the index is a DatetimeIndex
     if not isinstance(df.index, pd.DatetimeIndex):
         # Attempt to convert it if it's not
@@ -375,22 +395,8 @@ def resample_data(df, resolution):
             st.error("Could not process the DataFrame index as dates. Please ensure the 'datetime' column is correct.")
             return pd.DataFrame() # Return empty df on error
 
-    resolution_map = {
-        'Hourly': 'H',
-        'Daily': 'D',
-        'Monthly': 'M',
-        'Yearly': 'Y'
-    }
-    
-    if resolution == '15 Min (Original)':
-        return df
-        
-    rule = resolution_map.get(resolution)
-    if rule:
-        # Use .sum() for aggregation; it works for both financial and energy data
-        return df.resample(rule).sum()
-    
-    return df
+    # Energie en euro's worden opgeteld, SoC en prijzen gemiddeld (zie rollups.column_aggregation)
+    return rollup(df, resolution)
 
 
 # Add this dictionary to your script
@@ -409,6 +415,12 @@ st.set_page_config(
     page_icon="https://i.postimg.cc/3Ncw69QP/SCHILD-LOGO-REGULAR-BLAUW150.webp" 
 )
 # --- DATA (Connections, Defaults for Financial Model) ---
+@st.cache_resource
+def get_job_manager():
+    """Eén JobManager (process pool) per server proces, gedeeld door alle sessies."""
+    return JobManager()
+
+
 @st.cache_data
 def get_connection_data():
     csv_data = """name,transport_category,kw_max_offtake,kw_contract_offtake
@@ -473,29 +485,26 @@ if 'page' not in st.session_state:
     st.session_state.deleting_project = None
     st.session_state.revenue_results = None # Add for new tool
 
-PROJECTS_FILE = "flink_ems_projects.json"
+PROJECTS_FILE = LEGACY_FILE  # oud enkel bestand; wordt de eerste keer overgenomen in PROJECTS_DIR
+
+def get_project_store():
+    """Project opslag van deze sessie: één bestand per project, result frames als Parquet (project_store.py)."""
+    if 'project_store' not in st.session_state:
+        st.session_state.project_store = ProjectStore(PROJECTS_DIR, PROJECTS_FILE)
+    return st.session_state.project_store
 
 def save_projects():
-    with open(PROJECTS_FILE, 'w') as f:
-        projects_for_save = copy.deepcopy(st.session_state.projects)
-        for proj_name, proj_data in projects_for_save.items():
-            if 'results' in proj_data and isinstance(proj_data['results'].get('df'), pd.DataFrame):
-                projects_for_save[proj_name]['results']['df'] = proj_data['results']['df'].to_json()
-        json.dump(projects_for_save, f, indent=4)
+    # Alleen gewijzigde projecten worden herschreven
+    get_project_store().save(st.session_state.projects)
 
 def load_projects():
-    if os.path.exists(PROJECTS_FILE):
+    store = get_project_store()
+    if store.exists():
         try:
-            with open(PROJECTS_FILE, 'r') as f:
-                if os.path.getsize(PROJECTS_FILE) > 0:
-                    loaded_projects = json.load(f)
-                    for proj_name, proj_data in loaded_projects.items():
-                        if 'results' in proj_data and isinstance(proj_data['results'].get('df'), str):
-                            proj_data['results']['df'] = pd.read_json(proj_data['results']['df'])
-                    st.session_state.projects = loaded_projects
-                    st.sidebar.success("Projects loaded!")
-                else: st.session_state.projects = {}
-        except json.JSONDecodeError:
+            # Alleen de project bestanden; result frames volgen bij het openen (load_results)
+            st.session_state.projects = store.load()
+            st.sidebar.success("Projects loaded!")
+        except (json.JSONDecodeError, KeyError, OSError):
             st.sidebar.error("Could not load projects. Save file may be corrupt.")
             st.session_state.projects = {}
     else:
@@ -514,56 +523,6 @@ def display_header(title):
     st.markdown("---")
 
 # --- CORE CALCULATION & CHARTING FUNCTIONS (Financial Model) ---
-def calculate_all_kpis(i, tech_type):
-    kpis = {}
-    if tech_type == 'bess':
-        kpis['Capacity Factor'] = i['bess_capacity_kwh'] / i['bess_power_kw'] if i['bess_power_kw'] > 0 else 0
-        kpis['SoC Available'] = i['bess_max_soc'] - i['bess_min_soc']
-        kpis['Usable Capacity'] = i['bess_capacity_kwh'] * kpis['SoC Available']
-        kpis['C-Rate'] = i['bess_power_kw'] / kpis['Usable Capacity'] if kpis['Usable Capacity'] > 0 else 0
-        kpis['Round Trip Efficiency (RTE)'] = i['bess_charging_eff'] * i['bess_discharging_eff']
-        kpis['Purchase Costs'] = i['bess_capacity_kwh'] * i['bess_capex_per_kwh']
-        kpis['IT & Security Costs'] = i['bess_capacity_kwh'] * (i['bess_capex_it_per_kwh'] + i['bess_capex_security_per_kwh'])
-        base_capex = kpis['Purchase Costs'] + kpis['IT & Security Costs']
-        kpis['Civil Works'] = base_capex * i['bess_capex_civil_pct']
-        capex_subtotal = base_capex + kpis['Civil Works']
-        kpis['Permits & Fees'] = capex_subtotal * i['bess_capex_permits_pct']
-        kpis['Project Management'] = capex_subtotal * i['bess_capex_mgmt_pct']
-        kpis['Contingency'] = capex_subtotal * i['bess_capex_contingency_pct']
-        kpis['total_capex'] = capex_subtotal + kpis['Permits & Fees'] + kpis['Project Management'] + kpis['Contingency']
-        kpis['trading_income_y1'] = (i['bess_power_kw'] / 1000) * i['bess_income_trading_per_mw_year']
-        kpis['control_party_costs_y1'] = kpis['trading_income_y1'] * i['bess_income_ctrl_party_pct']
-        offtake_y1 = i['bess_cycles_per_year'] * kpis['Usable Capacity'] / i['bess_charging_eff']
-        kpis['supplier_costs_y1'] = (offtake_y1 / 1000) * i['bess_income_supplier_cost_per_mwh']
-        kpis['om_y1'] = i['bess_opex_om_per_year']
-        kpis['retribution_y1'] = i['bess_opex_retribution']
-        kpis['asset_mgmt_y1'] = (i['bess_power_kw'] / 1000) * i['bess_opex_asset_mgmt_per_mw_year']
-        kpis['insurance_y1'] = kpis['total_capex'] * i['bess_opex_insurance_pct']
-        kpis['property_tax_y1'] = kpis['total_capex'] * i['bess_opex_property_tax_pct']
-        kpis['overhead_y1'] = i['bess_capacity_kwh'] * i['bess_opex_overhead_per_kwh_year']
-        kpis['other_y1'] = i['bess_capacity_kwh'] * i['bess_opex_other_per_kwh_year']
-    elif tech_type == 'pv':
-        kpis['Total Peak Power'] = (i['pv_power_per_panel_wp'] * i['pv_panel_count']) / 1000
-        kpis['Production (Year 1)'] = kpis['Total Peak Power'] * i['pv_full_load_hours']
-        kpis['Purchase Costs'] = kpis['Total Peak Power'] * 1000 * i['pv_capex_per_wp']
-        capex_subtotal = kpis['Purchase Costs']
-        kpis['Civil Works'] = capex_subtotal * i['pv_capex_civil_pct']
-        capex_subtotal += kpis['Civil Works']
-        kpis['Security'] = capex_subtotal * i['pv_capex_security_pct']
-        kpis['Permits & Fees'] = capex_subtotal * i['pv_capex_permits_pct']
-        kpis['Project Management'] = capex_subtotal * i['pv_capex_mgmt_pct']
-        kpis['Contingency'] = capex_subtotal * i['pv_capex_contingency_pct']
-        kpis['total_capex'] = capex_subtotal + kpis['Security'] + kpis['Permits & Fees'] + kpis['Project Management'] + kpis['Contingency']
-        kpis['ppa_income_y1'] = (kpis['Total Peak Power'] * 1000 * i['pv_income_ppa_per_mwp']) + (kpis['Production (Year 1)'] * i['pv_income_ppa_per_kwh'])
-        kpis['curtailment_income_y1'] = (kpis['Total Peak Power'] * 1000 * i['pv_income_curtailment_per_mwp']) + (kpis['Production (Year 1)'] * i['pv_income_curtailment_per_kwh'])
-        kpis['om_y1'] = i['pv_opex_om_y1']
-        kpis['retribution_y1'] = i['pv_opex_retribution']
-        kpis['insurance_y1'] = kpis['total_capex'] * i['pv_opex_insurance_pct']
-        kpis['property_tax_y1'] = kpis['total_capex'] * i['pv_opex_property_tax_pct']
-        kpis['overhead_y1'] = kpis['total_capex'] * i['pv_opex_overhead_pct']
-        kpis['other_y1'] = kpis['total_capex'] * i['pv_opex_other_pct']
-    return kpis
-
 def run_financial_model(i, project_type):
     years_op = np.arange(1, int(i['project_term']) + 1)
     df = pd.DataFrame(index=years_op); df.index.name = 'Year'
@@ -628,7 +587,7 @@ def run_financial_model(i, project_type):
     df.loc[df.index > i['depr_period_pv'], 'depreciation_pv'] = 0
     df['result_before_eia'] = df['total_ebitda'] + df['depreciation_bess'] + df['depreciation_pv']
     eia_allowance = total_investment * i['eia_pct']
-    df['eia_applied'] = 0
+    df['eia_applied'] = 0.0
     if len(df) > 0 and df.loc[1, 'result_before_eia'] > 0:
         df.loc[1, 'eia_applied'] = min(eia_allowance, df.loc[1, 'result_before_eia'])
     df['result_before_tax'] = df['result_before_eia'] - df['eia_applied']
@@ -982,9 +941,7 @@ def show_battery_sizing_page():
 
     if run_button and uploaded_file is not None:
         try:
-            input_df = pd.read_csv(uploaded_file)
-            input_df["Datetime"] = pd.to_datetime(input_df["Datetime"], dayfirst=True)
-            input_df.set_index("Datetime", inplace=True)
+            input_df = load_input_cached(uploaded_file, dayfirst=True).frame
             
             results_data = {}
 
@@ -1031,11 +988,12 @@ def show_battery_sizing_page():
 
         # --- Charting Section ---
         st.subheader("📊 Analysis Charts")
-        df = results['df']
+        # Gedecimeerde WebGL lijnen (chart_data.py); inzoomen haalt fijnere data voor het venster op
+        df = window(results['df'], chart_zoom_range(results['df'].index, key="sizing_zoom"))
         
         fig1 = go.Figure()
-        fig1.add_trace(go.Scatter(x=df.index, y=df['net_load'], mode='lines', name='Original Net Load', line=dict(color='lightgray')))
-        fig1.add_trace(go.Scatter(x=df.index, y=df['grid_import_with_battery'], mode='lines', name='Final Grid Import', line=dict(color='royalblue', width=2)))
+        add_line(fig1, df.index, df['net_load'], name='Original Net Load', line=dict(color='lightgray'))
+        add_line(fig1, df.index, df['grid_import_with_battery'], name='Final Grid Import', line=dict(color='royalblue', width=2))
         
         if results['analysis_mode'] == 'Net Peak Shaving':
             fig1.add_hline(y=results['thresholds']['grid_import_threshold'], line_dash="dash", line_color="red", annotation_text="Max Import")
@@ -1047,13 +1005,13 @@ def show_battery_sizing_page():
         st.plotly_chart(fig1, use_container_width=True)
 
         fig2 = go.Figure()
-        fig2.add_trace(go.Scatter(x=df.index, y=df['battery_power'].clip(lower=0), mode='lines', name='Charging Power', fill='tozeroy', line=dict(color='green')))
-        fig2.add_trace(go.Scatter(x=df.index, y=df['battery_power'].clip(upper=0), mode='lines', name='Discharging Power', fill='tozeroy', line=dict(color='red')))
+        add_line(fig2, df.index, df['battery_power'].clip(lower=0), name='Charging Power', fill='tozeroy', line=dict(color='green'))
+        add_line(fig2, df.index, df['battery_power'].clip(upper=0), name='Discharging Power', fill='tozeroy', line=dict(color='red'))
         fig2.update_layout(title="Required Battery Power Profile", yaxis_title="Power (kW)")
         st.plotly_chart(fig2, use_container_width=True)
 
         fig3 = go.Figure()
-        fig3.add_trace(go.Scatter(x=df.index, y=df['battery_soc_kwh_cumulative'], mode='lines', name='Battery SOC', fill='tozeroy', line=dict(color='orange')))
+        add_line(fig3, df.index, df['battery_soc_kwh_cumulative'], name='Battery SOC', fill='tozeroy', line=dict(color='orange'))
         fig3.update_layout(title="Battery State of Charge (SOC)", yaxis_title="Energy (kWh)")
         st.plotly_chart(fig3, use_container_width=True)
 
@@ -1351,8 +1309,98 @@ def show_project_selection_page():
 #         st.session_state.revenue_results = None
 #         st.rerun()
 
+def show_sizing_sweep(uploaded_file, strategy_choice, base_params):
+    """Power x capacity sweep met een heatmap per strategie (revenue, cycli of infeasible dagen)."""
+    st.subheader("📐 Sizing Sweep (Power × Capacity)")
+    with st.expander("Configure sweep", expanded=False):
+        cols = st.columns(3)
+        power_min = cols[0].number_input("Power from (MW)", value=0.5, min_value=0.1, step=0.1, key="sweep_p_min")
+        power_max = cols[1].number_input("Power to (MW)", value=2.0, min_value=0.1, step=0.1, key="sweep_p_max")
+        power_steps = cols[2].number_input("Power steps", value=4, min_value=1, max_value=20, key="sweep_p_steps")
+        cols = st.columns(3)
+        cap_min = cols[0].number_input("Capacity from (MWh)", value=1.0, min_value=0.1, step=0.1, key="sweep_c_min")
+        cap_max = cols[1].number_input("Capacity to (MWh)", value=4.0, min_value=0.1, step=0.1, key="sweep_c_max")
+        cap_steps = cols[2].number_input("Capacity steps", value=4, min_value=1, max_value=20, key="sweep_c_steps")
+        strategies = st.multiselect("Strategies", ["Prioritize Self-Consumption", "Optimize on Day-Ahead Market",
+                                                   "Simple Battery Trading (Imbalance)",
+                                                   "Advanced Whole-System Trading (Imbalance)"],
+                                    default=[strategy_choice])
+        workers = st.number_input("Parallel processes", value=os.cpu_count() or 1, min_value=1, key="sweep_workers")
+
+        if st.button("Run Sweep", use_container_width=True):
+            if uploaded_file is None:
+                st.error("Please upload an input file.")
+            elif not strategies:
+                st.error("Select at least one strategy.")
+            else:
+                status_placeholder = st.empty()
+                try:
+                    input_data = load_input_cached(uploaded_file)
+                    runs, _ = run_sweep(input_data, strategies, sweep_grid(power_min, power_max, power_steps),
+                                        sweep_grid(cap_min, cap_max, cap_steps), base_params=base_params,
+                                        workers=int(workers),
+                                        progress_callback=lambda msg: status_placeholder.info(f"⏳ {msg}"))
+                    st.session_state.sweep_results = runs
+                except Exception as e:
+                    st.error(f"Sweep failed: {e}")
+                status_placeholder.empty()
+
+    runs = st.session_state.get('sweep_results')
+    if runs is None or runs.empty:
+        return
+    failed = runs[runs['error'].notna()]
+    if not failed.empty:
+        st.warning(f"{len(failed)} grid point(s) failed: {failed['error'].iloc[0]}")
+    if (runs['lp_engine'] != 'pyomo').any():
+        st.caption("LP engine: " + ", ".join(runs['lp_engine'].unique()) + " — revenue can differ slightly "
+                   "from a single run with the pyomo engine (same optimum, possibly a different schedule).")
+    metric =st.selectbox("Heatmap metric", list(SWEEP_METRICS), format_func=SWEEP_METRICS.get)
+    for strategy, surface in surfaces(runs).items():
+        fig = px.imshow(surface[metric], text_auto='.3s', aspect='auto', origin='lower',
+                        color_continuous_scale='RdYlGn' if metric == 'revenue' else 'Blues',
+                        labels={"x": "Capacity (MWh)", "y": "Power (MW)", "color": SWEEP_METRICS[metric]},
+                        title=f"{strategy}: {SWEEP_METRICS[metric]}")
+        st.plotly_chart(fig, use_container_width=True)
+    st.download_button("📥 Download Sweep Results (CSV)", data=runs.to_csv(index=False).encode('utf-8'),
+                       file_name=f"Sizing_Sweep_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv", mime="text/csv")
+
+
+@st.fragment(run_every=1.0)
+def show_revenue_job_progress():
+    """Voortgang van de lopende achtergrond simulatie; haalt het resultaat op als de job klaar is."""
+    job = get_job_manager().get(st.session_state.get('revenue_job'))
+    if job is None:
+        st.session_state.revenue_job = None
+        st.query_params.pop("job", None)
+        st.warning("The background simulation could not be found (the server may have been restarted).")
+        return
+
+    status = job.status
+    if status in ('queued', 'running', 'cancelling'):
+        messages = job.messages
+        if status == 'queued':
+            st.info("⏳ Waiting for a free worker...")
+        elif status == 'cancelling':
+            st.info("⏳ Cancelling... the run stops at its next progress update.")
+        else:
+            st.info(f"⏳ {messages[-1] if messages else 'Starting model run...'}")
+        with st.expander(f"Progress log ({len(messages)} messages)"):
+            st.text("\n".join(messages[-50:]))
+        if st.button("✖ Cancel Simulation", disabled=status == 'cancelling'):
+            job.cancel()
+            st.rerun(scope="fragment")
+    else:
+        st.session_state.revenue_results = job.result()
+        st.session_state.revenue_job = None
+        st.query_params.pop("job", None)
+        st.rerun()
+
+
 def show_revenue_analysis_page():
     display_header("Energy System Simulation ⚡")
+    # Na een refresh: lopende (of net afgeronde) job uit de URL weer oppakken
+    if not st.session_state.get('revenue_job') and "job" in st.query_params:
+        st.session_state.revenue_job = st.query_params["job"]
     st.write("Select a system configuration, upload your data, configure the parameters, and run the simulation.")
 
     # --- Configuration Sidebar ---
@@ -1446,12 +1494,11 @@ def show_revenue_analysis_page():
         if uploaded_file is None:
             st.error("Please upload an input file.")
         else:
-            with st.spinner("Reading data and running model... Please wait."):
+            with st.spinner("Reading data... Please wait."):
                 try:
-                    if uploaded_file.name.endswith('.csv'):
-                        input_df = pd.read_csv(uploaded_file, header=0)
-                    else:
-                        input_df = pd.read_excel(uploaded_file, sheet_name='Export naar Python', header=0)
+                    # Eén keer inlezen, datetime parsen en kolommen controleren (zie ingestion.py);
+                    # een eerder ingelezen workbook komt uit de cache (input_cache.py)
+                    input_df = load_input_cached(uploaded_file, STRATEGY_KEYS.get(strategy_choice))
                 except Exception as e:
                     st.error(f"Error reading file: {e}. Ensure the sheet is named 'Export naar Python'.")
                     st.stop()
@@ -1463,16 +1510,18 @@ def show_revenue_analysis_page():
                     "SUPPLY_COSTS": supply_costs, "TRANSPORT_COSTS": transport_costs,
                     "STRATEGY_CHOICE": strategy_choice, "TIME_STEP_H": 0.25
                 }
-                
-                status_placeholder = st.empty()
-                def progress_callback(msg):
-                    status_placeholder.info(f"⏳ {msg}")
-                
-                results = run_revenue_model(params, input_df, progress_callback)
-                st.session_state.revenue_results = results
-                status_placeholder.empty()
+
+            # De simulatie draait als achtergrond job (jobs.py); de pagina pollt de voortgang.
+            # Het job id staat ook in de URL, zodat een refresh de lopende job terugvindt.
+            job_id = get_job_manager().submit(params, input_df, label=strategy_choice)
+            st.session_state.revenue_job = job_id
+            st.session_state.revenue_results = None
+            st.query_params["job"] = job_id
             st.rerun()
 
+    if st.session_state.get('revenue_job'):
+        show_revenue_job_progress()
+
     # C. Results Display
     st.markdown("---")
     results = st.session_state.get('revenue_results')
@@ -1488,6 +1537,8 @@ def show_revenue_analysis_page():
         # Summary Section
         st.subheader("📈 Results Summary")
         st.info(f"**Analysis Method Used:** {summary.get('optimization_method', 'Not specified')}")
+        if results.get("cache_hit"):
+            st.caption("⚡ Result loaded from the result cache (same input, parameters and strategy).")
         
         summary_cols = st.columns(3)
         total_result_col = find_total_result_column(df_original)
@@ -1515,36 +1566,55 @@ def show_revenue_analysis_page():
                 "Select Chart Time Resolution",
                 ('15 Min (Original)', 'Hourly', 'Daily', 'Monthly', 'Yearly')
             )
-            df_resampled = resample_data(df_original.copy(), resolution)
+            # Gedecimeerde WebGL lijnen (chart_data.py); inzoomen haalt fijnere data voor het venster op
+            zoom = chart_zoom_range(df_original.index, key="revenue_zoom")
+            df_window = window(df_original, zoom)
+            # Resoluties zijn vooraf berekend (rollups.py); alleen een ingezoomd venster wordt opnieuw geaggregeerd
+            if results.get("rollups") is None:
+                results["rollups"] = build_rollups(df_original)
+            df_resampled = results["rollups"][resolution] if zoom is None else rollup(df_window, resolution)
             
             tab1, tab2, tab3 = st.tabs(["💰 Financial Results", "⚡ Energy Profiles", "🔋 Battery SoC"])
             with tab1:
                 if total_result_col:
-                    fig_finance = px.line(df_resampled, x=df_resampled.index, y=total_result_col, title=f"Financial Result ({resolution})", labels={"x": "Date", "y": "Amount (€)"})
+                    fig_finance = line_figure(df_resampled, total_result_col, title=f"Financial Result ({resolution})", y_label="Amount (€)")
                     st.plotly_chart(fig_finance, use_container_width=True)
                 else:
                     st.warning("Could not find a 'total_result' column to plot.")
             with tab2:
                 st.markdown("#### Production & Consumption")
                 if 'production_PV' in df_resampled.columns:
-                    fig_pv = px.line(df_resampled, x=df_resampled.index, y='production_PV', title=f"PV Production ({resolution})", labels={"x": "Date", "y": "Energy (kWh)"})
+                    fig_pv = line_figure(df_resampled, 'production_PV', title=f"PV Production ({resolution})", y_label="Energy (kWh)")
                     st.plotly_chart(fig_pv, use_container_width=True)
                 if 'load' in df_resampled.columns:
-                    fig_load = px.line(df_resampled, x=df_resampled.index, y='load', title=f"Load ({resolution})", labels={"x": "Date", "y": "Energy (kWh)"})
+                    fig_load = line_figure(df_resampled, 'load', title=f"Load ({resolution})", y_label="Energy (kWh)")
                     st.plotly_chart(fig_load, use_container_width=True)
             with tab3:
-                if 'SoC_kWh' in df_original.columns:
+                if 'SoC_kWh' in df_window.columns:
                     st.markdown("#### Battery State of Charge (SoC)")
-                    st.info("This chart is always shown in the original 15-minute resolution.")
-                    fig_soc = px.line(df_original, x=df_original.index, y='SoC_kWh', title="Battery SoC (15 Min Resolution)", labels={"x": "Date", "y": "State of Charge (kWh)"})
+                    st.info("This chart is always shown in the original 15-minute resolution (min/max per pixel; zoom in to see every point).")
+                    fig_soc = line_figure(df_window, 'SoC_kWh', title="Battery SoC (15 Min Resolution)", y_label="State of Charge (kWh)")
                     st.plotly_chart(fig_soc, use_container_width=True)
         else:
             st.warning("The model ran, but no data was returned for plotting.")
 
+    # D. Power x capacity sizing sweep (zelfde sidebar parameters, zie sizing_sweep.py)
+    st.markdown("---")
+    show_sizing_sweep(uploaded_file, strategy_choice, {
+        "MIN_SOC": min_soc, "MAX_SOC": max_soc, "EFF_CH": eff_ch, "EFF_DIS": eff_dis,
+        "MAX_CYCLES": max_cycles, "INIT_SOC": 0.5, "SUPPLY_COSTS": supply_costs,
+        "TRANSPORT_COSTS": transport_costs, "TIME_STEP_H": 0.25
+    })
+
     # --- Navigation ---
     if st.button("⬅️ Back to Home"):
         st.session_state.page = "Home"
         st.session_state.revenue_results = None
+        st.session_state.sweep_results = None
+        if st.session_state.get('revenue_job'):
+            get_job_manager().cancel(st.session_state.revenue_job)
+            st.session_state.revenue_job = None
+            st.query_params.pop("job", None)
         st.rerun()
 
 def show_model_page():
@@ -1574,6 +1644,7 @@ def show_model_page():
         return
     
     project_data = st.session_state.projects[project_name]
+    get_project_store().load_results(project_name, project_data)  # result frame pas nu inlezen
     i = project_data['inputs']
     
     display_header(f"Business Case: {project_name}")
@@ -1788,7 +1859,7 @@ with st.sidebar:
     if st.button("📂 Load Projects from File"): load_projects(); st.rerun()
 
 if 'projects' not in st.session_state or not st.session_state.projects:
-    if os.path.exists(PROJECTS_FILE):
+    if get_project_store().exists():
         load_projects()
 
 if st.session_state.page == "Home":
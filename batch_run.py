@@ -0,0 +1,205 @@
+# batch_run.py
+"""
+Headless batch runner: voert de scenario's uit een manifest uit met dezelfde code als de
+Streamlit app (run_revenue_model), parallel in een process pool, zonder scherm.
+
+Gebruik:  python batch_run.py scenarios.json [--workers N] [--output-dir DIR] [--export-mode stream|cells]
+
+Manifest (JSON, of YAML als PyYAML geïnstalleerd is):
+
+    {
+      "defaults": {"input": "Model Profielanalyse v1.0 Twente.xlsx", "max_cycles": 600},
+      "scenarios": [
+        {"name": "sap_1mw", "strategy": "imbalance_sap", "power_mw": 1.0, "capacity_mwh": 2.0},
+        {"name": "da_2mw", "strategy": "Optimize on Day-Ahead Market", "power_mw": 2.0,
+         "capacity_mwh": 4.0, "min_soc": 0.1, "supply_costs": 25.0}
+      ]
+    }
+
+strategy: een sleutel uit ingestion.REQUIRED_COLUMNS of een strategienaam uit de app/run_model.
+Overige velden worden (in hoofdletters) de modelparameters, zoals in de app. Relatieve input
+paden zijn relatief aan de map van het manifest.
+
+Per scenario wordt <output-dir>/<name>.xlsx geschreven en alle runs komen in summary.csv.
+Exit code 1 als minstens één scenario gefaald is.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from ingestion import STRATEGY_KEYS
+from input_cache import load_input_cached
+from revenue_logic import run_revenue_model, run_status, total_result
+
+# Zelfde standaardwaarden als het run_model venster
+DEFAULT_PARAMS = {
+    "POWER_MW": 1.0,
+    "CAPACITY_MWH": 2.0,
+    "MIN_SOC": 0.05,
+    "MAX_SOC": 0.95,
+    "EFF_CH": 0.95,
+    "EFF_DIS": 0.95,
+    "MAX_CYCLES": 600,
+    "INIT_SOC": 0.5,
+    "SUPPLY_COSTS": 20.0,
+    "TRANSPORT_COSTS": 15.0,
+    "E_PROGRAM": 100.0,
+    "TIME_STEP_H": 0.25,
+}
+
+# Strategie sleutel -> naam zoals run_revenue_model die verwacht (de Streamlit namen staan eerst)
+STRATEGY_CHOICES = {}
+for _label, _key in STRATEGY_KEYS.items():
+    STRATEGY_CHOICES.setdefault(_key, _label)
+
+SUMMARY_COLUMNS = ['name', 'status', 'strategy', 'POWER_MW', 'CAPACITY_MWH', 'optimization_method',
+                   'total_cycles', 'total_result', 'warnings', 'cache_hit', 'runtime_s', 'output', 'error']
+
+
+def load_manifest(path):
+    """Lees een JSON of YAML manifest. Returns: lijst scenario dicts (defaults al toegepast)"""
+    with open(path, encoding='utf-8') as f:
+        if path.lower().endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("YAML manifest vereist PyYAML (pip install pyyaml); gebruik anders JSON.")
+            manifest = yaml.safe_load(f)
+        else:
+            manifest = json.load(f)
+
+    if isinstance(manifest, list):
+        manifest = {"scenarios": manifest}
+    defaults = manifest.get("defaults", {})
+    scenarios = manifest.get("scenarios", [])
+    if not scenarios:
+        raise ValueError(f"Geen scenarios gevonden in {path}.")
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    result = []
+    names = set()
+    for i, entry in enumerate(scenarios, 1):
+        scenario = {**defaults, **entry}
+        scenario.setdefault("name", f"scenario_{i}")
+        if scenario["name"] in names:
+            raise ValueError(f"Scenario naam '{scenario['name']}' komt meerdere keren voor.")
+        names.add(scenario["name"])
+        if not scenario.get("input"):
+            raise ValueError(f"Scenario '{scenario['name']}': geen input bestand opgegeven.")
+        scenario["input"] = os.path.join(base_dir, scenario["input"])
+        result.append(scenario)
+    return result
+
+
+def scenario_params(scenario):
+    """Modelparameters voor run_revenue_model: DEFAULT_PARAMS + de velden van het scenario in hoofdletters."""
+    strategy = scenario.get("strategy", "self_consumption")
+    if strategy in STRATEGY_KEYS:
+        strategy_key = STRATEGY_KEYS[strategy]
+    elif strategy in STRATEGY_CHOICES:
+        strategy_key = strategy
+    else:
+        raise ValueError(f"Onbekende strategie '{strategy}' (kies uit {sorted(STRATEGY_CHOICES)}).")
+
+    params = dict(DEFAULT_PARAMS)
+    for key, value in scenario.items():
+        if key not in ("name", "input", "strategy"):
+            params[key.upper()] = value
+    params["STRATEGY_CHOICE"] = STRATEGY_CHOICES[strategy_key]
+    return params, strategy_key
+
+
+def run_scenario(scenario, output_dir, export_mode='stream'):
+    """Voer één scenario uit (worker). Returns: dict met de kolommen van SUMMARY_COLUMNS"""
+    name = scenario["name"]
+    start = time.time()
+    row = {'name': name, 'status': 'failure', 'strategy': scenario.get("strategy"), 'output': None, 'error': None}
+
+    def progress_callback(msg):
+        print(f"[{name}] {msg}", flush=True)
+
+    try:
+        params, strategy_key = scenario_params(scenario)
+        params.setdefault("EXPORT_MODE", export_mode)
+        row.update(POWER_MW=params["POWER_MW"], CAPACITY_MWH=params["CAPACITY_MWH"])
+        input_data = load_input_cached(scenario["input"], strategy_key, progress_callback=progress_callback)
+        results = run_revenue_model(params, input_data, progress_callback)
+    except Exception as e:
+        results = {"error": str(e)}
+
+    if results.get("error"):
+        row['error'] = results["error"]
+    else:
+        summary = results["summary"]
+        output_path = os.path.join(output_dir, f"{name}.xlsx")
+        with open(output_path, 'wb') as f:
+            f.write(results["output_file_bytes"])
+        row.update(
+            status=run_status(output_path, summary.get('optimization_method')),
+            optimization_method=summary.get('optimization_method', 'Pyomo optimalisatie'),
+            total_cycles=summary.get('total_cycles'),
+            total_result=total_result(results["df"]),
+            warnings=len(results["warnings"]),
+            cache_hit=results["cache_hit"],
+            output=output_path,
+        )
+    row['runtime_s'] = round(time.time() - start, 1)
+    progress_callback(f"{row['status']} in {row['runtime_s']} s")
+    return row
+
+
+def run_batch(scenarios, output_dir, workers=None, export_mode='stream'):
+    """Voer alle scenarios uit in een process pool. Returns: summary DataFrame in manifest volgorde"""
+    os.makedirs(output_dir, exist_ok=True)
+    rows = [None] * len(scenarios)
+    if workers == 1:
+        for i, scenario in enumerate(scenarios):
+            rows[i] = run_scenario(scenario, output_dir, export_mode)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(run_scenario, scenario, output_dir, export_mode): i
+                       for i, scenario in enumerate(scenarios)}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    rows[i] = future.result()
+                except Exception as e:
+                    # Bijv. een worker proces dat onverwacht is gestopt
+                    rows[i] = {'name': scenarios[i]["name"], 'status': 'failure', 'error': str(e)}
+    return pd.DataFrame(rows, columns=SUMMARY_COLUMNS)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Voer batterijmodel scenario's uit een manifest uit (zonder GUI).")
+    parser.add_argument("manifest", help="JSON of YAML bestand met scenario's")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="aantal processen (standaard alle cores; 1 = na elkaar in dit proces)")
+    parser.add_argument("--output-dir", default=None,
+                        help="map voor de Excel bestanden en summary.csv (standaard: batch_output naast het manifest)")
+    parser.add_argument("--export-mode", choices=['stream', 'cells'], default='stream',
+                        help="Excel export modus, zie excel_export.py")
+    args = parser.parse_args(argv)
+
+    scenarios = load_manifest(args.manifest)
+    output_dir = args.output_dir or os.path.join(os.path.dirname(os.path.abspath(args.manifest)), 'batch_output')
+
+    start = time.time()
+    summary = run_batch(scenarios, output_dir, workers=args.workers, export_mode=args.export_mode)
+    summary_path = os.path.join(output_dir, 'summary.csv')
+    summary.to_csv(summary_path, index=False)
+
+    print(summary[['name', 'status', 'strategy', 'total_cycles', 'total_result', 'runtime_s']].to_string(index=False))
+    print(f"\n{len(summary)} scenario('s) in {time.time() - start:.1f} s, samenvatting: {summary_path}")
+    failed = summary[summary['status'] == 'failure']
+    for _, row in failed.iterrows():
+        print(f"GEFAALD {row['name']}: {row['error']}", file=sys.stderr)
+    return 1 if len(failed) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+# benchmark_export.py
+"""
+Benchmark van de Excel export (excel_export.py): 'stream' (write-only) t.o.v. 'cells' (cel voor cel).
+
+Gebruik:  python benchmark_export.py [dagen] [herhalingen]
+Schrijft een jaar (standaard) synthetische kwartierresultaten met beide modi, meet de tijd en
+controleert dat beide workbooks dezelfde celwaarden en samengevoegde cellen bevatten.
+"""
+import io
+import sys
+import time
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from excel_export import export_workbook_bytes, EXPORT_SHEET
+
+EXPORT_COLUMNS = [
+    'regulation_state', 'price_surplus', 'price_shortage', 'price_day_ahead',
+    'space_for_charging_kWh', 'space_for_discharging_kWh', 'energy_charged_kWh',
+    'energy_discharged_kWh', 'SoC_kWh', 'SoC_pct', 'grid_exchange_kWh',
+    'e_program_kWh', 'day_ahead_result', 'imbalance_result', 'energy_tax',
+    'supplier_costs', 'transport_costs', 'total_result_imbalance_SAP'
+]
+
+PARAMS = {
+    'POWER_MW': 1.0, 'CAPACITY_MWH': 2.0, 'MIN_SOC': 0.05, 'MAX_SOC': 0.95,
+    'EFF_CH': 0.95, 'EFF_DIS': 0.95, 'SUPPLY_COSTS': 20.0, 'TRANSPORT_COSTS': 15.0,
+}
+
+
+def synthetic_results(days=365, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2024-01-01', periods=days * 96, freq='15min', name='Datetime')
+    df = pd.DataFrame(rng.normal(0, 100, (len(index), len(EXPORT_COLUMNS))), index=index, columns=EXPORT_COLUMNS)
+    df['regulation_state'] = rng.choice([-1, 0, 1, 2], len(index))
+    return df
+
+
+def sheet_contents(data):
+    ws = openpyxl.load_workbook(io.BytesIO(data))[EXPORT_SHEET]
+    cells = {(c.row, c.column): c.value for row in ws.iter_rows() for c in row if c.value is not None}
+    return cells, sorted(str(r) for r in ws.merged_cells.ranges)
+
+
+def main(days=365, repeats=1):
+    df = synthetic_results(days)
+    summary_text = "Python run benchmark     1.0 MW     2.0 MWh     300.0 cycli per jaar."
+    print(f"{len(df)} rijen x {len(df.columns) + 1} kolommen")
+
+    results = {}
+    for mode in ('cells', 'stream'):
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            results[mode] = export_workbook_bytes(df, summary_text, PARAMS, mode=mode)
+            timings.append(time.perf_counter() - start)
+        print(f"{mode:>6}: {min(timings):6.2f} s  ({len(results[mode]) / 1e6:.1f} MB)")
+
+    identical = sheet_contents(results['cells']) == sheet_contents(results['stream'])
+    print(f"Inhoud identiek: {identical}")
+    return identical
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:]]
+    sys.exit(0 if main(*args) else 1)
@@ -0,0 +1,72 @@
+# chart_data.py
+"""
+Chart data laag voor de tijdreeks grafieken in app.py.
+
+Een jaar kwartierdata (35k punten per lijn) naar de browser sturen maakt de pagina traag en de
+websocket payload groot. De lijnen worden daarom per bucket teruggebracht tot het minimum en
+maximum (min/max downsampling: pieken en dalen blijven zichtbaar) tot ongeveer max_points punten,
+en als WebGL trace (Scattergl) getekend. Inzoomen gebeurt server-side: de app kiest een
+tijdvenster (window) en decimeert alleen dat venster, zodat een kleiner venster fijnere data krijgt.
+"""
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+DEFAULT_MAX_POINTS = 2000  # ~2 punten per pixel breedte van een brede grafiek
+
+
+def minmax_indices(values, n_buckets):
+    """
+    Posities van het minimum en maximum van elke bucket (gelijk verdeeld over de reeks), gesorteerd,
+    plus het eerste en laatste punt. NaN telt niet mee zolang de bucket ook getallen bevat.
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    if n == 0:
+        return np.arange(0)
+    bucket = np.arange(n) * n_buckets // n
+    low = np.where(np.isnan(values), np.inf, values)
+    high = np.where(np.isnan(values), -np.inf, values)
+    # Binnen elke bucket gesorteerd op waarde: eerste = minimum, laatste = maximum
+    order_low = np.lexsort((low, bucket))
+    order_high = np.lexsort((high, bucket))
+    starts = np.flatnonzero(np.r_[True, bucket[order_low][1:] != bucket[order_low][:-1]])
+    ends = np.r_[starts[1:], n] - 1
+    idx = np.concatenate([order_low[starts], order_high[ends], [0, n - 1]])
+    return np.unique(idx)
+
+
+def decimate(x, y, max_points=DEFAULT_MAX_POINTS):
+    """(x, y) teruggebracht tot hooguit ~max_points punten met min/max per bucket."""
+    y = np.asarray(y)
+    if max_points is None or len(y) <= max_points:
+        return x, y
+    idx = minmax_indices(y, max(1, max_points // 2))
+    return np.asarray(x)[idx], y[idx]
+
+
+def window(df, x_range=None):
+    """Rijen van df binnen x_range (start, eind) op een gesorteerde DatetimeIndex; None = alles."""
+    if x_range is None:
+        return df
+    start, end = x_range
+    return df.loc[pd.Timestamp(start):pd.Timestamp(end)]
+
+
+def add_line(fig, x, y, max_points=DEFAULT_MAX_POINTS, **trace_kwargs):
+    """Voeg een gedecimeerde WebGL lijn toe aan fig (trace_kwargs zoals go.Scattergl, bijv. name, line, fill)."""
+    x, y = decimate(x, y, max_points)
+    trace_kwargs.setdefault('mode', 'lines')
+    fig.add_trace(go.Scattergl(x=x, y=y, **trace_kwargs))
+    return fig
+
+
+def line_figure(df, columns, title=None, x_label="Date", y_label=None, max_points=DEFAULT_MAX_POINTS):
+    """Tijdreeks figuur (index op de x-as) met één gedecimeerde WebGL lijn per kolom; vervangt px.line."""
+    if isinstance(columns, str):
+        columns = [columns]
+    fig = go.Figure()
+    for col in columns:
+        add_line(fig, df.index, df[col].to_numpy(), max_points, name=col)
+    fig.update_layout(title=title, xaxis_title=x_label, yaxis_title=y_label, showlegend=len(columns) > 1)
+    return fig
@@ -1,8 +1,11 @@
-import pandas as pd
 import numpy as np
-import os
+import time
 from pyomo.environ import *
-from pyomo.opt import SolverFactory
+from ingestion import prepare_input
+from solver_backends import get_solver, solver_settings, solve_model
+from pyomo.core.expr.numeric_expr import LinearExpression
+from fallback_heuristic import simulate_fallback, FALLBACK_METHOD
+from sparse_lp import build_day_ahead_lp, run_sparse_engine, run_rolling_horizon
 import sys 
 
 def get_energy_tax_table():
@@ -29,25 +32,174 @@ def calculate_energy_tax(total_consumption_mwh, tax_table):
     # Fallback naar hoogste bracket
     return tax_table['consumption_brackets'][-1]['tax_eur_per_mwh']
 
-def run_battery_trading(config, progress_callback=None):
-    # Read Excel sheet
-    df = config.input_data.copy()
-    datetime_col = None
-    for col in df.columns:
-        if col.strip().lower() == 'datetime':
-            datetime_col = col
-            break
-    if not datetime_col:
-        raise ValueError("No column 'Datetime' of 'datetime' gevonden in het 'Export naar Python' sheet.")
-    df[datetime_col] = pd.to_datetime(df[datetime_col])
-    df.set_index(datetime_col, inplace=True)
+def build_day_ahead_model(arrays, params):
+    """
+    Bouw het jaar LP model in één keer vanuit NumPy arrays (MWh en €/MWh).
+
+    arrays: dict met 'price', 'load_mwh', 'pv_mwh', 'grid_excl_mwh', 'max_feed_in_mwh', 'max_take_from_mwh'
+    params: dict met power_mw, min_soc, max_soc, time_step_h, eff_ch, eff_dis, start_soc,
+            max_cycles, usable_capacity, supply_costs, marginal_tax_rate, transport_costs
+
+    Levert exact hetzelfde LP als de oude regel-per-tijdstap opbouw, maar zonder
+    df.iloc lookups: alle coëfficiënten worden vooraf als floats berekend.
+    """
+    # Eén keer naar Python floats, zodat de constraint regels alleen lijst lookups doen
+    price = np.asarray(arrays['price'], dtype=float)
+    load_mwh = np.asarray(arrays['load_mwh'], dtype=float)
+    pv_mwh = np.asarray(arrays['pv_mwh'], dtype=float)
+    grid_excl = np.asarray(arrays['grid_excl_mwh'], dtype=float).tolist()
+    max_feed_in = np.asarray(arrays['max_feed_in_mwh'], dtype=float).tolist()
+    max_take_from = np.asarray(arrays['max_take_from_mwh'], dtype=float).tolist()
+
+    power_mw = params['power_mw']
+    time_step_h = params['time_step_h']
+    eff_ch = params['eff_ch']
+    eff_dis = params['eff_dis']
+
+    n = len(price)
+    timesteps = list(range(n))
+    load_minus_pv = (load_mwh - pv_mwh).tolist()
+
+    model = ConcreteModel()
+
+    # Variabelen - identiek aan de originele opbouw (MW/MWh)
+    model.charge = Var(timesteps, domain=NonNegativeReals, bounds=(0, power_mw))
+    model.discharge = Var(timesteps, domain=NonNegativeReals, bounds=(0, power_mw))
+    model.soc = Var(timesteps, domain=NonNegativeReals, bounds=(params['min_soc'], params['max_soc']))
+    model.feed_in_violation = Var(timesteps, domain=NonNegativeReals, bounds=(0, 1.0))
+    model.take_from_violation = Var(timesteps, domain=NonNegativeReals, bounds=(0, 1.0))
+    model.grid_feed_in = Var(timesteps, domain=NonNegativeReals, bounds=(0, 1.0))
+    model.grid_exchange_pos = Var(timesteps, domain=NonNegativeReals, bounds=(0, 10.0))
+    model.grid_exchange_neg = Var(timesteps, domain=NonNegativeReals, bounds=(0, 10.0))
+
+    model.soc[0].fix(params['start_soc'])
+
+    ch = model.charge
+    dis = model.discharge
+    soc = model.soc
+    dt_ch = time_step_h * eff_ch
+    dt_dis = time_step_h / eff_dis
+
+    model.mutual_exclusion = Constraint(timesteps, rule=lambda m, t: ch[t] + dis[t] <= power_mw)
+
+    def soc_balance_rule(m, t):
+        if t == 0:
+            return Constraint.Skip
+        return soc[t] == LinearExpression(constant=0, linear_coefs=[1, dt_ch, -dt_dis],
+                                          linear_vars=[soc[t-1], ch[t-1], dis[t-1]])
+    model.soc_balance = Constraint(timesteps, rule=soc_balance_rule)
+
+    # Netwerk grenzen: grid_excl + (ch - dis) * dt
+    model.network_feed_in = Constraint(timesteps, rule=lambda m, t: (
+        grid_excl[t] + (ch[t] - dis[t]) * time_step_h >= max_feed_in[t] - m.feed_in_violation[t]))
+    model.network_take_from = Constraint(timesteps, rule=lambda m, t: (
+        grid_excl[t] + (ch[t] - dis[t]) * time_step_h <= max_take_from[t] + m.take_from_violation[t]))
+    model.grid_feed_in_constraint = Constraint(timesteps, rule=lambda m, t: (
+        m.grid_feed_in[t] >= -(grid_excl[t] + (ch[t] - dis[t]) * time_step_h)))
+
+    # Cycli limiet
+    max_cycles = params['max_cycles']
+    usable_capacity = params['usable_capacity']
+    if max_cycles > 0 and usable_capacity > 0:
+        model.cycle_limit = Constraint(expr=LinearExpression(
+            constant=0, linear_coefs=[time_step_h * eff_ch] * n,
+            linear_vars=[ch[t] for t in timesteps]) <= max_cycles * usable_capacity)
+
+    # Grid uitwisseling: load - pv + (ch - dis) * dt == pos - neg
+    model.grid_exchange_decomp = Constraint(timesteps, rule=lambda m, t: (
+        load_minus_pv[t] + (ch[t] - dis[t]) * time_step_h == m.grid_exchange_pos[t] - m.grid_exchange_neg[t]))
+
+    # Doel in één lineaire expressie:
+    # 1e5 * violations + (load - pv + (ch - dis) * dt) * prijs + pos * (supply + tax + transport) + neg * supply
+    penalty = 100000
+    pos_cost = params['supply_costs'] + params['marginal_tax_rate'] + params['transport_costs']
+    neg_cost = params['supply_costs']
+    price_dt = (time_step_h * price).tolist()
+    price_list = price.tolist()
+    constant = sum(load_minus_pv[t] * price_list[t] for t in timesteps)
 
-    # Check of benodigde kolommen aanwezig zijn
-    required_columns = ["production_PV", "load", "price_day_ahead", "space available for charging (kWh)", "space available for discharging (kWh)", 
-                       "grid_excl_battery", "max_feed_in_grid", "max_take_from_grid"]
-    for col in required_columns:
-        if col not in df.columns:
-            raise ValueError(f"Column '{col}' ontbreekt in de input data.")
+    # Zelfde kolomvolgorde als de LP writer voor de oude opbouw gebruikte
+    coefs = price_dt + [-c for c in price_dt] + [pos_cost] * n + [neg_cost] * n + [penalty] * (2 * n)
+    variables = [ch[t] for t in timesteps]
+    variables += [dis[t] for t in timesteps]
+    variables += [model.grid_exchange_pos[t] for t in timesteps]
+    variables += [model.grid_exchange_neg[t] for t in timesteps]
+    variables += [model.feed_in_violation[t] for t in timesteps]
+    variables += [model.take_from_violation[t] for t in timesteps]
+    model.objective = Objective(
+        expr=LinearExpression(constant=constant, linear_coefs=coefs, linear_vars=variables),
+        sense=minimize)
+
+    return model
+
+def _solve_pyomo(arrays, model_params, settings, progress_callback=None):
+    """
+    Bouw en los het jaar model op via Pyomo + CBC.
+    Returns: (oplossing dict per variabele blok, objectief) of (None, None) als de solver faalt
+    """
+    # Maak Pyomo model voor jaar-optimalisatie
+    if progress_callback:
+        progress_callback("Pyomo model opbouwen...")
+    
+    build_start = time.perf_counter()
+    model = build_day_ahead_model(arrays, model_params)
+    timesteps = list(range(len(arrays['price'])))
+    if progress_callback:
+        progress_callback(f"Model opgebouwd in {time.perf_counter() - build_start:.1f} s")
+    
+    # Los het model op
+    if progress_callback:
+        progress_callback("Pyomo optimalisatie uitvoeren...")
+    
+    # Solver via de centrale solver laag (settings = solver_settings(config), standaard CBC)
+    # CBC-specifieke LP instellingen blijven gelijk aan voorheen
+    try:
+        # Binnen de try: een ontbrekende solver (ValueError) leidt ook naar de fallback heuristiek
+        solver = get_solver(**settings,
+                            options={'cbc': {'presolve': 'on', 'scaling': 'on', 'primalT': 1e-6, 'dualT': 1e-6}},
+                            progress_callback=progress_callback)
+        if progress_callback:
+            progress_callback(f"Model statistieken: {len(timesteps)} tijdstappen")
+        
+        results_pyomo = solve_model(solver, model, tee=False)
+        
+        if progress_callback and results_pyomo:
+            progress_callback(f"Solver status: {results_pyomo.solver.status}")
+            progress_callback(f"Termination condition: {results_pyomo.solver.termination_condition}")
+    except Exception as e:
+        if progress_callback:
+            progress_callback(f"Solver fout: {str(e)}. Gebruik fallback heuristiek...")
+        results_pyomo = None
+    
+    # Accepteer optimale en feasible oplossingen
+    acceptable_conditions = [
+        TerminationCondition.optimal,
+        TerminationCondition.feasible,
+        TerminationCondition.maxTimeLimit,
+        TerminationCondition.maxIterations,
+        TerminationCondition.other,
+        TerminationCondition.userInterrupt
+    ]
+    
+    if not (results_pyomo and results_pyomo.solver.termination_condition in acceptable_conditions):
+        return None, None
+    if model.charge[timesteps[0]].value is None:
+        # Geen oplossing geladen (bijv. tijdslimiet zonder feasible oplossing)
+        return None, None
+    
+    if progress_callback:
+        progress_callback("Pyomo optimalisatie succesvol! Resultaten verwerken...")
+    
+    solution = {
+        name: [value(getattr(model, name)[t]) for t in timesteps]
+        for name in ('charge', 'discharge', 'soc', 'feed_in_violation', 'take_from_violation')
+    }
+    return solution, value(model.objective)
+
+def run_battery_trading(config, progress_callback=None):
+    # Input (datetime index en kolomcontrole) via de gedeelde inleeslaag
+    prepared = prepare_input(config, 'day_ahead')
+    df, inputs = prepared.frame, prepared.arrays
 
     # Configuratie
     power_mw = config.POWER_MW
@@ -99,231 +251,70 @@ def run_battery_trading(config, progress_callback=None):
     else:
         marginal_tax_rate = tax_table['consumption_brackets'][0]['tax_eur_per_mwh']
 
-    # Converteer input data van kWh naar MWh voor Pyomo
-    df_mw = df.copy()
-    # Converteer alle energie kolommen van kWh naar MWh
-    df_mw['production_PV_mwh'] = df['production_PV'] / 1000  # kWh -> MWh
-    df_mw['load_mwh'] = df['load'] / 1000  # kWh -> MWh
-    df_mw['space_charging_mwh'] = df['space available for charging (kWh)'] / 1000  # kWh -> MWh
-    df_mw['space_discharging_mwh'] = df['space available for discharging (kWh)'] / 1000  # kWh -> MWh
-    df_mw['grid_excl_battery_mwh'] = df['grid_excl_battery'] / 1000  # kWh -> MWh
-    df_mw['max_feed_in_grid_mwh'] = df['max_feed_in_grid'] / 1000  # kWh -> MWh
-    df_mw['max_take_from_grid_mwh'] = df['max_take_from_grid'] / 1000  # kWh -> MWh
+    # MWh arrays (één keer voorbereid in PreparedInput, zie ingestion.py) voor Pyomo
+    arrays = {
+        'price': inputs['price_da'],  # €/MWh
+        'load_mwh': inputs['load_mwh'],  # MWh
+        'pv_mwh': inputs['pv_mwh'],  # MWh
+        'grid_excl_mwh': inputs['grid_excl_mwh'],  # MWh
+        'max_feed_in_mwh': inputs['max_feed_in_mwh'],  # MWh
+        'max_take_from_mwh': inputs['max_take_from_mwh'],  # MWh
+    }
     
     # Initialisatie
     network_violations = []
     
-    # Maak Pyomo model voor jaar-optimalisatie
-    if progress_callback:
-        progress_callback("Pyomo model opbouwen...")
-    
     # Maak tijdstappen index
     timesteps = list(range(len(df)))
     
-    # Maak Pyomo model
-    model = ConcreteModel()
-    
-    # Variabelen - Pure lineaire variabelen (geen binaire) - ALLES IN MW/MWh
-    model.charge = Var(timesteps, domain=NonNegativeReals, bounds=(0, power_mw))  # MW
-    model.discharge = Var(timesteps, domain=NonNegativeReals, bounds=(0, power_mw))  # MW
-    model.soc = Var(timesteps, domain=NonNegativeReals, bounds=(min_soc, max_soc))  # MWh
-    model.feed_in_violation = Var(timesteps, domain=NonNegativeReals, bounds=(0, 1.0))  # MWh - slack voor feed-in overschrijding
-    model.take_from_violation = Var(timesteps, domain=NonNegativeReals, bounds=(0, 1.0))  # MWh - slack voor take-from overschrijding
-    model.grid_feed_in = Var(timesteps, domain=NonNegativeReals, bounds=(0, 1.0))  # MWh - hoeveelheid grid feed-in per tijdstap
-    
-    # Hulpvariabelen voor supply costs (absolute waarde van grid uitwisseling)
-    model.grid_exchange_pos = Var(timesteps, domain=NonNegativeReals, bounds=(0, 10.0))  # MWh - positieve grid uitwisseling (afname)
-    model.grid_exchange_neg = Var(timesteps, domain=NonNegativeReals, bounds=(0, 10.0))  # MWh - negatieve grid uitwisseling (invoeding)
-    
-    # Fix initial SoC
-    current_soc = start_soc
-    model.soc[0].fix(current_soc)
-    
-    # Linear constraint: sum of charge + discharge can't exceed max power
-    def mutual_exclusion_rule(model, t):
-        return model.charge[t] + model.discharge[t] <= power_mw
-    model.mutual_exclusion = Constraint(timesteps, rule=mutual_exclusion_rule)
-    
-    # SoC balans
-    def soc_balance_rule(model, t):
-        if t == 0: 
-            return Constraint.Skip  # Eerste tijdstap is gefixed
-        return model.soc[t] == model.soc[t-1] + (
-            model.charge[t-1] * time_step_h * eff_ch -
-            model.discharge[t-1] * time_step_h / eff_dis)
-    
-    model.soc_balance = Constraint(timesteps, rule=soc_balance_rule)
-    
-    # Netwerk grenzen met slack variabelen - ALLES IN MWh
-    def network_feed_in_rule(model, t):
-        grid_excl = df_mw.iloc[t]['grid_excl_battery_mwh']  # MWh
-        max_feed_in = df_mw.iloc[t]['max_feed_in_grid_mwh']  # MWh
-        net_battery_exchange = (model.charge[t] - model.discharge[t]) * time_step_h  # MWh (positief=laden, negatief=ontladen)
-        grid_incl = grid_excl + net_battery_exchange
-        return grid_incl >= max_feed_in - model.feed_in_violation[t]
-    
-    def network_take_from_rule(model, t):
-        grid_excl = df_mw.iloc[t]['grid_excl_battery_mwh']  # MWh
-        max_take_from = df_mw.iloc[t]['max_take_from_grid_mwh']  # MWh
-        net_battery_exchange = (model.charge[t] - model.discharge[t]) * time_step_h  # MWh (positief=laden, negatief=ontladen)
-        grid_incl = grid_excl + net_battery_exchange
-        return grid_incl <= max_take_from + model.take_from_violation[t]
-    
-    model.network_feed_in = Constraint(timesteps, rule=network_feed_in_rule)
-    model.network_take_from = Constraint(timesteps, rule=network_take_from_rule)
-    
-    # Grid feed-in constraint - ALLES IN MWh
-    def grid_feed_in_rule(model, t):
-        grid_excl = df_mw.iloc[t]['grid_excl_battery_mwh']  # MWh
-        net_battery_exchange = (model.charge[t] - model.discharge[t]) * time_step_h  # MWh
-        grid_incl = grid_excl + net_battery_exchange
-        return model.grid_feed_in[t] >= -grid_incl
-    
-    model.grid_feed_in_constraint = Constraint(timesteps, rule=grid_feed_in_rule)
-    
-    # Cycli limiet
-    if max_cycles > 0 and usable_capacity > 0:
-        total_charged_energy = sum(model.charge[t] * time_step_h for t in timesteps)  # MWh
-        max_energy_allowed = max_cycles * usable_capacity  # MWh
-        if progress_callback:
-            progress_callback(f"Cycle constraint: max {max_energy_allowed:.2f} MWh geladen per jaar")
-        model.cycle_limit = Constraint(expr=total_charged_energy * eff_ch <= max_energy_allowed)
-    
-    # Constraints voor grid uitwisseling decomposing (voor supply costs)
-    def grid_exchange_decomposition_rule(model, t):
-        # Netto grid uitwisseling = load - PV + batterij_laden - batterij_ontladen
-        load_mwh = df_mw.iloc[t]['load_mwh']
-        pv_mwh = df_mw.iloc[t]['production_PV_mwh']
-        net_exchange = load_mwh - pv_mwh + (model.charge[t] - model.discharge[t]) * time_step_h
-        
-        # Splits in positief en negatief deel: net_exchange = pos - neg
-        return net_exchange == model.grid_exchange_pos[t] - model.grid_exchange_neg[t]
-    
-    model.grid_exchange_decomp = Constraint(timesteps, rule=grid_exchange_decomposition_rule)
-    
-    # Doel: minimaliseer totale energiekosten van de netaansluiting
-    def objective_rule(model):
-        # Straf netwerkoverschrijdingen zwaar (hoogste prioriteit) - MWh * 100000 voor juiste schaling
-        violation_penalty = sum(model.feed_in_violation[t] + model.take_from_violation[t] for t in timesteps) * 100000
-        
-        # Hoofddoel: minimaliseer totale energiekosten (day-ahead + belasting + netkosten)
-        total_energy_cost = 0
-        for t in timesteps:
-            price_eur_per_mwh = df.iloc[t]['price_day_ahead']  # €/MWh
-            
-            # Netto energieverbruik uit grid (positief = kopen, negatief = verkopen)
-            # Grid verbruik = load - PV + batterij_laden - batterij_ontladen
-            load_mwh = df_mw.iloc[t]['load_mwh']  # MWh
-            pv_mwh = df_mw.iloc[t]['production_PV_mwh']  # MWh
-            battery_net_consumption = (model.charge[t] - model.discharge[t]) * time_step_h  # MWh (positief=laden)
-            
-            net_grid_consumption = load_mwh - pv_mwh + battery_net_consumption  # MWh
-            
-            # JUISTE BENADERING: Minimaliseer totale energiekosten van de netaansluiting
-            # Bereken wat er werkelijk gebeurt op de grid aansluiting NA batterij acties
-            
-            # Werkelijke netto grid uitwisseling = load - PV + batterij_netto_verbruik
-            net_grid_exchange = load_mwh - pv_mwh + battery_net_consumption  # MWh
-            
-            # Day-ahead kosten/inkomsten voor werkelijke grid uitwisseling
-            day_ahead_cost = net_grid_exchange * price_eur_per_mwh
-            
-            # JUISTE SUPPLY COSTS: gebaseerd op werkelijke netto grid uitwisseling
-            # Gebruik hulpvariabelen voor absolute waarde: |net_exchange| = pos + neg
-            supply_cost = (model.grid_exchange_pos[t] + model.grid_exchange_neg[t]) * supply_costs
-            
-            # Energiebelasting: alleen voor netto afname van het net
-            # Netto afname = load - PV + batterij_laden - batterij_ontladen
-            net_consumption_for_tax = load_mwh - pv_mwh + battery_net_consumption
-            
-            # GECORRIGEERDE benadering: gebruik hulpvariabelen voor correcte lineaire modellering
-            # We gebruiken dezelfde techniek als voor supply_costs (absolute waarde)
-            # tax_cost = max(0, net_consumption_for_tax) * marginal_tax_rate
-            # Dit wordt gemodelleerd met hulpvariabelen in grid_exchange_pos/neg
-            # Als net_consumption_for_tax > 0, dan grid_exchange_pos[t] = net_consumption_for_tax
-            # en dus geldt energiebelasting over model.grid_exchange_pos[t]
-            
-            # Energiebelasting alleen voor netto afname (positief deel)
-            # Dit is correct omdat grid_exchange_pos[t] alleen positief is bij netto afname
-            tax_cost = model.grid_exchange_pos[t] * marginal_tax_rate
-            
-            # Transportkosten alleen voor netto afname (positief deel)
-            transport_cost = model.grid_exchange_pos[t] * transport_costs
-            
-            total_energy_cost += day_ahead_cost + supply_cost + tax_cost + transport_cost
-        
-        return violation_penalty + total_energy_cost
+    model_params = {
+        'power_mw': power_mw,
+        'min_soc': min_soc,
+        'max_soc': max_soc,
+        'time_step_h': time_step_h,
+        'eff_ch': eff_ch,
+        'eff_dis': eff_dis,
+        'start_soc': start_soc,
+        'max_cycles': max_cycles,
+        'usable_capacity': usable_capacity,
+        'supply_costs': supply_costs,
+        'marginal_tax_rate': marginal_tax_rate,
+        'transport_costs': transport_costs,
+    }
     
-    model.objective = Objective(rule=objective_rule, sense=minimize)
+    if max_cycles > 0 and usable_capacity > 0 and progress_callback:
+        progress_callback(f"Cycle constraint: max {max_cycles * usable_capacity:.2f} MWh geladen per jaar")
     
-    # Los het model op
-    if progress_callback:
-        progress_callback("Pyomo optimalisatie uitvoeren...")
+    # LP engine: 'pyomo' (standaard), 'sparse' (directe sparse matrix, zie sparse_lp.py)
+    # of 'rolling' (sparse LP in rolling-horizon vensters)
+    if hasattr(config, 'LP_ENGINE'):
+        lp_engine = config.LP_ENGINE
+    else:
+        lp_engine = 'pyomo'
     
-    # Probeer eerst de lokale CBC solver
-    cbc_path = os.path.join(os.path.dirname(__file__), 'Cbc-releases.2.10.12-w64-msvc16-md', 'bin', 'cbc.exe')
-    solver = None
-    
-    if os.path.exists(cbc_path):
-        try:
-            solver = SolverFactory('cbc', executable=cbc_path)
-            if progress_callback:
-                progress_callback(f"Lokale CBC solver gevonden: {cbc_path}")
-        except Exception as e:
-            if progress_callback:
-                progress_callback(f"Fout bij laden lokale CBC: {e}")
-    
-    if solver is None:
-        try:
-            solver = SolverFactory('cbc')
-            if progress_callback:
-                progress_callback("Standaard CBC solver gebruikt")
-        except Exception as e:
-            if progress_callback:
-                progress_callback(f"Fout bij laden standaard CBC: {e}")
-            raise ValueError("Geen CBC solver beschikbaar")
+    solution = None
+    lp_objective = None
+    rolling_report = None
     
-    try:
-        # Configureer solver voor lineair probleem (LP)
-        solver.options['presolve'] = 'on'
-        solver.options['scaling'] = 'on'
-        solver.options['primalT'] = 1e-6
-        solver.options['dualT'] = 1e-6
-        solver.options['timeLimit'] = 300  # 5 minuten timeout
-        
-        if progress_callback:
-            progress_callback(f"Model statistieken: {len(timesteps)} tijdstappen")
-        
-        results_pyomo = solver.solve(model, tee=False)
-        
-        if progress_callback and results_pyomo:
-            progress_callback(f"Solver status: {results_pyomo.solver.status}")
-            progress_callback(f"Termination condition: {results_pyomo.solver.termination_condition}")
-    except Exception as e:
-        if progress_callback:
-            progress_callback(f"CBC solver fout: {str(e)}. Gebruik fallback heuristiek...")
-        results_pyomo = None
-    
-    # Accepteer optimale en feasible oplossingen
-    acceptable_conditions = [
-        TerminationCondition.optimal,
-        TerminationCondition.feasible,
-        TerminationCondition.maxTimeLimit,
-        TerminationCondition.maxIterations,
-        TerminationCondition.other,
-        TerminationCondition.userInterrupt
-    ]
+    if lp_engine in ('sparse', 'rolling'):
+        if lp_engine == 'rolling':
+            solution, lp_objective, rolling_report = run_rolling_horizon(build_day_ahead_lp, arrays, model_params, config, progress_callback)
+        else:
+            solution, lp_objective = run_sparse_engine(build_day_ahead_lp, arrays, model_params, config, progress_callback)
+        if solution is not None and progress_callback:
+            progress_callback("Sparse LP optimalisatie succesvol! Resultaten verwerken...")
+    else:
+        solution, lp_objective = _solve_pyomo(arrays, model_params,
+                                              solver_settings(config, time_limit=300), progress_callback)  # 5 minuten timeout
     
-    if results_pyomo and results_pyomo.solver.termination_condition in acceptable_conditions:
-        if progress_callback:
-            progress_callback("Pyomo optimalisatie succesvol! Resultaten verwerken...")
-        
+    optimization_method = "Day-ahead trading optimalisatie met energiebelasting"
+    if solution is not None:
         # Haal resultaten op (in MW/MWh)
-        charge_list = [value(model.charge[t]) for t in timesteps]  # MW
-        discharge_list = [value(model.discharge[t]) for t in timesteps]  # MW
-        soc_list = [value(model.soc[t]) for t in timesteps]  # MWh
-        feed_in_violations = [value(model.feed_in_violation[t]) for t in timesteps]  # MWh
-        take_from_violations = [value(model.take_from_violation[t]) for t in timesteps]  # MWh
+        charge_list = list(solution['charge'])  # MW
+        discharge_list = list(solution['discharge'])  # MW
+        soc_list = list(solution['soc'])  # MWh
+        feed_in_violations = list(solution['feed_in_violation'])  # MWh
+        take_from_violations = list(solution['take_from_violation'])  # MWh
         
         # Converteer resultaten terug naar kWh voor output compatibiliteit
         energy_charged_list = [charge_list[i] * time_step_h * 1000 for i in range(len(timesteps))]  # MW * h * 1000 = kWh
@@ -435,6 +426,7 @@ def run_battery_trading(config, progress_callback=None):
         if progress_callback:
             progress_callback("Pyomo optimalisatie gefaald. Gebruik fallback heuristiek...")
         final_df, total_cycles, network_violations = run_heuristic_fallback(df, config, progress_callback)
+        optimization_method = FALLBACK_METHOD
     
     # Progress update
     if progress_callback:
@@ -467,9 +459,12 @@ def run_battery_trading(config, progress_callback=None):
         "average_price_EUR_per_MWh": average_price,
         "revenue_per_MW": max(-total_cost_euros, 0) / power_mw if power_mw > 0 else 0,
         "network_violations": len(network_violations),
-        "optimization_method": "Day-ahead trading optimalisatie met energiebelasting",
+        "optimization_method": optimization_method,
         "marginal_tax_rate_eur_per_mwh": marginal_tax_rate,
         "supply_costs_rate_eur_per_mwh": supply_costs,
+        "lp_engine": lp_engine,
+        "lp_objective": lp_objective,
+        "rolling_horizon": rolling_report,
         "warning_message": None
     }
     
@@ -519,191 +514,25 @@ def run_heuristic_fallback(df, config, progress_callback=None):
     else:
         marginal_tax_rate = tax_table['consumption_brackets'][0]['tax_eur_per_mwh']
 
-    # Initialisatie
-    network_violations = []
-    cycle_history = []
-    cumulative_cycles = 0
-    results = []
-
-    # Verwerk elke dag
-    total_days = len(df.groupby(pd.Grouper(freq='D')))
-    day_count = 0
-    
-    for day, day_data in df.groupby(pd.Grouper(freq='D')):
-        if len(day_data) == 0:
-            continue
-        
-        day_count += 1
-        # Toon alleen elke 10e dag of de laatste dag
-        if day_count % 10 == 0 or day_count == total_days:
-            msg = f"Fallback heuristiek: {day_count}/{total_days} dagen verwerkt... Cycli gebruikt: {cumulative_cycles:.1f}/{max_cycles}"
-            if progress_callback:
-                progress_callback(msg)
-            else:
-                print(msg, end='\r')
-
-        soc_list = []
-        charge_list = []
-        discharge_list = []
-        energy_charged_list = []
-        energy_discharged_list = []
-        soc_frac_list = []
-        
-        for i, (idx, row) in enumerate(day_data.iterrows()):
-            grid_excl_battery = row['grid_excl_battery']  # kWh
-            max_feed_in = row['max_feed_in_grid']  # kWh (negatief)
-            max_take_from = row['max_take_from_grid']  # kWh (positief)
-            
-            charge_possible = 0
-            discharge_possible = 0
-            
-            # Bepaal welke actie nodig is (laden OF ontladen, niet beide)
-            action_needed = "none"
-            required_charge_mw = 0
-            required_discharge_mw = 0
-            
-            # Stap 1: Zonnestroom opslag logica - optimaliseer totale energiekosten netaansluiting
-            current_day_ahead_price = row['price_day_ahead']  # €/MWh
-            
-            # Bereken totale inkoop kostprijs die vermeden kan worden (day-ahead + belasting + leveringskosten)
-            total_purchase_price = current_day_ahead_price + marginal_tax_rate + supply_costs
-            
-            # Bereken gemiddelde prijzen voor beslissingen
-            avg_day_ahead_price = day_data['price_day_ahead'].mean()
-            avg_total_purchase_price = avg_day_ahead_price + marginal_tax_rate + supply_costs
-            price_threshold = 0.1  # 10% verschil als drempel
-            
-            # Zonnestroom opslag beslissing: sla op wanneer het latere dure inkoop voorkomt
-            if total_purchase_price < avg_total_purchase_price * (1 - price_threshold):
-                # Lage huidige kosten vs hoge gemiddelde kosten: sla zonnestroom op voor later
-                max_charge_energy_kwh = min(
-                    power_mw * time_step_h * 1000,  # Vermogenslimiet in kWh
-                    (max_soc - current_soc) * 1000 / eff_ch  # SoC limiet in kWh
-                )
-                required_charge_kwh = max_charge_energy_kwh
-                required_charge_mw = required_charge_kwh / time_step_h / 1000  # MW
-                action_needed = "charge"
-            elif (current_day_ahead_price - supply_costs) > (avg_day_ahead_price - supply_costs) * (1 + price_threshold):
-                # Hoge netto verkoopprijs (day-ahead - leveringskosten): ontlaad de batterij
-                max_discharge_energy_kwh = min(
-                    power_mw * time_step_h * 1000,  # Vermogenslimiet in kWh
-                    (current_soc - min_soc) * 1000 * eff_dis  # SoC limiet in kWh
-                )
-                required_discharge_kwh = max_discharge_energy_kwh
-                required_discharge_mw = required_discharge_kwh / time_step_h / 1000  # MW
-                action_needed = "discharge"
-            
-            # Stap 2: Los vermogensoverschrijdingen op (alleen als we nog geen actie hebben)
-            if action_needed == "none":
-                # Overschrijding afname: grid_excl_battery > max_take_from_grid
-                if grid_excl_battery > max_take_from:
-                    # We moeten ontladen om afname te verminderen
-                    overschrijding_kwh = grid_excl_battery - max_take_from
-                    required_discharge_kwh = overschrijding_kwh
-                    required_discharge_mw = required_discharge_kwh / time_step_h / 1000  # MW
-                    action_needed = "discharge"
-                
-                # Overschrijding invoeding: grid_excl_battery < max_feed_in_grid
-                elif grid_excl_battery < max_feed_in:
-                    # We moeten laden om invoeding te verminderen
-                    overschrijding_kwh = abs(grid_excl_battery - max_feed_in)
-                    required_charge_kwh = overschrijding_kwh
-                    required_charge_mw = required_charge_kwh / time_step_h / 1000  # MW
-                    action_needed = "charge"
-            
-            # Stap 3: Proactieve acties om toekomstige overschrijdingen te voorkomen
-            if action_needed == "none":
-                # Als we dicht bij de grenzen zitten, handel proactief
-                margin_kwh = 10  # 10 kWh marge
-                
-                # Als we dicht bij afname overschrijding zitten
-                if grid_excl_battery > (max_take_from - margin_kwh):
-                    # Laad proactief om ruimte te maken
-                    required_charge_kwh = margin_kwh
-                    required_charge_mw = required_charge_kwh / time_step_h / 1000  # MW
-                    action_needed = "charge"
-                
-                # Als we dicht bij invoeding overschrijding zitten
-                elif grid_excl_battery < (max_feed_in + margin_kwh):
-                    # Ontlaad proactief om ruimte te maken
-                    required_discharge_kwh = margin_kwh
-                    required_discharge_mw = required_discharge_kwh / time_step_h / 1000  # MW
-                    action_needed = "discharge"
-            
-            # Voer de gekozen actie uit
-            if action_needed == "charge" and cumulative_cycles < max_cycles:
-                # Beperk door batterij vermogen en SoC
-                max_charge_mw = min(power_mw, (max_soc - current_soc) / (time_step_h * eff_ch))
-                charge_possible = min(required_charge_mw, max_charge_mw)
-                discharge_possible = 0
-            elif action_needed == "discharge":
-                # Beperk door batterij vermogen en SoC
-                max_discharge_mw = min(power_mw, (current_soc - min_soc) * eff_dis / time_step_h)
-                discharge_possible = min(required_discharge_mw, max_discharge_mw)
-                charge_possible = 0
-            else:
-                # Geen actie nodig of cyclus limiet bereikt voor laden
-                charge_possible = 0
-                discharge_possible = 0
-
-            
-            # Update SoC
-            current_soc = current_soc + charge_possible * time_step_h * eff_ch - discharge_possible * time_step_h / eff_dis
-            current_soc = min(max(current_soc, min_soc), max_soc)
-            
-            soc_list.append(current_soc)
-            charge_list.append(charge_possible)
-            discharge_list.append(discharge_possible)
-            energy_charged_list.append(charge_possible * time_step_h * 1000)  # kWh
-            energy_discharged_list.append(discharge_possible * time_step_h * 1000)  # kWh
-            soc_frac_list.append((current_soc - min_soc) / (max_soc - min_soc))
-        
-        # Bereken cycli voor deze dag
-        total_charged_energy = sum(energy_charged_list) / 1000  # MWh
-        daily_cycle = (total_charged_energy * eff_ch) / usable_capacity if usable_capacity > 0 else 0
-        cumulative_cycles += daily_cycle
-        cycle_history.append(daily_cycle)
-        
-        day_data = day_data.copy()
-        day_data['energy_charged_kWh'] = energy_charged_list
-        day_data['energy_discharged_kWh'] = energy_discharged_list
-        day_data['SoC_kWh'] = [s * 1000 for s in soc_list]
-        day_data['SoC_pct'] = soc_frac_list
-        
-        # Controleer op netwerkoverschrijdingen na batterij acties
-        for i, (idx, row) in enumerate(day_data.iterrows()):
-            grid_excl_battery = row['grid_excl_battery']  # kWh
-            max_feed_in = row['max_feed_in_grid']  # kWh
-            max_take_from = row['max_take_from_grid']  # kWh
-            
-            # Netto uitwisseling met batterij
-            net_battery_exchange = (energy_charged_list[i] - energy_discharged_list[i])  # kWh
-            grid_incl_battery = grid_excl_battery + net_battery_exchange
-            
-            # Check overschrijdingen
-            if max_feed_in < 0 and grid_incl_battery < max_feed_in:
-                violation = {
-                    'datetime': idx,
-                    'type': 'feed_in',
-                    'max_allowed': abs(max_feed_in),
-                    'actual': abs(grid_incl_battery),
-                    'violation': abs(grid_incl_battery) - abs(max_feed_in)
-                }
-                network_violations.append(violation)
-            
-            if max_take_from > 0 and grid_incl_battery > max_take_from:
-                violation = {
-                    'datetime': idx,
-                    'type': 'take_from',
-                    'max_allowed': max_take_from,
-                    'actual': grid_incl_battery,
-                    'violation': grid_incl_battery - max_take_from
-                }
-                network_violations.append(violation)
-        
-        results.append(day_data)
-
-    final_df = pd.concat(results)
+    # Heuristiek over jaar-arrays; dagen via index offsets (zie fallback_heuristic.py)
+    fallback_params = {
+        'power_mw': power_mw,
+        'min_soc': min_soc,
+        'max_soc': max_soc,
+        'eff_ch': eff_ch,
+        'eff_dis': eff_dis,
+        'time_step_h': time_step_h,
+        'usable_capacity': usable_capacity,
+        'max_cycles': max_cycles,
+        'init_soc': current_soc,
+        'marginal_tax_rate': marginal_tax_rate,
+        'supply_costs': supply_costs,
+    }
+    final_df, columns, cumulative_cycles, cycle_history, network_violations = simulate_fallback(
+        df, fallback_params, 'day_ahead', progress_callback, check_violations=True)
+    final_df = final_df.copy()
+    for col, values in columns.items():
+        final_df[col] = values
     total_cycles = cumulative_cycles
     
     # Voeg ontbrekende kolommen toe zoals in de hoofdfunctie
@@ -0,0 +1,169 @@
+# dp_dispatch.py
+"""
+Solver-vrije dag-optimalisatie voor imbalance_everything_PAP via dynamisch programmeren.
+
+De SoC wordt gediscretiseerd in soc_steps niveaus tussen min_soc en max_soc. Per kwartier is
+een actie een sprong naar een ander SoC niveau (laden of ontladen, nooit beide), zodat het
+niet-tegelijk laden/ontladen vanzelf geldt. De kosten per kwartier zijn de onbalanskosten
+t.o.v. het e-programma (shortage prijs bij meer afname, surplus prijs bij meer invoeding);
+de day-ahead kosten van het e-programma zijn een constante.
+
+Het dagelijkse cycle budget wordt met een Lagrange straf per cycle meegenomen: de backward DP
+loopt in één keer (gevectoriseerd) voor een reeks strafwaarden, daarna wordt de goedkoopste
+schedule gekozen die binnen het budget blijft.
+"""
+import numpy as np
+
+DEFAULT_SOC_STEPS = 101
+CYCLE_PENALTIES = np.geomspace(1.0, 1e6, 13)  # €/cycle, grove reeks als het budget knelt
+REFINE_PENALTIES = 8  # straffen per verfijning
+
+_TOL = 1e-9
+
+
+def _actions(delta, time_step_h, eff_ch, eff_dis):
+    """Laden/ontladen (MW) voor een SoC verandering delta (MWh)."""
+    charge = np.where(delta > 0, delta / (time_step_h * eff_ch), 0.0)
+    discharge = np.where(delta < 0, -delta * eff_dis / time_step_h, 0.0)
+    return charge, discharge
+
+
+def _step_costs(charge, discharge, t_index, day, bounds, params):
+    """
+    Kosten en cycle gebruik van acties (charge/discharge, zelfde vorm) op tijdstappen t_index.
+    Onhaalbare acties krijgen kosten inf.
+    """
+    time_step_h = params['time_step_h']
+    charge_ub, discharge_ub, min_charge, min_discharge = (b[t_index] for b in bounds)
+    feasible = ((charge <= charge_ub + _TOL) & (charge >= min_charge - _TOL) &
+                (discharge <= discharge_ub + _TOL) & (discharge >= min_discharge - _TOL) &
+                (charge <= params['power_mw'] + _TOL) & (discharge <= params['power_mw'] + _TOL))
+    imbalance = day['base'][t_index] + (charge - discharge) * time_step_h
+    cost = np.where(imbalance > 0,
+                    day['price_shortage'][t_index] * imbalance,
+                    day['price_surplus'][t_index] * imbalance)
+    cost = np.where(feasible, cost, np.inf)
+    cycles = (charge * time_step_h * params['eff_ch'] +
+              discharge * time_step_h * params['eff_dis']) / (2 * params['usable_capacity'])
+    return cost, cycles
+
+
+def solve_day_dp(day, start_soc, daily_cycle_budget, params, soc_steps=DEFAULT_SOC_STEPS, refine_passes=2):
+    """
+    Optimale dagschedule via backward DP over (tijd x SoC niveaus).
+
+    day: dict met numpy arrays 'pv', 'load' (MWh), 'price_shortage', 'price_surplus',
+         'price_day_ahead' (€/MWh), 'space_ch', 'space_dis' (kWh), zoals set_day_data()
+    params: power_mw, min_soc, max_soc, eff_ch, eff_dis, time_step_h, usable_capacity, e_program_factor
+    refine_passes: aantal verfijningen van de cycle straf rond het budget
+    Returns: dict met 'charge', 'discharge', 'soc' lijsten en 'objective', of None als infeasible
+    """
+    power_mw = params['power_mw']
+    min_soc = params['min_soc']
+    max_soc = params['max_soc']
+    time_step_h = params['time_step_h']
+    eff_ch = params['eff_ch']
+    eff_dis = params['eff_dis']
+
+    load = np.asarray(day['load'], dtype=float)
+    pv = np.asarray(day['pv'], dtype=float)
+    space_ch = np.asarray(day['space_ch'], dtype=float)
+    space_dis = np.asarray(day['space_dis'], dtype=float)
+    T = len(load)
+
+    # Zelfde grenzen als het MILP (set_day_data)
+    min_charge = np.where(space_dis < 0, np.abs(space_dis) / 0.25 / 1000, 0.0)
+    min_discharge = np.where(space_ch < 0, np.abs(space_ch) / 0.25 / 1000, 0.0)
+    charge_ub = np.maximum(np.minimum(power_mw, space_ch / 0.25 / 1000), min_charge)
+    discharge_ub = np.maximum(np.minimum(power_mw, space_dis / 0.25 / 1000), min_discharge)
+    bounds = (charge_ub, discharge_ub, min_charge, min_discharge)
+
+    e_program = (load - pv) * params['e_program_factor']
+    costs = {
+        'base': load - pv - e_program,  # onbalans zonder batterij (MWh)
+        'price_shortage': np.asarray(day['price_shortage'], dtype=float),
+        'price_surplus': np.asarray(day['price_surplus'], dtype=float),
+    }
+    day_ahead_term = float(np.dot(np.asarray(day['price_day_ahead'], dtype=float), e_program))
+
+    # SoC niveaus en mogelijke sprongen per kwartier
+    levels = np.linspace(min_soc, max_soc, max(2, int(soc_steps)))
+    n = len(levels)
+    h = levels[1] - levels[0]
+    k_up = int(np.floor(power_mw * time_step_h * eff_ch / h + 1e-9))
+    k_down = int(np.floor(power_mw * time_step_h / eff_dis / h + 1e-9))
+    offsets = np.arange(-k_down, k_up + 1)
+    step_charge, step_discharge = _actions(offsets * h, time_step_h, eff_ch, eff_dis)
+
+    # Kosten per (t, sprong) voor t >= 1, en vanaf de (niet-discrete) start SoC voor t = 0
+    t_grid = np.arange(1, T)[:, None]
+    step_cost, step_cycles = _step_costs(step_charge[None, :], step_discharge[None, :], t_grid, costs, bounds, params)
+    first_charge, first_discharge = _actions(levels - start_soc, time_step_h, eff_ch, eff_dis)
+    first_cost, first_cycles = _step_costs(first_charge, first_discharge, 0, costs, bounds, params)
+
+    target = np.arange(n)[:, None] + offsets[None, :]  # (n, K) volgend niveau
+    blocked = np.where((target >= 0) & (target < n), 0.0, np.inf)  # sprong buiten [min_soc, max_soc]
+    target = np.clip(target, 0, n - 1)
+
+    def dp_pass(penalty_values):
+        """Backward en forward DP voor een reeks cycle straffen tegelijk."""
+        L = len(penalty_values)
+        penalties = penalty_values[:, None]
+        # Backward: V[l, i] = kosten-tot-einde vanuit niveau i
+        value = np.zeros((L, n))
+        policy = np.empty((T, L, n), dtype=np.int32)
+        for t in range(T - 1, 0, -1):
+            q = value[:, target] + blocked + (step_cost[t - 1] + penalties * step_cycles[0])[:, None, :]
+            best = np.argmin(q, axis=2)
+            policy[t] = target[np.arange(n)[None, :], best]
+            value = np.take_along_axis(q, best[:, :, None], axis=2)[:, :, 0]
+        q0 = value + first_cost[None, :] + penalties * first_cycles[None, :]
+        first_level = np.argmin(q0, axis=1)
+        reachable = np.isfinite(q0[np.arange(L), first_level])
+
+        # Forward: schedule, cycle gebruik en echte kosten (zonder straf) per strafwaarde
+        path = np.empty((L, T), dtype=np.int32)
+        path[:, 0] = first_level
+        for t in range(1, T):
+            path[:, t] = policy[t, np.arange(L), path[:, t - 1]]
+        soc = np.concatenate([np.full((L, 1), start_soc), levels[path[:, :-1]]], axis=1)
+        charge, discharge = _actions(levels[path] - soc, time_step_h, eff_ch, eff_dis)
+        cycles = (charge.sum(axis=1) * time_step_h * eff_ch +
+                  discharge.sum(axis=1) * time_step_h * eff_dis) / (2 * params['usable_capacity'])
+        imbalance = costs['base'][None, :] + (charge - discharge) * time_step_h
+        cost = np.where(imbalance > 0, costs['price_shortage'] * imbalance,
+                        costs['price_surplus'] * imbalance).sum(axis=1)
+        cost[~reachable] = np.inf
+        return cost, cycles, charge, discharge, soc
+
+    # Eerst zonder straf; knelt het budget, dan een grove reeks straffen en daarna verfijnen
+    # tussen de twee straffen rond het budget
+    candidates = []
+    lower = 0.0
+    penalty_values = np.zeros(1)
+    for refine in range(2 + refine_passes):
+        cost, cycles, charge, discharge, soc = dp_pass(penalty_values)
+        within = cycles <= daily_cycle_budget + 1e-6
+        candidates.append((np.where(within, cost, np.inf), charge, discharge, soc))
+        if within[0]:
+            break
+        if refine == 0:
+            penalty_values = CYCLE_PENALTIES
+            continue
+        if not within.any():
+            break
+        hi = int(np.argmax(within))  # kleinste straf binnen budget
+        lower = penalty_values[hi - 1] if hi > 0 else lower
+        penalty_values = np.linspace(lower, penalty_values[hi], REFINE_PENALTIES + 2)[1:-1]
+
+    cost, charge, discharge, soc = min(candidates, key=lambda c: np.min(c[0]))
+    best = int(np.argmin(cost))
+    if not np.isfinite(cost[best]):
+        return None
+
+    return {
+        'charge': charge[best].tolist(),
+        'discharge': discharge[best].tolist(),
+        'soc': soc[best].tolist(),
+        'objective': day_ahead_term + float(cost[best]),
+    }
@@ -0,0 +1,207 @@
+# fallback_heuristic.py
+"""
+Gedeelde kern van de heuristische fallback (run_heuristic_fallback) van day_ahead_trading_PAP en
+self_consumption_PV_PAP, voor als de LP niet (op tijd) oplost.
+
+Alle kolommen worden één keer als arrays voor het hele jaar uitgelezen; de SoC keten loopt in één
+strakke loop over Python floats en de dagen worden via index offsets afgebakend (geen groupby).
+De beslisregels en de volgorde van de berekeningen zijn gelijk aan de oorspronkelijke per-rij versie,
+zodat de uitkomst identiek is.
+"""
+import numpy as np
+
+# optimization_method in de summary als de heuristiek gebruikt is (run_status, result_cache)
+FALLBACK_METHOD = 'Fallback heuristiek (Pyomo gefaald)'
+
+
+def day_offsets(index):
+    """
+    Volgorde en dag-grenzen zoals df.groupby(pd.Grouper(freq='D')):
+    Returns: (order, starts, total_days) met order de (stabiele) sortering op tijd,
+    starts de startposities van elke dag in die volgorde (plus len aan het eind) en
+    total_days het aantal kalenderdagen tussen de eerste en laatste dag.
+    """
+    order = np.argsort(index.values, kind='stable')
+    dates = index.normalize().values[order]
+    if len(dates) == 0:
+        return order, np.array([0]), 0
+    starts = np.concatenate([[0], np.flatnonzero(dates[1:] != dates[:-1]) + 1, [len(dates)]])
+    total_days = int((dates[-1] - dates[0]) // np.timedelta64(1, 'D')) + 1
+    return order, starts, total_days
+
+
+def simulate_fallback(df, params, strategy, progress_callback=None, check_violations=True):
+    """
+    Heuristische batterij-inzet over het hele jaar.
+
+    df: DataFrame met DatetimeIndex en kolommen grid_excl_battery, max_feed_in_grid,
+        max_take_from_grid (kWh) en voor strategy 'day_ahead' ook price_day_ahead
+    params: power_mw, min_soc, max_soc, eff_ch, eff_dis, time_step_h, usable_capacity, max_cycles,
+            init_soc (MWh) en voor 'day_ahead' ook marginal_tax_rate en supply_costs
+    strategy: 'day_ahead' (laden/ontladen op day-ahead prijs t.o.v. het daggemiddelde, laden
+              alleen binnen het cycle budget) of 'self_consumption' (PV overschot opslaan)
+    Returns: (df in dag-volgorde, kolommen dict, cumulative_cycles, cycle_history, network_violations)
+    """
+    power_mw = params['power_mw']
+    min_soc = params['min_soc']
+    max_soc = params['max_soc']
+    eff_ch = params['eff_ch']
+    eff_dis = params['eff_dis']
+    time_step_h = params['time_step_h']
+    usable_capacity = params['usable_capacity']
+    max_cycles = params['max_cycles']
+    current_soc = params['init_soc']
+    day_ahead = strategy == 'day_ahead'
+
+    order, starts, total_days = day_offsets(df.index)
+    if not np.array_equal(order, np.arange(len(order))):
+        df = df.iloc[order]
+
+    grid_excl = df['grid_excl_battery'].to_numpy(dtype=float)  # kWh
+    max_feed_in_arr = df['max_feed_in_grid'].to_numpy(dtype=float)  # kWh (negatief)
+    max_take_from_arr = df['max_take_from_grid'].to_numpy(dtype=float)  # kWh (positief)
+    grid_list = grid_excl.tolist()
+    feed_in_list = max_feed_in_arr.tolist()
+    take_from_list = max_take_from_arr.tolist()
+    if day_ahead:
+        prices = df['price_day_ahead'].to_numpy(dtype=float)
+        price_list = prices.tolist()
+        marginal_tax_rate = params['marginal_tax_rate']
+        supply_costs = params['supply_costs']
+    price_threshold = 0.1  # 10% verschil als drempel
+    margin_kwh = 10  # 10 kWh marge
+
+    n = len(grid_list)
+    energy_charged = [0.0] * n
+    energy_discharged = [0.0] * n
+    soc_kwh = [0.0] * n
+    soc_pct = [0.0] * n
+    cycle_history = []
+    cumulative_cycles = 0
+
+    for day_count, (start, stop) in enumerate(zip(starts[:-1].tolist(), starts[1:].tolist()), 1):
+        # Toon alleen elke 10e dag of de laatste dag
+        if day_count % 10 == 0 or day_count == total_days:
+            msg = f"Fallback heuristiek: {day_count}/{total_days} dagen verwerkt... Cycli gebruikt: {cumulative_cycles:.1f}/{max_cycles}"
+            if progress_callback:
+                progress_callback(msg)
+            else:
+                print(msg, end='\r')
+
+        if day_ahead:
+            avg_day_ahead_price = float(np.nanmean(prices[start:stop]))
+            avg_total_purchase_price = avg_day_ahead_price + marginal_tax_rate + supply_costs
+        charge_allowed = (not day_ahead) or cumulative_cycles < max_cycles
+
+        for t in range(start, stop):
+            grid_excl_battery = grid_list[t]
+            max_feed_in = feed_in_list[t]
+            max_take_from = take_from_list[t]
+
+            # Bepaal welke actie nodig is (laden OF ontladen, niet beide)
+            action_needed = "none"
+            required_charge_mw = 0
+            required_discharge_mw = 0
+
+            # Stap 1: strategie-afhankelijke actie
+            if day_ahead:
+                # Zonnestroom opslag: vergelijk totale inkoopprijs (day-ahead + belasting + levering) met daggemiddelde
+                current_day_ahead_price = price_list[t]
+                total_purchase_price = current_day_ahead_price + marginal_tax_rate + supply_costs
+                if total_purchase_price < avg_total_purchase_price * (1 - price_threshold):
+                    max_charge_energy_kwh = min(
+                        power_mw * time_step_h * 1000,  # Vermogenslimiet in kWh
+                        (max_soc - current_soc) * 1000 / eff_ch  # SoC limiet in kWh
+                    )
+                    required_charge_mw = max_charge_energy_kwh / time_step_h / 1000  # MW
+                    action_needed = "charge"
+                elif (current_day_ahead_price - supply_costs) > (avg_day_ahead_price - supply_costs) * (1 + price_threshold):
+                    # Hoge netto verkoopprijs (day-ahead - leveringskosten): ontlaad de batterij
+                    max_discharge_energy_kwh = min(
+                        power_mw * time_step_h * 1000,  # Vermogenslimiet in kWh
+                        (current_soc - min_soc) * 1000 * eff_dis  # SoC limiet in kWh
+                    )
+                    required_discharge_mw = max_discharge_energy_kwh / time_step_h / 1000  # MW
+                    action_needed = "discharge"
+            elif grid_excl_battery < 0:
+                # Netlevering van PV: laad om de PV op te slaan
+                required_charge_mw = abs(grid_excl_battery) / time_step_h / 1000  # MW
+                action_needed = "charge"
+
+            # Stap 2: Los vermogensoverschrijdingen op (alleen als we nog geen actie hebben)
+            if action_needed == "none":
+                if grid_excl_battery > max_take_from:
+                    # Overschrijding afname: ontladen om afname te verminderen
+                    required_discharge_mw = (grid_excl_battery - max_take_from) / time_step_h / 1000  # MW
+                    action_needed = "discharge"
+                elif grid_excl_battery < max_feed_in:
+                    # Overschrijding invoeding: laden om invoeding te verminderen
+                    required_charge_mw = abs(grid_excl_battery - max_feed_in) / time_step_h / 1000  # MW
+                    action_needed = "charge"
+
+            # Stap 3: Proactieve acties om toekomstige overschrijdingen te voorkomen
+            if action_needed == "none":
+                if grid_excl_battery > (max_take_from - margin_kwh):
+                    required_charge_mw = margin_kwh / time_step_h / 1000  # MW
+                    action_needed = "charge"
+                elif grid_excl_battery < (max_feed_in + margin_kwh):
+                    required_discharge_mw = margin_kwh / time_step_h / 1000  # MW
+                    action_needed = "discharge"
+
+            # Voer de gekozen actie uit, beperkt door batterij vermogen en SoC
+            charge_possible = 0
+            discharge_possible = 0
+            if action_needed == "charge" and charge_allowed:
+                max_charge_mw = min(power_mw, (max_soc - current_soc) / (time_step_h * eff_ch))
+                charge_possible = min(required_charge_mw, max_charge_mw)
+            elif action_needed == "discharge":
+                max_discharge_mw = min(power_mw, (current_soc - min_soc) * eff_dis / time_step_h)
+                discharge_possible = min(required_discharge_mw, max_discharge_mw)
+
+            # Update SoC
+            current_soc = current_soc + charge_possible * time_step_h * eff_ch - discharge_possible * time_step_h / eff_dis
+            current_soc = min(max(current_soc, min_soc), max_soc)
+
+            energy_charged[t] = charge_possible * time_step_h * 1000  # kWh
+            energy_discharged[t] = discharge_possible * time_step_h * 1000  # kWh
+            soc_kwh[t] = current_soc * 1000
+            soc_pct[t] = (current_soc - min_soc) / (max_soc - min_soc)
+
+        # Bereken cycli voor deze dag
+        total_charged_energy = sum(energy_charged[start:stop]) / 1000  # MWh
+        daily_cycle = (total_charged_energy * eff_ch) / usable_capacity if usable_capacity > 0 else 0
+        cumulative_cycles += daily_cycle
+        cycle_history.append(daily_cycle)
+
+    columns = {
+        'energy_charged_kWh': np.array(energy_charged),
+        'energy_discharged_kWh': np.array(energy_discharged),
+        'SoC_kWh': np.array(soc_kwh),
+        'SoC_pct': np.array(soc_pct),
+    }
+
+    # Controleer op netwerkoverschrijdingen na batterij acties
+    network_violations = []
+    if check_violations:
+        grid_incl = grid_excl + (columns['energy_charged_kWh'] - columns['energy_discharged_kWh'])
+        feed_in = (max_feed_in_arr < 0) & (grid_incl < max_feed_in_arr)
+        take_from = (max_take_from_arr > 0) & (grid_incl > max_take_from_arr)
+        for t in np.flatnonzero(feed_in | take_from):
+            if feed_in[t]:
+                network_violations.append({
+                    'datetime': df.index[t],
+                    'type': 'feed_in',
+                    'max_allowed': abs(max_feed_in_arr[t]),
+                    'actual': abs(grid_incl[t]),
+                    'violation': abs(grid_incl[t]) - abs(max_feed_in_arr[t])
+                })
+            if take_from[t]:
+                network_violations.append({
+                    'datetime': df.index[t],
+                    'type': 'take_from',
+                    'max_allowed': max_take_from_arr[t],
+                    'actual': grid_incl[t],
+                    'violation': grid_incl[t] - max_take_from_arr[t]
+                })
+
+    return df, columns, cumulative_cycles, cycle_history, network_violations
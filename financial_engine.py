@@ -0,0 +1,286 @@
+# financial_engine.py
+"""
+Gevectoriseerde versie van het Business Case model (run_financial_model in app.py).
+
+run_financial_model rekent één project door met een pandas DataFrame per jaar. Voor gevoeligheids-
+analyses op de portefeuille (duizenden varianten van de inputs) is dat te traag: run_scenarios
+rekent alle scenario's tegelijk door als numpy arrays van scenario's x jaren. Elke stap volgt
+dezelfde bewerkingen in dezelfde volgorde als run_financial_model (indexatie, degradatie, CAPEX via
+calculate_all_kpis, EBITDA, afschrijving, EIA, vennootschapsbelasting, NPV, IRR en terugverdientijd),
+zodat de uitkomsten exact gelijk zijn. De IRR lost dezelfde companion matrix op als npf.irr, maar
+voor alle scenario's in één eigvals aanroep.
+
+Gebruik:
+    batch = run_scenarios({**inputs, 'inflation': np.linspace(0.0, 0.04, 1000)}, "BESS & PV")
+    batch['metrics']['equity_irr']      # (1000,)
+    scenario_result(batch, 0)           # zelfde dict als run_financial_model
+"""
+import numpy as np
+import numpy_financial as npf
+import pandas as pd
+
+# Indexaties (kolom idx_<naam>) bovenop de inflatie
+INDEX_KEYS = ['trading_income', 'supplier_costs', 'om_bess', 'om_pv', 'grid_op', 'other_costs',
+              'ppa_income', 'curtailment_income']
+
+CORPORATE_TAX_BRACKET = 200000
+CORPORATE_TAX_LOW = 0.19
+CORPORATE_TAX_HIGH = 0.258
+
+NOT_REACHED = "Not reached"
+
+
+def _ratio(numerator, denominator):
+    """numerator / denominator, 0 bij een denominator <= 0 (scalars of arrays)."""
+    if np.ndim(denominator) == 0:
+        return numerator / denominator if denominator > 0 else 0
+    numerator, denominator = np.broadcast_arrays(np.asarray(numerator, dtype=float), denominator)
+    return np.divide(numerator, denominator, out=np.zeros(denominator.shape), where=denominator > 0)
+
+
+def calculate_all_kpis(i, tech_type):
+    """Technische KPI's, CAPEX en jaar 1 opbrengsten/kosten; werkt met scalars of met arrays per scenario."""
+    kpis = {}
+    if tech_type == 'bess':
+        kpis['Capacity Factor'] = _ratio(i['bess_capacity_kwh'], i['bess_power_kw'])
+        kpis['SoC Available'] = i['bess_max_soc'] - i['bess_min_soc']
+        kpis['Usable Capacity'] = i['bess_capacity_kwh'] * kpis['SoC Available']
+        kpis['C-Rate'] = _ratio(i['bess_power_kw'], kpis['Usable Capacity'])
+        kpis['Round Trip Efficiency (RTE)'] = i['bess_charging_eff'] * i['bess_discharging_eff']
+        kpis['Purchase Costs'] = i['bess_capacity_kwh'] * i['bess_capex_per_kwh']
+        kpis['IT & Security Costs'] = i['bess_capacity_kwh'] * (i['bess_capex_it_per_kwh'] + i['bess_capex_security_per_kwh'])
+        base_capex = kpis['Purchase Costs'] + kpis['IT & Security Costs']
+        kpis['Civil Works'] = base_capex * i['bess_capex_civil_pct']
+        capex_subtotal = base_capex + kpis['Civil Works']
+        kpis['Permits & Fees'] = capex_subtotal * i['bess_capex_permits_pct']
+        kpis['Project Management'] = capex_subtotal * i['bess_capex_mgmt_pct']
+        kpis['Contingency'] = capex_subtotal * i['bess_capex_contingency_pct']
+        kpis['total_capex'] = capex_subtotal + kpis['Permits & Fees'] + kpis['Project Management'] + kpis['Contingency']
+        kpis['trading_income_y1'] = (i['bess_power_kw'] / 1000) * i['bess_income_trading_per_mw_year']
+        kpis['control_party_costs_y1'] = kpis['trading_income_y1'] * i['bess_income_ctrl_party_pct']
+        offtake_y1 = i['bess_cycles_per_year'] * kpis['Usable Capacity'] / i['bess_charging_eff']
+        kpis['supplier_costs_y1'] = (offtake_y1 / 1000) * i['bess_income_supplier_cost_per_mwh']
+        kpis['om_y1'] = i['bess_opex_om_per_year']
+        kpis['retribution_y1'] = i['bess_opex_retribution']
+        kpis['asset_mgmt_y1'] = (i['bess_power_kw'] / 1000) * i['bess_opex_asset_mgmt_per_mw_year']
+        kpis['insurance_y1'] = kpis['total_capex'] * i['bess_opex_insurance_pct']
+        kpis['property_tax_y1'] = kpis['total_capex'] * i['bess_opex_property_tax_pct']
+        kpis['overhead_y1'] = i['bess_capacity_kwh'] * i['bess_opex_overhead_per_kwh_year']
+        kpis['other_y1'] = i['bess_capacity_kwh'] * i['bess_opex_other_per_kwh_year']
+    elif tech_type == 'pv':
+        kpis['Total Peak Power'] = (i['pv_power_per_panel_wp'] * i['pv_panel_count']) / 1000
+        kpis['Production (Year 1)'] = kpis['Total Peak Power'] * i['pv_full_load_hours']
+        kpis['Purchase Costs'] = kpis['Total Peak Power'] * 1000 * i['pv_capex_per_wp']
+        capex_subtotal = kpis['Purchase Costs']
+        kpis['Civil Works'] = capex_subtotal * i['pv_capex_civil_pct']
+        capex_subtotal = capex_subtotal + kpis['Civil Works']
+        kpis['Security'] = capex_subtotal * i['pv_capex_security_pct']
+        kpis['Permits & Fees'] = capex_subtotal * i['pv_capex_permits_pct']
+        kpis['Project Management'] = capex_subtotal * i['pv_capex_mgmt_pct']
+        kpis['Contingency'] = capex_subtotal * i['pv_capex_contingency_pct']
+        kpis['total_capex'] = capex_subtotal + kpis['Security'] + kpis['Permits & Fees'] + kpis['Project Management'] + kpis['Contingency']
+        kpis['ppa_income_y1'] = (kpis['Total Peak Power'] * 1000 * i['pv_income_ppa_per_mwp']) + (kpis['Production (Year 1)'] * i['pv_income_ppa_per_kwh'])
+        kpis['curtailment_income_y1'] = (kpis['Total Peak Power'] * 1000 * i['pv_income_curtailment_per_mwp']) + (kpis['Production (Year 1)'] * i['pv_income_curtailment_per_kwh'])
+        kpis['om_y1'] = i['pv_opex_om_y1']
+        kpis['retribution_y1'] = i['pv_opex_retribution']
+        kpis['insurance_y1'] = kpis['total_capex'] * i['pv_opex_insurance_pct']
+        kpis['property_tax_y1'] = kpis['total_capex'] * i['pv_opex_property_tax_pct']
+        kpis['overhead_y1'] = kpis['total_capex'] * i['pv_opex_overhead_pct']
+        kpis['other_y1'] = kpis['total_capex'] * i['pv_opex_other_pct']
+    return kpis
+
+
+def stack_inputs(scenarios):
+    """
+    Inputs van alle scenario's als arrays van gelijke lengte.
+    scenarios: lijst van input dicts (zoals project['inputs']), of één dict waarin waarden arrays
+    mogen zijn (bijv. de basis inputs met een reeks waarden voor één parameter).
+    """
+    if isinstance(scenarios, dict):
+        keys = list(scenarios)
+        arrays = np.broadcast_arrays(*[np.asarray(scenarios[k], dtype=float) for k in keys])
+        return {k: np.atleast_1d(a).copy() for k, a in zip(keys, arrays)}
+    keys = scenarios[0].keys()
+    return {k: np.array([s[k] for s in scenarios], dtype=float) for k in keys}
+
+
+def npv(rate, values):
+    """npf.npv per rij: values (scenario's x perioden), rate per scenario."""
+    values = np.asarray(values, dtype=float)
+    discount = (1 + np.asarray(rate, dtype=float))[:, None] ** np.arange(0, values.shape[1])
+    return (values / discount).sum(axis=1)
+
+
+def irr(values):
+    """
+    npf.irr per rij van values (scenario's x perioden). Rijen met een gewone vorm (eerste en
+    laatste kasstroom niet 0, alles eindig) gaan samen door één eigvals van de companion matrices;
+    de rest via npf.irr zelf. Returns: array met de rente, NaN zonder oplossing.
+    """
+    values = np.asarray(values, dtype=float)
+    rates = np.full(len(values), np.nan)
+    p = values[:, ::-1]  # hoogste macht eerst, zoals np.roots(values[::-1]) in npf.irr
+    regular = (p[:, 0] != 0) & (p[:, -1] != 0) & np.isfinite(p).all(axis=1)
+    n = p.shape[1] - 1
+    if regular.any() and n >= 1:
+        q = p[regular]
+        companion = np.zeros((len(q), n, n))
+        companion[:, np.arange(1, n), np.arange(n - 1)] = 1.0
+        companion[:, 0, :] = -q[:, 1:] / q[:, :1]
+        roots = np.linalg.eigvals(companion)
+        valid = (roots.imag == 0) & (roots.real > 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            candidates = np.where(valid, 1 / roots.real - 1, np.nan)
+        distance = np.where(valid, np.abs(candidates), np.inf)
+        best = np.take_along_axis(candidates, distance.argmin(axis=1)[:, None], axis=1)[:, 0]
+        rates[regular] = np.where(valid.any(axis=1), best, np.nan)
+    for k in np.flatnonzero(~regular):
+        try:
+            rates[k] = npf.irr(values[k])
+        except np.linalg.LinAlgError:
+            rates[k] = np.nan
+    return rates
+
+
+def _corporate_tax(result_before_tax):
+    x = result_before_tax
+    high = CORPORATE_TAX_BRACKET * CORPORATE_TAX_LOW + (x - CORPORATE_TAX_BRACKET) * CORPORATE_TAX_HIGH
+    return -np.where(x > CORPORATE_TAX_BRACKET, high, np.where(x > 0, x * CORPORATE_TAX_LOW, 0))
+
+
+def _run_term(i, project_type, term):
+    """Alle scenario's met dezelfde looptijd (term jaren). Returns: (kolommen, metrics, bess_kpis, pv_kpis)"""
+    n = len(next(iter(i.values())))
+    years = np.arange(1, term + 1)
+    years_vector = years - 1
+    col = lambda key: i[key][:, None]
+    is_bess, is_pv = 'BESS' in project_type, 'PV' in project_type
+    c = {}
+    c['idx_inflation'] = (1 + col('inflation')) ** years_vector
+    for key in INDEX_KEYS:
+        c[f'idx_{key}'] = (1 + col('inflation') + col(f'idx_{key}')) ** years_vector
+    c['idx_degradation_bess'] = (1 - col('bess_annual_degradation')) ** years
+    c['idx_degradation_pv'] = (1 - col('pv_annual_degradation')) ** years
+
+    bess_base = calculate_all_kpis(i, 'bess') if is_bess else {}
+    bess_capex = bess_base.get('total_capex', np.zeros(n))
+    bess_active_mask = (years <= col('project_term')) & (years <= col('lifespan_battery_tech'))
+    if is_bess:
+        b = {k: v[:, None] for k, v in bess_base.items()}
+        bess = {}
+        bess['bess_trading_income'] = b['trading_income_y1'] * c['idx_trading_income'] * c['idx_degradation_bess']
+        bess['bess_control_party_costs'] = -bess['bess_trading_income'] * col('bess_income_ctrl_party_pct')
+        bess['bess_supplier_costs'] = -b['supplier_costs_y1'] * c['idx_supplier_costs'] * c['idx_degradation_bess']
+        bess['bess_om'] = -b['om_y1'] * c['idx_om_bess']
+        for key in ['retribution', 'asset_mgmt', 'insurance', 'property_tax', 'overhead', 'other']:
+            bess[f'bess_{key}'] = -b[f'{key}_y1'] * c['idx_other_costs']
+        for key in bess:
+            bess[key] = bess[key] * bess_active_mask
+        c.update(bess)
+        c['ebitda_bess'] = np.stack(list(bess.values()), axis=1).sum(axis=1)
+    else:
+        c['ebitda_bess'] = np.zeros((n, term))
+
+    pv_base = calculate_all_kpis(i, 'pv') if is_pv else {}
+    pv_capex = pv_base.get('total_capex', np.zeros(n))
+    pv_active_mask = (years <= col('project_term')) & (years <= col('lifespan_pv_tech'))
+    if is_pv:
+        b = {k: v[:, None] for k, v in pv_base.items()}
+        pv = {}
+        pv['pv_ppa_income'] = b['ppa_income_y1'] * c['idx_ppa_income'] * c['idx_degradation_pv']
+        pv['pv_curtailment_income'] = b['curtailment_income_y1'] * c['idx_curtailment_income'] * c['idx_degradation_pv']
+        pv['pv_om'] = -b['om_y1'] * c['idx_om_pv']
+        for key in ['retribution', 'insurance', 'property_tax', 'overhead', 'other']:
+            pv[f'pv_{key}'] = -b[f'{key}_y1'] * c['idx_other_costs']
+        for key in pv:
+            pv[key] = pv[key] * pv_active_mask
+        c.update(pv)
+        c['ebitda_pv'] = np.stack(list(pv.values()), axis=1).sum(axis=1)
+    else:
+        c['ebitda_pv'] = np.zeros((n, term))
+
+    grid_capex = i['grid_one_time_bess'] + i['grid_one_time_pv'] + i['grid_one_time_general']
+    grid_cols = ['grid_annual_fixed', 'grid_annual_kw_max', 'grid_annual_kw_contract', 'grid_annual_kwh_offtake']
+    for key in grid_cols:
+        c[key] = -col(key) * c['idx_grid_op']
+    c['ebitda_grid'] = np.stack([c[key] for key in grid_cols], axis=1).sum(axis=1)
+    c['total_ebitda'] = c['ebitda_bess'] + c['ebitda_pv'] + c['ebitda_grid']
+    total_investment = bess_capex + pv_capex + grid_capex
+
+    for key, capex, period in [('depreciation_bess', bess_capex, i['depr_period_battery']),
+                               ('depreciation_pv', pv_capex, i['depr_period_pv'])]:
+        annual = _ratio(-capex, period)[:, None]
+        c[key] = np.where(years > period[:, None], 0.0, annual)
+    c['result_before_eia'] = c['total_ebitda'] + c['depreciation_bess'] + c['depreciation_pv']
+    eia_allowance = total_investment * i['eia_pct']
+    first_year = c['result_before_eia'][:, 0]
+    c['eia_applied'] = np.zeros((n, term))
+    # min(eia_allowance, resultaat jaar 1), alleen bij een positief resultaat in jaar 1
+    c['eia_applied'][:, 0] = np.where(first_year > 0, np.where(first_year < eia_allowance, first_year, eia_allowance), 0.0)
+    c['result_before_tax'] = c['result_before_eia'] - c['eia_applied']
+    c['corporate_tax'] = _corporate_tax(c['result_before_tax'])
+    c['profit_after_tax'] = c['result_before_tax'] + c['corporate_tax']
+    c['net_cash_flow'] = c['total_ebitda'] + c['corporate_tax']
+    ncf_y0 = -total_investment
+    c['cumulative_cash_flow'] = np.cumsum(c['net_cash_flow'], axis=1) + ncf_y0[:, None]
+    c['cumulative_ebitda'] = np.cumsum(c['total_ebitda'], axis=1) + ncf_y0[:, None]
+
+    metrics = {'total_investment': total_investment,
+               'cumulative_cash_flow_end': c['cumulative_cash_flow'][:, -1],
+               'cumulative_ebitda_end': c['cumulative_ebitda'][:, -1]}
+    equity_flows = np.column_stack([ncf_y0, c['net_cash_flow']])
+    metrics['npv'] = npv(i['wacc'], equity_flows[:, 1:]) + ncf_y0
+    metrics['equity_irr'] = irr(equity_flows)
+    metrics['project_irr'] = irr(np.column_stack([ncf_y0, c['total_ebitda']]))
+
+    # Terugverdientijd: eerste jaar met een positieve cumulatieve kasstroom, lineair binnen dat jaar
+    reached = (c['cumulative_cash_flow'] >= 0).any(axis=1)
+    payback_idx = (c['cumulative_cash_flow'] >= 0).argmax(axis=1)
+    rows = np.arange(n)
+    previous = np.where(payback_idx > 0, c['cumulative_cash_flow'][rows, payback_idx - 1], ncf_y0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        payback = payback_idx + np.abs(previous / c['net_cash_flow'][rows, payback_idx])
+    metrics['payback_period'] = np.where(reached, payback, np.nan)
+    metrics['payback_reached'] = reached
+    return c, metrics, bess_base, pv_base
+
+
+def run_scenarios(scenarios, project_type):
+    """
+    Business Case model voor alle scenario's tegelijk (één project_type, bijv. "BESS & PV").
+    Returns: dict met
+      'years': jaren 1..langste looptijd,
+      'columns': kolomnaam -> array (scenario's x jaren), NaN na de looptijd van een scenario,
+      'metrics': naam -> array per scenario (payback_period NaN als payback_reached False is),
+      'bess_kpis' / 'pv_kpis': naam -> array per scenario.
+    """
+    i = stack_inputs(scenarios)
+    n = len(i['project_term'])
+    terms = i['project_term'].astype(int)
+    max_term = int(terms.max()) if n else 0
+    batch = {'years': np.arange(1, max_term + 1), 'project_type': project_type,
+             'terms': terms, 'columns': {}, 'metrics': {}, 'bess_kpis': {}, 'pv_kpis': {}}
+    # Per looptijd een eigen rekenslag, zodat elke rij exact de lengte van run_financial_model heeft
+    for term in np.unique(terms):
+        rows = np.flatnonzero(terms == term)
+        columns, metrics, bess_kpis, pv_kpis = _run_term({k: v[rows] for k, v in i.items()}, project_type, int(term))
+        for key, values in columns.items():
+            target = batch['columns'].setdefault(key, np.full((n, max_term), np.nan))
+            target[rows, :term] = values
+        for group, values in [('metrics', metrics), ('bess_kpis', bess_kpis), ('pv_kpis', pv_kpis)]:
+            for key, value in values.items():
+                target = batch[group].setdefault(key, np.zeros(n, dtype=np.asarray(value).dtype))
+                target[rows] = value
+    return batch
+
+
+def scenario_result(batch, k):
+    """Scenario k uit run_scenarios in de vorm van run_financial_model: {'df', 'metrics', 'bess_kpis', 'pv_kpis'}"""
+    term = int(batch['terms'][k])
+    df = pd.DataFrame({key: values[k, :term] for key, values in batch['columns'].items()},
+                      index=pd.Index(batch['years'][:term], name='Year'))
+    metrics = {key: float(values[k]) for key, values in batch['metrics'].items() if key != 'payback_reached'}
+    if not batch['metrics']['payback_reached'][k]:
+        metrics['payback_period'] = NOT_REACHED
+    kpis = {group: {key: float(values[k]) for key, values in batch[group].items()} for group in ['bess_kpis', 'pv_kpis']}
+    return {"df": df, "metrics": metrics, **kpis}
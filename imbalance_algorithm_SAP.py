@@ -1,20 +1,283 @@
-import pandas as pd
 import numpy as np
 from pyomo.environ import *
-import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from ingestion import prepare_input
+from solver_backends import get_solver, solver_settings, solve_model
+
+# Korte namen (ingestion.py) van de dagdata die update_day_model() nodig heeft
+DAY_MODEL_KEYS = ('space_ch', 'space_dis', 'reg_state', 'price_surplus', 'price_shortage')
+
+def build_day_model(T, params):
+    """
+    Bouw het dagmodel (T kwartieren) met mutable parameters voor prijzen,
+    laad/ontlaad grenzen, verplichte acties, start SoC en cycle budget.
+    Vul de data van een dag in met update_day_model().
+    """
+    power_mw = params['power_mw']
+    min_soc = params['min_soc']
+    max_soc = params['max_soc']
+    eff_ch = params['eff_ch']
+    eff_dis = params['eff_dis']
+    time_step_h = params['time_step_h']
+    usable_capacity = params['usable_capacity']
+
+    model = ConcreteModel()
+    model.T = RangeSet(0, T-1)
+
+    # Dagdata (mutable, wordt per dag bijgewerkt)
+    model.charge_ub = Param(model.T, mutable=True, initialize=0.0)
+    model.discharge_ub = Param(model.T, mutable=True, initialize=0.0)
+    model.min_charge = Param(model.T, mutable=True, initialize=0.0)  # verplicht laden (MW)
+    model.min_discharge = Param(model.T, mutable=True, initialize=0.0)  # verplicht ontladen (MW)
+    model.price_surplus = Param(model.T, mutable=True, initialize=0.0)  # 0 als regulation_state == 2
+    model.price_shortage = Param(model.T, mutable=True, initialize=0.0)  # 0 als regulation_state == 2
+    model.cycle_budget = Param(mutable=True, initialize=0.0)
+
+    # Binary variable: 1 = charging, 0 = discharging
+    model.charge_state = Var(model.T, within=Binary)
+
+    model.charge = Var(model.T, within=NonNegativeReals, bounds=lambda m, t: (0, m.charge_ub[t]))
+    model.discharge = Var(model.T, within=NonNegativeReals, bounds=lambda m, t: (0, m.discharge_ub[t]))
+    model.soc = Var(model.T, within=NonNegativeReals, bounds=(min_soc, max_soc))
+    model.soc[0].fix(min_soc)
+
+    # Constraint: never charge and discharge at the same time
+    M = power_mw  # Large enough
+    def no_simultaneous_charge(model, t):
+        return model.charge[t] <= M * model.charge_state[t]
+    model.no_simul_charge = Constraint(model.T, rule=no_simultaneous_charge)
+    def no_simultaneous_discharge(model, t):
+        return model.discharge[t] <= M * (1 - model.charge_state[t])
+    model.no_simul_discharge = Constraint(model.T, rule=no_simultaneous_discharge)
+
+    def soc_balance(model, t):
+        if t == 0: return Constraint.Skip
+        # Charging: only a part of the energy ends up in the battery (eff_ch)
+        # Discharging: you need to take more out of the battery to deliver 1 MWh to the grid (1/eff_dis)
+        return model.soc[t] == model.soc[t-1] + (
+            model.charge[t-1] * time_step_h * eff_ch -
+            model.discharge[t-1] * time_step_h / eff_dis)
+    model.soc_con = Constraint(model.T, rule=soc_balance)
+
+    # Hard constraints: verplicht ontladen/laden bij negatieve ruimte (0 = geen verplichting)
+    model.enforce_discharge = Constraint(model.T, rule=lambda m, t: m.discharge[t] >= m.min_discharge[t])
+    model.enforce_charge = Constraint(model.T, rule=lambda m, t: m.charge[t] >= m.min_charge[t])
+
+    def daily_cycles(model):
+        daily_charge = sum(model.charge[t] for t in model.T) * time_step_h * eff_ch
+        daily_discharge = sum(model.discharge[t] for t in model.T) * time_step_h * eff_dis
+        return (daily_charge + daily_discharge) / (2 * usable_capacity) <= model.cycle_budget
+    model.cycle_con = Constraint(rule=daily_cycles)
+
+    def objective(model):
+        return sum(
+            model.price_surplus[t] * model.discharge[t] * time_step_h * eff_dis -
+            model.price_shortage[t] * model.charge[t] * time_step_h * eff_ch
+            for t in model.T
+        )
+    model.obj = Objective(rule=objective, sense=maximize)
+
+    model.final_soc_min = Constraint(expr=model.soc[T-1] + (
+        model.charge[T-1] * time_step_h * eff_ch - model.discharge[T-1] * time_step_h * eff_dis) >= min_soc)
+
+    model.final_soc_max = Constraint(expr=model.soc[T-1] + (
+        model.charge[T-1] * time_step_h * eff_ch - model.discharge[T-1] * time_step_h * eff_dis) <= max_soc)
+
+    return model
+
+def day_inputs(day_arrays):
+    """Arrays van één dag (PreparedInput.day_arrays) voor update_day_model(), met de korte namen uit ingestion.py."""
+    return {key: day_arrays[key] for key in DAY_MODEL_KEYS}
+
+def update_day_model(model, day, current_soc, daily_cycle_budget, params):
+    """Zet de data van één dag (dict van day_inputs()) in een model van build_day_model()."""
+    power_mw = params['power_mw']
+    space_ch = day['space_ch']
+    space_dis = day['space_dis']
+    active = day['reg_state'] != 2
+
+    # Verplicht laden/ontladen bij negatieve ruimte op de aansluiting
+    verplicht_laden = np.where(space_dis < 0, np.abs(space_dis) / 0.25 / 1000, 0.0)
+    verplicht_ontladen = np.where(space_ch < 0, np.abs(space_ch) / 0.25 / 1000, 0.0)
+    # Upper bound is at least the required value (if applicable)
+    charge_ub = np.maximum(np.minimum(power_mw, space_ch / 0.25 / 1000), verplicht_laden)
+    discharge_ub = np.maximum(np.minimum(power_mw, space_dis / 0.25 / 1000), verplicht_ontladen)
+    price_surplus = np.where(active, day['price_surplus'], 0.0)
+    price_shortage = np.where(active, day['price_shortage'], 0.0)
+
+    model.charge_ub.store_values(dict(enumerate(charge_ub.tolist())))
+    model.discharge_ub.store_values(dict(enumerate(discharge_ub.tolist())))
+    model.min_charge.store_values(dict(enumerate(verplicht_laden.tolist())))
+    model.min_discharge.store_values(dict(enumerate(verplicht_ontladen.tolist())))
+    model.price_surplus.store_values(dict(enumerate(price_surplus.tolist())))
+    model.price_shortage.store_values(dict(enumerate(price_shortage.tolist())))
+    model.cycle_budget = float(daily_cycle_budget)
+    model.soc[0].fix(current_soc)
+
+def seed_day_start(model, prev_charge, prev_discharge, start_soc, params):
+    """
+    Warm start: zet de schedule van de vorige dag (laden/ontladen in MW) als startwaarden in het
+    model, opnieuw doorgerekend vanaf de nieuwe start SoC en geknipt op de grenzen van vandaag.
+    """
+    min_soc = params['min_soc']
+    max_soc = params['max_soc']
+    dt_ch = params['time_step_h'] * params['eff_ch']
+    dt_dis = params['time_step_h'] / params['eff_dis']
+    T = len(model.T)
+    # Andere daglengte (DST): afkappen of aanvullen met nullen
+    def fit(values):
+        values = np.asarray(values, dtype=float)[:T]
+        return np.pad(values, (0, T - len(values)))
+    prev_charge = fit(prev_charge)
+    prev_discharge = fit(prev_discharge)
+
+    soc = start_soc
+    for t in model.T:
+        min_ch = value(model.min_charge[t])
+        min_dis = value(model.min_discharge[t])
+        ch = min(max(prev_charge[t], min_ch), value(model.charge_ub[t]))
+        dis = min(max(prev_discharge[t], min_dis), value(model.discharge_ub[t]))
+        # Niet tegelijk laden en ontladen: de grootste actie wint (tenzij verplicht)
+        if ch > 0 and dis > 0:
+            if ch >= dis:
+                dis = min_dis
+            else:
+                ch = min_ch
+        # Binnen de SoC grenzen blijven
+        ch = min(ch, max((max_soc - soc) / dt_ch, min_ch))
+        dis = min(dis, max((soc - min_soc) / dt_dis, min_dis))
+
+        if t > 0:
+            model.soc[t].value = min(max(soc, min_soc), max_soc)
+        model.charge[t].value = ch
+        model.discharge[t].value = dis
+        model.charge_state[t].value = 1 if ch > 0 else 0
+        soc = soc + ch * dt_ch - dis * dt_dis
+
+def solver_statistics(result):
+    """Aantal branch-and-bound nodes en simplex iteraties uit een solver resultaat (None als onbekend)."""
+    stats = result.solver.statistics
+    counts = []
+    for count in (stats.branch_and_bound.number_of_created_subproblems, stats.black_box.number_of_iterations):
+        try:
+            counts.append(int(count))
+        except (TypeError, ValueError):  # niet gerapporteerd door de solver
+            counts.append(None)
+    return tuple(counts)
+
+def solve_day(solver, model, lp_first=False, warm_start=None, tol=1e-6):
+    """
+    Los een dagmodel op. Met lp_first eerst als LP (charge_state in [0, 1]): met rendement < 1
+    laadt en ontlaadt de LP oplossing bijna nooit tegelijk en is dan ook MILP-optimaal.
+    Alleen als dat wel gebeurt wordt de dag opnieuw als MILP opgelost.
+    warm_start: optioneel (prev_charge, prev_discharge, start_soc, params) voor seed_day_start(),
+    gebruikt als MIPStart voor de MILP solve.
+    Returns: (result, milp_used)
+    """
+    def solve_milp():
+        if warm_start is None:
+            return solve_model(solver, model)
+        seed_day_start(model, *warm_start)
+        return solve_model(solver, model, warmstart=True)
+
+    if not lp_first:
+        return solve_milp(), True
+    for t in model.T:
+        model.charge_state[t].domain = UnitInterval
+    try:
+        result = solve_model(solver, model)
+    finally:
+        for t in model.T:
+            model.charge_state[t].domain = Binary
+    if (result.solver.status != SolverStatus.ok) or (result.solver.termination_condition == TerminationCondition.infeasible):
+        # LP infeasible betekent ook MILP infeasible
+        return result, False
+    simultaneous = any(min(model.charge[t](), model.discharge[t]()) > tol for t in model.T)
+    if simultaneous:
+        return solve_milp(), True
+    return result, False
+
+def solve_day_recorded(solver, model, lp_first, warm_start, compare, stats, label):
+    """
+    solve_day() voor de warm start modus: registreert per dag de nodes en iteraties in stats.
+    Met compare wordt de dag eerst koud opgelost, zodat de besparing per dag zichtbaar is.
+    """
+    day_stats = {'date': label, 'warm_start': warm_start is not None}
+    if compare and warm_start is not None:
+        cold_result, _ = solve_day(solver, model, lp_first)
+        day_stats['cold_nodes'], day_stats['cold_iterations'] = solver_statistics(cold_result)
+    result, milp_used = solve_day(solver, model, lp_first, warm_start)
+    day_stats['nodes'], day_stats['iterations'] = solver_statistics(result)
+    for key in ('nodes', 'iterations'):
+        if day_stats.get(f'cold_{key}') is not None and day_stats[key] is not None:
+            day_stats[f'{key}_saved'] = day_stats[f'cold_{key}'] - day_stats[key]
+    stats.append(day_stats)
+    return result, milp_used
+
+def warm_start_summary(stats):
+    """
+    Totalen van de per-dag statistieken van solve_day_recorded(), over de dagen waarvoor de solver
+    ze rapporteerde. Rapporteerde de solver geen enkele dag iets, dan zijn de totalen None en
+    staat in "measurement" dat de meting voor deze backend niet beschikbaar is (geen besparing 0).
+    """
+    def total(key):
+        values = [d[key] for d in stats if d.get(key) is not None]
+        return sum(values) if values else None
+
+    summary = {
+        "days": stats,
+        "nodes": total('nodes'),
+        "iterations": total('iterations'),
+        "nodes_saved": total('nodes_saved'),
+        "iterations_saved": total('iterations_saved'),
+    }
+    measured = summary["nodes"] is not None or summary["iterations"] is not None
+    summary["measurement"] = "ok" if measured else "niet beschikbaar voor deze solver backend"
+    return summary
+
+def extract_day_solution(model, result):
+    """Haal laden/ontladen/SoC uit een opgelost dagmodel; None als de dag infeasible is."""
+    if (result.solver.status != SolverStatus.ok) or (result.solver.termination_condition == TerminationCondition.infeasible):
+        return None
+    return {
+        'charge': [model.charge[t]() for t in model.T],
+        'discharge': [model.discharge[t]() for t in model.T],
+        'soc': [model.soc[t]() for t in model.T],
+    }
+
+def result_frame(df, out, filled, drop_columns=()):
+    """
+    Eén DataFrame uit de in place gevulde jaar-arrays in out (kolom -> array, geïndexeerd op
+    rijpositie in df). filled: de posities per verwerkte dag, in volgorde van verwerking.
+    """
+    order = np.concatenate(filled) if filled else np.arange(0)
+    final_df = df.iloc[order].drop(columns=list(drop_columns))
+    for col, values in out.items():
+        final_df[col] = values[order]
+    return final_df
+
+def solve_day_candidates(T, params, day, daily_cycle_budget, soc_grid, lp_first=False, settings=None):
+    """
+    Los één dag op voor elke start SoC uit soc_grid (worker voor PARALLEL_DAYS).
+    settings: solver_settings() van de hoofdrun.
+    Geeft per start SoC het resultaat van extract_day_solution() terug.
+    """
+    solver = get_solver(**(settings or {}))
+    model = build_day_model(T, params)
+    solutions = []
+    for start_soc in soc_grid:
+        update_day_model(model, day, start_soc, daily_cycle_budget, params)
+        result, milp_used = solve_day(solver, model, lp_first)
+        solution = extract_day_solution(model, result)
+        if solution is not None:
+            solution['milp'] = milp_used
+        solutions.append(solution)
+    return solutions
 
 def run_battery_trading(config, progress_callback=None):
-    # Read Excel sheet
-    df = config.input_data.copy()
-    datetime_col = None
-    for col in df.columns:
-        if col.strip().lower() == 'datetime':
-            datetime_col = col
-            break
-    if not datetime_col:
-        raise ValueError("No column 'Datetime' or 'datetime' found in the 'Export naar Python' sheet.")
-    df[datetime_col] = pd.to_datetime(df[datetime_col])
-    df.set_index(datetime_col, inplace=True)
+    # Input (datetime index en kolomcontrole) via de gedeelde inleeslaag
+    prepared = prepare_input(config, 'imbalance_sap')
+    df, inputs = prepared.frame, prepared.arrays
 
     # Use config
     power_mw = config.POWER_MW
@@ -45,12 +308,11 @@ def run_battery_trading(config, progress_callback=None):
         transport_costs = 15.0  # Default waarde voor backward compatibility
 
     # Initialization
-    total_days = len(df.groupby(pd.Grouper(freq='D')))
+    total_days = prepared.total_days
     base_daily_cycle_budget = max_cycles / total_days
     remaining_cycles = max_cycles
     vol_window = []
 
-    results = []
     # Make initial SoC configurable
     if hasattr(config, 'INIT_SOC'):
         current_soc = float(config.INIT_SOC) * capacity_mwh
@@ -62,85 +324,71 @@ def run_battery_trading(config, progress_callback=None):
     # Lijst om infeasible dagen bij te houden
     infeasible_days = []
 
-    for day, day_data in df.groupby(pd.Grouper(freq='D')):
-        if len(day_data) == 0:
-            continue
-
-        msg = f"Optimizing {day.strftime('%d-%m-%Y')}... Cycles used: {cumulative_cycles:.1f}/{max_cycles}"
-        if progress_callback:
-            progress_callback(msg)
-        else:
-            print(msg, end='\r')
-
-        # Create model
-        model = ConcreteModel()
-        T = len(day_data)
-        model.T = RangeSet(0, T-1)
-
-        # Binary variable: 1 = charging, 0 = discharging
-        model.charge_state = Var(model.T, within=Binary)
-
-        # Determine maximum charge and discharge power per timestep (based on the available space on the grid connection)
-        def charge_bound(model, t):
-            space_mw = (day_data["space available for charging (kWh)"].iloc[t] / 0.25) / 1000
-            verplicht_laden = 0
-            space_dis = day_data["space available for discharging (kWh)"].iloc[t]
-            if space_dis < 0:
-                verplicht_laden = abs(space_dis) / 0.25 / 1000
-            # Upper bound is at least the required value (if applicable)
-            upper = max(min(power_mw, space_mw), verplicht_laden)
-            return (0, upper)
-        def discharge_bound(model, t):
-            space_mw = (day_data["space available for discharging (kWh)"].iloc[t] / 0.25) / 1000
-            verplicht_ontladen = 0
-            space_ch = day_data["space available for charging (kWh)"].iloc[t]
-            if space_ch < 0:
-                verplicht_ontladen = abs(space_ch) / 0.25 / 1000
-            upper = max(min(power_mw, space_mw), verplicht_ontladen)
-            return (0, upper)
-        model.charge = Var(model.T, within=NonNegativeReals, bounds=charge_bound)
-        model.discharge = Var(model.T, within=NonNegativeReals, bounds=discharge_bound)
-        model.soc = Var(model.T, within=NonNegativeReals, bounds=(min_soc, max_soc))
-        model.soc[0].fix(current_soc)
-
-        # Constraint: never charge and discharge at the same time
-        M = power_mw  # Large enough
-        def no_simultaneous_charge(model, t):
-            return model.charge[t] <= M * model.charge_state[t]
-        model.no_simul_charge = Constraint(model.T, rule=no_simultaneous_charge)
-        def no_simultaneous_discharge(model, t):
-            return model.discharge[t] <= M * (1 - model.charge_state[t])
-        model.no_simul_discharge = Constraint(model.T, rule=no_simultaneous_discharge)
-
-        def soc_balance(model, t):
-            if t == 0: return Constraint.Skip
-            # Charging: only a part of the energy ends up in the battery (eff_ch)
-            # Discharging: you need to take more out of the battery to deliver 1 MWh to the grid (1/eff_dis)
-            return model.soc[t] == model.soc[t-1] + (
-                model.charge[t-1] * time_step_h * eff_ch -
-                model.discharge[t-1] * time_step_h / eff_dis)
-        model.soc_con = Constraint(model.T, rule=soc_balance)
-
-        # Hard constraint: mandatory discharge when negative space available for charging
-        def enforce_discharge(model, t):
-            space_ch = day_data["space available for charging (kWh)"].iloc[t]
-            if space_ch < 0:
-                verplicht_ontladen = abs(space_ch) / 0.25 / 1000
-                return model.discharge[t] >= verplicht_ontladen
-            else:
-                return Constraint.Skip
-        model.enforce_discharge = Constraint(model.T, rule=enforce_discharge)
-
-        # Hard constraint: mandatory charge when negative space available for discharging
-        def enforce_charge(model, t):
-            space_dis = day_data["space available for discharging (kWh)"].iloc[t]
-            if space_dis < 0:
-                verplicht_laden = abs(space_dis) / 0.25 / 1000
-                return model.charge[t] >= verplicht_laden
-            else:
-                return Constraint.Skip
-        model.enforce_charge = Constraint(model.T, rule=enforce_charge)
-
+    # Persistent mode: het dagmodel wordt één keer per daglengte gebouwd en daarna
+    # alleen nog met de data van de dag bijgewerkt (mutable parameters)
+    persistent_model = bool(getattr(config, 'PERSISTENT_MODEL', False))
+    model_params = {
+        'power_mw': power_mw,
+        'min_soc': min_soc,
+        'max_soc': max_soc,
+        'eff_ch': eff_ch,
+        'eff_dis': eff_dis,
+        'time_step_h': time_step_h,
+        'usable_capacity': usable_capacity,
+    }
+    day_models = {}
+
+    # LP-first: los elke dag eerst zonder binaries op, MILP alleen bij gelijktijdig laden/ontladen
+    lp_first = bool(getattr(config, 'LP_FIRST', False))
+    lp_days = 0
+    milp_days = 0
+
+    # Warm start: seed elke MILP met de schedule van de vorige dag (MIPStart).
+    # WARM_START_COMPARE lost elke dag ook koud op om de besparing in nodes/iteraties te meten.
+    warm_start = bool(getattr(config, 'WARM_START', False))
+    warm_start_compare = bool(getattr(config, 'WARM_START_COMPARE', False))
+    previous_schedule = None
+    solver_stats = []
+
+    # --- Solver (config.SOLVER, standaard CBC) ---
+    settings = solver_settings(config)
+    solver = get_solver(**settings, progress_callback=progress_callback)
+
+    # Resultaten: jaar-arrays die per dag in place gevuld worden op de rijposities van de dag,
+    # aan het eind één keer samengevoegd tot final_df (result_frame)
+    n_rows = len(df)
+    has_load_pv = 'load' in inputs and 'pv' in inputs
+    grid_base_kwh = (inputs['load'] - inputs['pv']) if has_load_pv else np.zeros(n_rows)
+    out = {col: np.full(n_rows, np.nan) for col in [
+        'space_for_charging_kWh', 'space_for_discharging_kWh', 'energy_charged_kWh', 'energy_discharged_kWh',
+        'SoC_kWh', 'SoC_pct', 'grid_exchange_kWh', 'e_program_kWh', 'day_ahead_result', 'imbalance_result',
+        'energy_tax', 'supplier_costs', 'transport_costs', 'total_result_imbalance_SAP']}
+    out['space_for_charging_kWh'] = inputs['space_ch']
+    out['space_for_discharging_kWh'] = inputs['space_dis']
+    out['e_program_kWh'][:] = 0  # E-programma is altijd 0 voor SAP (alleen batterij op SAP markt)
+    out['day_ahead_result'][:] = 0  # Day-ahead result is altijd 0 voor SAP (geen day-ahead trading)
+    filled = []
+
+    def store_day(pos, charge, discharge, soc):
+        """Energie, SoC en netuitwisseling van een dag in de jaar-arrays; geeft (laden, ontladen, net) in kWh."""
+        energy_charged = np.asarray(charge, dtype=float) * time_step_h * 1000  # kWh from grid to battery
+        energy_discharged = np.asarray(discharge, dtype=float) * time_step_h * 1000  # kWh from battery to grid
+        soc = np.asarray(soc, dtype=float)
+        grid_exchange = grid_base_kwh[pos] + energy_charged - energy_discharged
+        out['energy_charged_kWh'][pos] = energy_charged
+        out['energy_discharged_kWh'][pos] = energy_discharged
+        out['SoC_kWh'][pos] = soc * 1000
+        out['SoC_pct'][pos] = (soc - min_soc) / (max_soc - min_soc)  # SoC as a fraction of usable_capacity
+        out['grid_exchange_kWh'][pos] = grid_exchange
+        filled.append(pos)
+        return energy_charged, energy_discharged, grid_exchange
+
+    # Dagen en hun cycle budget (volatiliteit hangt niet af van de SoC keten, dus vooraf te bepalen)
+    day_positions = prepared.day_positions
+    days = []
+    day_volatility = []
+    day_budgets = []
+    for day, day_data in prepared.days:
         imbalance_prices = day_data[['price_shortage', 'price_surplus']].max(axis=1)
         today_volatility = imbalance_prices.std()
         vol_window.append(today_volatility)
@@ -149,69 +397,95 @@ def run_battery_trading(config, progress_callback=None):
 
         relative_vol = today_volatility / (rolling_mean + 1e-6)
         scaling_factor = min(1.5, max(0.5, relative_vol))
-        daily_cycle_budget = min(base_daily_cycle_budget * scaling_factor, remaining_cycles)
-
-        def daily_cycles(model):
-            daily_charge = sum(model.charge[t] for t in model.T) * time_step_h * eff_ch
-            daily_discharge = sum(model.discharge[t] for t in model.T) * time_step_h * eff_dis
-            return (daily_charge + daily_discharge) / (2 * usable_capacity) <= daily_cycle_budget
-        model.cycle_con = Constraint(rule=daily_cycles)
-
-        def objective(model):
-            return sum(
-                day_data["price_surplus"].iloc[t] * model.discharge[t] * time_step_h * eff_dis -
-                day_data["price_shortage"].iloc[t] * model.charge[t] * time_step_h * eff_ch
-                for t in model.T if day_data["regulation_state"].iloc[t] != 2
-            )
-        model.obj = Objective(rule=objective, sense=maximize)
+        days.append((day, day_data))
+        day_volatility.append(today_volatility)
+        day_budgets.append(base_daily_cycle_budget * scaling_factor)
+
+    # Parallelle modus: elke dag wordt vooraf (in een process pool) opgelost voor een klein grid van
+    # start SoC's. Daarna wordt de keten sequentieel aan elkaar geknoopt; dagen waarvan de echte
+    # start SoC niet op het grid ligt, of waarvan het budget door remaining_cycles wordt afgekapt,
+    # worden opnieuw opgelost.
+    parallel_days = bool(getattr(config, 'PARALLEL_DAYS', False))
+    speculative = {}
+    soc_grid = []
+    grid_days = 0
+    resolved_days = 0
+    if parallel_days:
+        soc_points = int(getattr(config, 'PARALLEL_SOC_POINTS', 3))
+        soc_tol = float(getattr(config, 'PARALLEL_SOC_TOL', 1e-6))  # MWh
+        # Ontdubbelen op afgeronde sleutels maar de echte waarden houden (afronden kan min_soc onder
+        # de ondergrens van de SoC variabele trekken), daarna binnen [min_soc, max_soc] klemmen
+        candidates = np.array([min_soc, current_soc, max_soc, *np.linspace(min_soc, max_soc, soc_points)], dtype=float)
+        _, first = np.unique(np.round(candidates, 9), return_index=True)
+        soc_grid = [min(max(float(s), min_soc), max_soc) for s in candidates[first]]
+        with ProcessPoolExecutor(max_workers=getattr(config, 'PARALLEL_WORKERS', None)) as pool:
+            futures = {
+                pool.submit(solve_day_candidates, len(day_data), model_params, day_inputs(prepared.day_arrays[day]), day_budgets[i], soc_grid, lp_first, settings): i
+                for i, (day, day_data) in enumerate(days)
+            }
+            for n, future in enumerate(as_completed(futures), 1):
+                speculative[futures[future]] = future.result()
+                msg = f"Parallel: {n}/{len(days)} dagen opgelost voor {len(soc_grid)} start SoC's"
+                if progress_callback:
+                    progress_callback(msg)
+                else:
+                    print(msg, end='\r')
 
-        model.final_soc_min = Constraint(expr=model.soc[T-1] + (
-            model.charge[T-1] * time_step_h * eff_ch - model.discharge[T-1] * time_step_h * eff_dis) >= min_soc)
+    for i, (day, day_data) in enumerate(days):
+        msg = f"Optimizing {day.strftime('%d-%m-%Y')}... Cycles used: {cumulative_cycles:.1f}/{max_cycles}"
+        if progress_callback:
+            progress_callback(msg)
+        else:
+            print(msg, end='\r')
 
-        model.final_soc_max = Constraint(expr=model.soc[T-1] + (
-            model.charge[T-1] * time_step_h * eff_ch - model.discharge[T-1] * time_step_h * eff_dis) <= max_soc)
+        T = len(day_data)
+        pos = day_positions[day]
+        today_volatility = day_volatility[i]
+        daily_cycle_budget = min(day_budgets[i], remaining_cycles)
 
         print(f"{day.strftime('%d-%m-%Y')} | Vol={today_volatility:.2f} | Budget={daily_cycle_budget:.2f} | Remaining={remaining_cycles:.1f}")
         if progress_callback:
             progress_callback(f"{day.strftime('%d-%m-%Y')} | Vol={today_volatility:.2f} | Budget={daily_cycle_budget:.2f} | Remaining={remaining_cycles:.1f}")
 
-        # Solve
-        # --- Start of new, robust code ---
-        
-        solver = None # Initialize solver as None
-        
-        # 1. First, try to use the local Windows executable.
-        #    This might work on your local computer.
-        local_cbc_path = os.path.join(os.path.dirname(__file__), 'Cbc-releases.2.10.12-w64-msvc16-md', 'bin', 'cbc.exe')
-        
-        if os.path.exists(local_cbc_path):
-            try:
-                solver = SolverFactory('cbc', executable=local_cbc_path)
-                print("Using local CBC solver.")
-            except Exception as e:
-                print(f"Failed to use local CBC solver: {e}")
-                solver = None # Ensure solver is None if it fails
-        
-        # 2. If the first attempt failed (solver is still None), fall back to the system solver.
-        #    This will work on your web app's Linux server.
-        if solver is None:
-            try:
-                solver = SolverFactory('cbc')
-                print("Using system-wide CBC solver.")
-            except ApplicationError:
-                # This error is raised if no solver can be found at all
-                raise ValueError(
-                    "CBC solver not found. Ensure it is installed and in your system's PATH, "
-                    "or include the executable with your app."
-                )
-        
-        # Now, you can safely use the solver
-        result = solver.solve(model)
-        
-        # --- End of new code ---
+        # Parallelle modus: gebruik de vooraf berekende oplossing als de start SoC op het grid ligt
+        from_grid = False
+        if i in speculative and daily_cycle_budget >= day_budgets[i]:
+            k = int(np.argmin(np.abs(np.array(soc_grid) - current_soc)))
+            if abs(soc_grid[k] - current_soc) <= soc_tol:
+                solution = speculative[i][k]
+                from_grid = True
+                grid_days += 1
+
+        if not from_grid:
+            if parallel_days:
+                resolved_days += 1
+            # Dagmodel: in persistent mode één model per daglengte (96, of 92/100 kwartieren op DST dagen)
+            if persistent_model:
+                model = day_models.get(T)
+                if model is None:
+                    model = build_day_model(T, model_params)
+                    day_models[T] = model
+            else:
+                model = build_day_model(T, model_params)
+
+            # Alleen de data van vandaag in het model zetten
+            update_day_model(model, day_inputs(prepared.day_arrays[day]), current_soc, daily_cycle_budget, model_params)
+
+            # Solve (solver is één keer buiten de dag-loop bepaald)
+            if warm_start:
+                seed = None
+                if previous_schedule is not None:
+                    seed = (previous_schedule[0], previous_schedule[1], current_soc, model_params)
+                result, milp_used = solve_day_recorded(solver, model, lp_first, seed, warm_start_compare,
+                                                       solver_stats, day.strftime('%d-%m-%Y'))
+            else:
+                result, milp_used = solve_day(solver, model, lp_first)
+            solution = extract_day_solution(model, result)
+            if solution is not None:
+                solution['milp'] = milp_used
 
         # Check for infeasibility
-        if (result.solver.status != SolverStatus.ok) or (result.solver.termination_condition == TerminationCondition.infeasible):
+        if solution is None:
             # Controleer eerst of het een kleine SoC overschrijding betreft die we kunnen tolereren
             soc_violation_detected = False
             
@@ -240,40 +514,10 @@ def run_battery_trading(config, progress_callback=None):
             
             # Als het een tolereerbare SoC overschrijding is, ga door met dummy resultaten
             if soc_violation_detected:
-                dummy_charge = [0.0] * T
-                dummy_discharge = [0.0] * T
-                dummy_soc = [current_soc] * T
-                dummy_revenue = [0.0] * T
-                dummy_supplier_costs = [0.0] * T
-                
-                day_data = day_data.copy()
-                day_data['space_for_charging_kWh'] = day_data['space available for charging (kWh)']
-                day_data['space_for_discharging_kWh'] = day_data['space available for discharging (kWh)']
-                day_data['energy_charged_kWh'] = [c * time_step_h * 1000 for c in dummy_charge]
-                day_data['energy_discharged_kWh'] = [d * time_step_h * 1000 for d in dummy_discharge]
-                day_data['SoC_kWh'] = [s * 1000 for s in dummy_soc]
-                day_data['SoC_pct'] = [(s - min_soc) / (max_soc - min_soc) for s in dummy_soc]
-                # Voeg grid_exchange_kWh toe voor SoC violation dagen
-                if 'load' in day_data.columns and 'production_PV' in day_data.columns:
-                    dummy_energy_charged_kwh = [c * time_step_h * 1000 for c in dummy_charge]
-                    dummy_energy_discharged_kwh = [d * time_step_h * 1000 for d in dummy_discharge]
-                    day_data['grid_exchange_kWh'] = (day_data['load'].values 
-                                                   - day_data['production_PV'].values 
-                                                   + np.array(dummy_energy_charged_kwh)      # Dummy laden (0)
-                                                   - np.array(dummy_energy_discharged_kwh))  # Dummy ontladen (0)
-                else:
-                    day_data['grid_exchange_kWh'] = 0
-                
-                # E-programma is altijd 0 voor SAP
-                day_data['e_program_kWh'] = 0
-                
-                # Day-ahead result is altijd 0 voor SAP
-                day_data['day_ahead_result'] = 0
-                
-                # Imbalance result voor SoC violation dagen
-                day_data['imbalance_result'] = dummy_revenue
-                day_data['supplier_costs'] = np.array(dummy_supplier_costs)
-                results.append(day_data)
+                # Batterij niet gebruikt: geen energie, SoC blijft staan, geen opbrengst en leveringskosten
+                store_day(pos, np.zeros(T), np.zeros(T), np.full(T, current_soc))
+                out['imbalance_result'][pos] = 0.0
+                out['supplier_costs'][pos] = 0.0
                 
                 warning_msg = f"Let op: Dag {day.strftime('%d-%m-%Y')} - kleine SoC overschrijding getolereerd, batterij niet gebruikt"
                 if progress_callback:
@@ -339,69 +583,31 @@ def run_battery_trading(config, progress_callback=None):
             else:
                 print(warning_msg)
             
-            # Creëer dummy resultaten voor deze dag (batterij doet niets)
-            dummy_charge = [0.0] * T
-            dummy_discharge = [0.0] * T
-            dummy_soc = [current_soc] * T
-            dummy_revenue = [0.0] * T
-            
-            # Bereken supplier_costs voor dummy dag (batterij doet niets, dus alleen based op normale grid exchange)
-            dummy_energy_charged_kwh = [c * time_step_h * 1000 for c in dummy_charge]
-            dummy_energy_discharged_kwh = [d * time_step_h * 1000 for d in dummy_discharge]
-            dummy_supplier_costs = [(charge_kwh - discharge_kwh) / 1000 * supply_costs for charge_kwh, discharge_kwh in zip(dummy_energy_charged_kwh, dummy_energy_discharged_kwh)]
-            
-            # Bereken transportkosten voor dummy dag
-            if 'load' in day_data.columns and 'production_PV' in day_data.columns:
-                dummy_net_grid_consumption_kwh = (day_data['load'].values 
-                                                 - day_data['production_PV'].values 
-                                                 + np.array(dummy_energy_charged_kwh)      # Dummy laden (0)
-                                                 - np.array(dummy_energy_discharged_kwh))  # Dummy ontladen (0)
-                dummy_transport_costs = [max(0, net_consumption) / 1000 * transport_costs for net_consumption in dummy_net_grid_consumption_kwh]
-            else:
-                dummy_transport_costs = [0.0] * len(dummy_energy_charged_kwh)
-            
-            # Voeg dummy data toe aan resultaten
-            day_data = day_data.copy()
-            day_data['space_for_charging_kWh'] = day_data['space available for charging (kWh)']
-            day_data['space_for_discharging_kWh'] = day_data['space available for discharging (kWh)']
-            day_data['energy_charged_kWh'] = dummy_energy_charged_kwh
-            day_data['energy_discharged_kWh'] = dummy_energy_discharged_kwh
-            day_data['SoC_kWh'] = [s * 1000 for s in dummy_soc]
-            day_data['SoC_pct'] = [(s - min_soc) / (max_soc - min_soc) for s in dummy_soc]
-            # Voeg grid_exchange_kWh toe voor dummy dagen
-            if 'load' in day_data.columns and 'production_PV' in day_data.columns:
-                day_data['grid_exchange_kWh'] = (day_data['load'].values 
-                                               - day_data['production_PV'].values 
-                                               + np.array(dummy_energy_charged_kwh)      # Dummy laden (0)
-                                               - np.array(dummy_energy_discharged_kwh))  # Dummy ontladen (0)
-            else:
-                day_data['grid_exchange_kWh'] = np.array(dummy_energy_charged_kwh) - np.array(dummy_energy_discharged_kwh)
-            
-            # E-programma is altijd 0 voor SAP
-            day_data['e_program_kWh'] = 0
-            
-            # Day-ahead result is altijd 0 voor SAP
-            day_data['day_ahead_result'] = 0
-            
-            # Imbalance result voor dummy dagen
-            day_data['imbalance_result'] = dummy_revenue
-            day_data['supplier_costs'] = np.array(dummy_supplier_costs)
-            day_data['transport_costs'] = dummy_transport_costs
-            results.append(day_data)
+            # Dummy resultaten voor deze dag (batterij doet niets)
+            energy_charged, energy_discharged, grid_exchange = store_day(pos, np.zeros(T), np.zeros(T), np.full(T, current_soc))
+            out['imbalance_result'][pos] = 0.0
+            out['supplier_costs'][pos] = (energy_charged - energy_discharged) / 1000 * supply_costs
+            # Transportkosten voor dummy dag (alleen normale netto afname, batterij doet niets)
+            out['transport_costs'][pos] = np.maximum(0, grid_exchange) / 1000 * transport_costs if has_load_pv else 0.0
             
             # Ga door naar de volgende dag
             continue
 
-        final_charge = model.charge[T-1]()
-        final_discharge = model.discharge[T-1]()
-        final_soc = model.soc[T-1]() + (
+        charge = solution['charge']
+        discharge = solution['discharge']
+        soc = solution['soc']
+        if solution['milp']:
+            milp_days += 1
+        else:
+            lp_days += 1
+
+        final_charge = charge[T-1]
+        final_discharge = discharge[T-1]
+        final_soc = soc[T-1] + (
             final_charge * time_step_h * eff_ch - final_discharge * time_step_h * eff_dis)
         final_soc = min(max(final_soc, min_soc), max_soc)
         current_soc = final_soc
-
-        charge = [model.charge[t]() for t in model.T]
-        discharge = [model.discharge[t]() for t in model.T]
-        soc = [model.soc[t]() for t in model.T]
+        previous_schedule = (charge, discharge)
 
         # New definition cycles: only charged energy counts
         charged_energy = sum(charge) * time_step_h  # in MWh
@@ -417,72 +623,29 @@ def run_battery_trading(config, progress_callback=None):
             day_data["price_shortage"].values * charge * time_step_h
         )
 
-        # Energy per timestep in kWh/15min (to/from grid)
-        energy_charged = [c * time_step_h * 1000 for c in charge]  # kWh from grid to battery
-        energy_discharged = [d * time_step_h * 1000 for d in discharge]  # kWh from battery to grid
-        # SoC as a fraction of usable_capacity
-        soc_frac = [(s - min_soc) / (max_soc - min_soc) for s in soc]
+        # Energy per timestep in kWh/15min (to/from grid), SoC en netuitwisseling in de jaar-arrays
+        energy_charged, energy_discharged, grid_exchange = store_day(pos, charge, discharge, soc)
 
         # Bereken supplier_costs: kosten voor netto energie die naar/van de batterij gaat
         # Positief = laden (kosten), negatief = ontladen (besparingen)
-        supplier_costs = [(charge_kwh - discharge_kwh) / 1000 * supply_costs for charge_kwh, discharge_kwh in zip(energy_charged, energy_discharged)]
-        
+        supplier_costs = (energy_charged - energy_discharged) / 1000 * supply_costs
+
         # Bereken transportkosten: alleen voor netto afname van het net
-        # Voor SAP algoritme: bereken totaal netto grid verbruik (load + batterij_laden - batterij_ontladen)
-        # Gebruik de load en PV data uit day_data indien beschikbaar
-        if 'load' in day_data.columns and 'production_PV' in day_data.columns:
-            # Netto grid verbruik = load - PV + batterij_laden - batterij_ontladen
-            net_grid_consumption_kwh = (day_data['load'].values 
-                                       - day_data['production_PV'].values 
-                                       + np.array(energy_charged)      # Laden = extra afname
-                                       - np.array(energy_discharged))  # Ontladen = minder afname
-            # Transportkosten alleen voor positieve (afname) uitwisseling
-            transport_costs_list = [max(0, net_consumption) / 1000 * transport_costs for net_consumption in net_grid_consumption_kwh]
+        # Netto grid verbruik = load - PV + batterij_laden - batterij_ontladen (zonder load/PV data: geen transportkosten)
+        if has_load_pv:
+            transport_costs_day = np.maximum(0, grid_exchange) / 1000 * transport_costs
         else:
-            # Fallback: geen PV data beschikbaar, geen transportkosten
-            transport_costs_list = [0.0] * len(energy_charged)
-
-        # Prepare columns for output - AANGEPAST VOOR JUISTE KOLOMNAMEN
-        soc_kwh = [s * 1000 for s in soc]  # SoC in kWh
-        day_data = day_data.copy()
-        
-        # Voeg de juiste kolommen toe met lowercase namen zoals verwacht door run_model.py
-        day_data['space_for_charging_kWh'] = day_data['space available for charging (kWh)']
-        day_data['space_for_discharging_kWh'] = day_data['space available for discharging (kWh)']
-        day_data['energy_charged_kWh'] = energy_charged
-        day_data['energy_discharged_kWh'] = energy_discharged
-        day_data['SoC_kWh'] = soc_kwh
-        day_data['SoC_pct'] = soc_frac
-        # Voeg grid_exchange_kWh toe (netto grid uitwisseling)
-        if 'load' in day_data.columns and 'production_PV' in day_data.columns:
-            day_data['grid_exchange_kWh'] = (day_data['load'].values 
-                                           - day_data['production_PV'].values 
-                                           + np.array(energy_charged)      # Laden = extra afname
-                                           - np.array(energy_discharged))  # Ontladen = minder afname
-        else:
-            day_data['grid_exchange_kWh'] = np.array(energy_charged) - np.array(energy_discharged)
-        
-        # E-programma is altijd 0 voor SAP (alleen batterij op SAP markt)
-        day_data['e_program_kWh'] = 0
-        
-        # Day-ahead result is altijd 0 voor SAP (geen day-ahead trading)
-        day_data['day_ahead_result'] = 0
-        
-        # Imbalance result is de revenue uit onbalanshandel
-        day_data['imbalance_result'] = revenue
-        day_data['energy_tax'] = 0  # Niet van toepassing voor SAP (0 blijft 0)
-        day_data['supplier_costs'] = -np.abs(np.array(supplier_costs))  # Altijd negatief (kosten)
-        day_data['transport_costs'] = -np.abs(np.array(transport_costs_list))  # Altijd negatief (kosten)
-        
+            transport_costs_day = np.zeros(T)
+
+        out['imbalance_result'][pos] = revenue  # Imbalance result is de revenue uit onbalanshandel
+        out['energy_tax'][pos] = 0  # Niet van toepassing voor SAP
+        out['supplier_costs'][pos] = -np.abs(supplier_costs)  # Altijd negatief (kosten)
+        out['transport_costs'][pos] = -np.abs(transport_costs_day)  # Altijd negatief (kosten)
+
         # Total result = onbalans revenue + alle extra kosten
-        total_result = (revenue + 
-                       day_data['energy_tax'] + 
-                       day_data['supplier_costs'] + 
-                       day_data['transport_costs'])
-        day_data['total_result_imbalance_SAP'] = total_result
-        results.append(day_data)
+        out['total_result_imbalance_SAP'][pos] = revenue + out['supplier_costs'][pos] + out['transport_costs'][pos]
 
-    final_df = pd.concat(results)
+    final_df = result_frame(df, out, filled)
 
     total_revenue = final_df["total_result_imbalance_SAP"].sum()
     total_cycles = cumulative_cycles
@@ -498,6 +661,38 @@ def run_battery_trading(config, progress_callback=None):
         "infeasible_days": infeasible_days
     }
 
+    if lp_first:
+        summary["lp_first"] = {"lp_days": lp_days, "milp_days": milp_days}
+    if warm_start:
+        summary["warm_start"] = warm_start_summary(solver_stats)
+
+    if parallel_days:
+        summary["parallel"] = {
+            "soc_grid": soc_grid,
+            "days": len(days),
+            "grid_days": grid_days,
+            "resolved_days": resolved_days,
+        }
+        # Optioneel: vergelijk met de sequentiële run om de afwijking in revenue te rapporteren
+        if getattr(config, 'PARALLEL_COMPARE', False):
+            config.PARALLEL_DAYS = False
+            try:
+                _, sequential_summary = run_battery_trading(config, progress_callback)
+            finally:
+                config.PARALLEL_DAYS = True
+            sequential_revenue = sequential_summary["total_revenue"]
+            deviation = total_revenue - sequential_revenue
+            summary["parallel"]["sequential_revenue"] = sequential_revenue
+            summary["parallel"]["revenue_deviation"] = deviation
+            summary["parallel"]["revenue_deviation_pct"] = (
+                deviation / abs(sequential_revenue) * 100 if sequential_revenue else float('nan'))
+            msg = (f"Parallel vs sequentieel: {total_revenue:.2f} vs {sequential_revenue:.2f} "
+                   f"(afwijking {deviation:.2f}, {resolved_days}/{len(days)} dagen opnieuw opgelost)")
+            if progress_callback:
+                progress_callback(msg)
+            else:
+                print(msg)
+
     return final_df, summary
 
 
@@ -1,8 +1,9 @@
-import pandas as pd
 import numpy as np
 from pyomo.environ import *
-
-import os
+from imbalance_algorithm_SAP import solve_day, solve_day_recorded, warm_start_summary, extract_day_solution, result_frame
+from dp_dispatch import solve_day_dp, DEFAULT_SOC_STEPS
+from ingestion import prepare_input
+from solver_backends import get_solver, solver_settings
 
 def get_energy_tax_table():
     """
@@ -28,18 +29,156 @@ def calculate_energy_tax(total_consumption_mwh, tax_table):
     # Fallback naar hoogste bracket
     return tax_table['consumption_brackets'][-1]['tax_eur_per_mwh']
 
+def build_day_template(T, params):
+    """
+    Bouw het dagmodel (T kwartieren) één keer met mutable parameters.
+    De data van een dag wordt er met set_day_data() in gezet.
+    """
+    power_mw = params['power_mw']
+    min_soc = params['min_soc']
+    max_soc = params['max_soc']
+    eff_ch = params['eff_ch']
+    eff_dis = params['eff_dis']
+    time_step_h = params['time_step_h']
+    usable_capacity = params['usable_capacity']
+
+    model = ConcreteModel()
+    model.T = RangeSet(0, T-1)
+
+    # Dagdata als mutable Params
+    model.load_profile = Param(model.T, mutable=True, initialize=0.0)
+    model.pv = Param(model.T, mutable=True, initialize=0.0)
+    model.price_shortage = Param(model.T, mutable=True, initialize=0.0)
+    model.price_surplus = Param(model.T, mutable=True, initialize=0.0)
+    model.price_day_ahead = Param(model.T, mutable=True, initialize=0.0)
+    model.e_program = Param(model.T, mutable=True, initialize=0.0)
+    model.charge_ub = Param(model.T, mutable=True, initialize=0.0)
+    model.discharge_ub = Param(model.T, mutable=True, initialize=0.0)
+    model.min_charge = Param(model.T, mutable=True, initialize=0.0)  # verplicht laden (MW)
+    model.min_discharge = Param(model.T, mutable=True, initialize=0.0)  # verplicht ontladen (MW)
+    model.cycle_budget = Param(mutable=True, initialize=0.0)
+
+    # Binary variable: 1 = charging, 0 = discharging
+    model.charge_state = Var(model.T, within=Binary)
+
+    # Maximum laad/ontlaad vermogen per tijdstap (ruimte op de aansluiting)
+    model.charge = Var(model.T, within=NonNegativeReals, bounds=lambda m, t: (0, m.charge_ub[t]))
+    model.discharge = Var(model.T, within=NonNegativeReals, bounds=lambda m, t: (0, m.discharge_ub[t]))
+    model.soc = Var(model.T, within=NonNegativeReals, bounds=(min_soc, max_soc))
+    model.soc[0].fix(min_soc)
+
+    # Constraint: never charge and discharge at the same time
+    M = power_mw
+    def no_simultaneous_charge(model, t):
+        return model.charge[t] <= M * model.charge_state[t]
+    model.no_simul_charge = Constraint(model.T, rule=no_simultaneous_charge)
+    def no_simultaneous_discharge(model, t):
+        return model.discharge[t] <= M * (1 - model.charge_state[t])
+    model.no_simul_discharge = Constraint(model.T, rule=no_simultaneous_discharge)
+
+    def soc_balance(model, t):
+        if t == 0: return Constraint.Skip
+        return model.soc[t] == model.soc[t-1] + (
+            model.charge[t-1] * time_step_h * eff_ch -
+            model.discharge[t-1] * time_step_h / eff_dis)
+    model.soc_con = Constraint(model.T, rule=soc_balance)
+
+    # Hard constraints: verplicht ontladen/laden bij negatieve ruimte (0 = geen verplichting)
+    model.enforce_discharge = Constraint(model.T, rule=lambda m, t: m.discharge[t] >= m.min_discharge[t])
+    model.enforce_charge = Constraint(model.T, rule=lambda m, t: m.charge[t] >= m.min_charge[t])
+
+    # Cycles constraint met daily budget
+    def daily_cycles(model):
+        daily_charge = sum(model.charge[t] for t in model.T) * time_step_h * eff_ch
+        daily_discharge = sum(model.discharge[t] for t in model.T) * time_step_h * eff_dis
+        return (daily_charge + daily_discharge) / (2 * usable_capacity) <= model.cycle_budget
+    model.cycle_con = Constraint(rule=daily_cycles)
+
+    # Netto netpositie per timestep als Pyomo variabelen
+    model.netpos = Var(model.T, within=Reals)
+    model.netpos_pos = Var(model.T, within=NonNegativeReals)
+    model.netpos_neg = Var(model.T, within=NonNegativeReals)
+
+    # E-programma en onbalans variabelen
+    model.imbalance = Var(model.T, within=Reals)
+    model.imbalance_pos = Var(model.T, within=NonNegativeReals)  # Meer afgenomen dan voorspeld
+    model.imbalance_neg = Var(model.T, within=NonNegativeReals)  # Meer ingevoed dan voorspeld
+
+    def netpos_def(model, t):
+        return model.netpos[t] == model.load_profile[t] - model.pv[t] + (model.charge[t] - model.discharge[t]) * time_step_h
+    model.netpos_con = Constraint(model.T, rule=netpos_def)
+
+    def netpos_split(model, t):
+        return model.netpos[t] == model.netpos_pos[t] - model.netpos_neg[t]
+    model.netpos_split_con = Constraint(model.T, rule=netpos_split)
+
+    # Onbalans berekening: verschil tussen werkelijke netpos en e-programma
+    def imbalance_def(model, t):
+        return model.imbalance[t] == model.netpos[t] - model.e_program[t]
+    model.imbalance_con = Constraint(model.T, rule=imbalance_def)
+
+    def imbalance_split(model, t):
+        return model.imbalance[t] == model.imbalance_pos[t] - model.imbalance_neg[t]
+    model.imbalance_split_con = Constraint(model.T, rule=imbalance_split)
+
+    # Objective: minimaliseer totale kosten (day-ahead kosten voor e-programma + onbalanskosten voor afwijkingen)
+    def objective(model):
+        # Day-ahead kosten voor e-programma (positief = afname = kosten, negatief = invoeding = opbrengst)
+        day_ahead_term = sum(
+            model.price_day_ahead[t] * model.e_program[t] for t in model.T
+        )
+        # Onbalanskosten voor afwijkingen (positief = shortage kosten, negatief = surplus opbrengst)
+        imbalance_term = sum(
+            model.price_shortage[t] * model.imbalance_pos[t] - model.price_surplus[t] * model.imbalance_neg[t]
+            for t in model.T
+        )
+        return day_ahead_term + imbalance_term
+    model.obj = Objective(rule=objective, sense=minimize)
+
+    # Eind-SoC constraint
+    model.final_soc_min = Constraint(expr=model.soc[T-1] + (
+        model.charge[T-1] * time_step_h * eff_ch - model.discharge[T-1] * time_step_h * eff_dis) >= min_soc)
+    model.final_soc_max = Constraint(expr=model.soc[T-1] + (
+        model.charge[T-1] * time_step_h * eff_ch - model.discharge[T-1] * time_step_h * eff_dis) <= max_soc)
+
+    return model
+
+def set_day_data(model, day, current_soc, daily_cycle_budget, params):
+    """
+    Zet de data van één dag (dict met numpy slices: pv, load in MWh, prijzen, space in kWh)
+    in een template van build_day_template().
+    """
+    power_mw = params['power_mw']
+    space_ch = day['space_ch']
+    space_dis = day['space_dis']
+
+    # Verplicht laden/ontladen bij negatieve ruimte; upper bound is minimaal de verplichting
+    verplicht_laden = np.where(space_dis < 0, np.abs(space_dis) / 0.25 / 1000, 0.0)
+    verplicht_ontladen = np.where(space_ch < 0, np.abs(space_ch) / 0.25 / 1000, 0.0)
+    charge_ub = np.maximum(np.minimum(power_mw, space_ch / 0.25 / 1000), verplicht_laden)
+    discharge_ub = np.maximum(np.minimum(power_mw, space_dis / 0.25 / 1000), verplicht_ontladen)
+
+    # E-programma (voorspelling gebaseerd op load/PV zonder batterij)
+    e_program = (day['load'] - day['pv']) * params['e_program_factor']
+
+    for param, values in ((model.load_profile, day['load']),
+                          (model.pv, day['pv']),
+                          (model.price_shortage, day['price_shortage']),
+                          (model.price_surplus, day['price_surplus']),
+                          (model.price_day_ahead, day['price_day_ahead']),
+                          (model.e_program, e_program),
+                          (model.charge_ub, charge_ub),
+                          (model.discharge_ub, discharge_ub),
+                          (model.min_charge, verplicht_laden),
+                          (model.min_discharge, verplicht_ontladen)):
+        param.store_values(dict(enumerate(np.asarray(values, dtype=float).tolist())))
+    model.cycle_budget = float(daily_cycle_budget)
+    model.soc[0].fix(current_soc)
+
 def run_battery_trading(config, progress_callback=None):
-    # Read Excel sheet
-    df = config.input_data.copy()
-    datetime_col = None
-    for col in df.columns:
-        if col.strip().lower() == 'datetime':
-            datetime_col = col
-            break
-    if not datetime_col:
-        raise ValueError("No column 'Datetime' or 'datetime' found in the 'Export naar Python' sheet.")
-    df[datetime_col] = pd.to_datetime(df[datetime_col])
-    df.set_index(datetime_col, inplace=True)
+    # Input (datetime index en kolomcontrole) via de gedeelde inleeslaag
+    prepared = prepare_input(config, 'imbalance_pap')
+    df, inputs = prepared.frame, prepared.arrays
 
     # Use config
     power_mw = config.POWER_MW
@@ -94,12 +233,11 @@ def run_battery_trading(config, progress_callback=None):
         marginal_tax_rate = tax_table['consumption_brackets'][0]['tax_eur_per_mwh']
 
     # Initialization
-    total_days = len(df.groupby(pd.Grouper(freq='D')))
+    total_days = prepared.total_days
     base_daily_cycle_budget = max_cycles / total_days
     remaining_cycles = max_cycles
     vol_window = []
 
-    results = []
     # Make initial SoC configurable
     if hasattr(config, 'INIT_SOC'):
         current_soc = float(config.INIT_SOC) * capacity_mwh
@@ -111,21 +249,140 @@ def run_battery_trading(config, progress_callback=None):
     # Lijst om infeasible dagen bij te houden
     infeasible_days = []
 
-    for day, day_data in df.groupby(pd.Grouper(freq='D')):
-        if len(day_data) == 0:
-            continue
+    # Jaar-arrays (voorbereid in PreparedInput); per dag gaan alleen de dagslices het template model in
+    year_arrays = {
+        'pv': inputs['pv_mwh'],  # MWh
+        'load': inputs['load_mwh'],  # MWh
+        'price_shortage': inputs['price_shortage'],
+        'price_surplus': inputs['price_surplus'],
+        'price_day_ahead': inputs['price_da'],
+        'space_ch': inputs['space_ch'],
+        'space_dis': inputs['space_dis'],
+    }
+    day_positions = prepared.day_positions
+
+    # Resultaten: jaar-arrays die per dag in place gevuld worden op de rijposities van de dag,
+    # aan het eind één keer samengevoegd tot final_df (result_frame)
+    n_rows = len(df)
+    space_columns = ['space available for charging (kWh)', 'space available for discharging (kWh)']
+    out = {col: np.full(n_rows, np.nan) for col in [
+        'space_for_charging_kWh', 'space_for_discharging_kWh', 'energy_charged_kWh', 'energy_discharged_kWh',
+        'SoC_kWh', 'SoC_pct', 'grid_exchange_kWh', 'e_program_kWh', 'day_ahead_result', 'imbalance_result',
+        'energy_tax', 'supplier_costs', 'transport_costs', 'total_result_imbalance_PAP']}
+    out['space_for_charging_kWh'] = year_arrays['space_ch']
+    out['space_for_discharging_kWh'] = year_arrays['space_dis']
+    load_kwh = inputs['load']
+    pv_kwh = inputs['pv']
+    filled = []
+
+    def store_day(pos, charge, discharge, soc):
+        """Bereken alle resultaatkolommen van een dag (laden/ontladen in MW, SoC in MWh) en zet ze in de jaar-arrays."""
+        charge = np.asarray(charge, dtype=float)
+        discharge = np.asarray(discharge, dtype=float)
+        soc = np.asarray(soc, dtype=float)
+        load = year_arrays['load'][pos]
+        pv = year_arrays['pv'][pos]
+
+        # Netto netpositie na batterij
+        netpos = load - pv + (charge - discharge) * time_step_h
+
+        # Bereken e-programma (voorspelling) gebaseerd op de werkelijke load/PV zonder batterij
+        # E-programma is percentage van werkelijke afname/invoeding
+        netpos_without_battery = load - pv  # Zonder batterij invloed
+        e_program_netpos = netpos_without_battery * (e_program_percentage / 100.0)
+
+        # Bereken onbalans: verschil tussen werkelijke netpositie en e-programma
+        imbalance = netpos - e_program_netpos
+
+        # Bereken day-ahead kosten voor het e-programma
+        price_day_ahead = year_arrays['price_day_ahead'][pos]
+        day_ahead_costs = np.where(e_program_netpos > 0, -price_day_ahead * e_program_netpos, price_day_ahead * abs(e_program_netpos))
+
+        # Onbalanskosten/-opbrengsten berekenen voor afwijkingen van e-programma:
+        # Positieve onbalans (meer afgenomen dan voorspeld) -> shortage prijs betalen
+        # Negatieve onbalans (meer ingevoed dan voorspeld) -> surplus prijs ontvangen
+        price_shortage = year_arrays['price_shortage'][pos]
+        price_surplus = year_arrays['price_surplus'][pos]
+        imbalance_costs = np.where(imbalance > 0, -price_shortage * imbalance, price_surplus * abs(imbalance))
+
+        # Totale kosten = day-ahead kosten voor e-programma + onbalanskosten voor afwijkingen
+        opbrengst_kosten = day_ahead_costs + imbalance_costs
 
+        # Transportkosten alleen voor positieve netpos (netto afname van het net)
+        transport_costs_per_timestep = np.maximum(0, netpos) * transport_costs  # MWh * €/MWh
+
+        # Bereken energy_tax en supplier_costs gebaseerd op netto grid verbruik
+        # Netto grid verbruik = load - PV + batterij laden - batterij ontladen (zoals in day-ahead algoritme)
+        net_grid_consumption_kwh = (load_kwh[pos] - pv_kwh[pos]
+                                    + charge * time_step_h * 1000      # Laden = extra afname (kWh)
+                                    - discharge * time_step_h * 1000)  # Ontladen = minder afname (kWh)
+        net_grid_consumption_mwh = net_grid_consumption_kwh / 1000  # Converteer naar MWh
+        # Energiebelasting alleen voor positief verbruik (afname van net) - altijd negatief (kosten)
+        energy_tax_costs = np.where(net_grid_consumption_mwh > 0, -net_grid_consumption_mwh * marginal_tax_rate, 0)
+        # Leveringskosten gelden voor absolute waarde van afname EN invoeding - altijd negatief (kosten)
+        supplier_cost_values = -np.abs(net_grid_consumption_mwh) * supply_costs
+
+        out['energy_charged_kWh'][pos] = charge * time_step_h * 1000
+        out['energy_discharged_kWh'][pos] = discharge * time_step_h * 1000
+        out['SoC_kWh'][pos] = soc * 1000  # SoC in kWh
+        out['SoC_pct'][pos] = (soc - min_soc) / (max_soc - min_soc)
+        out['grid_exchange_kWh'][pos] = netpos * 1000  # Converteer naar kWh voor export
+        out['e_program_kWh'][pos] = e_program_netpos * 1000  # Converteer naar kWh voor export
+        out['day_ahead_result'][pos] = day_ahead_costs  # Kan positief (inkomsten) of negatief (kosten) zijn
+        out['imbalance_result'][pos] = imbalance_costs  # Kan positief (inkomsten) of negatief (kosten) zijn
+        out['energy_tax'][pos] = energy_tax_costs
+        out['supplier_costs'][pos] = supplier_cost_values
+        out['transport_costs'][pos] = -transport_costs_per_timestep  # Altijd negatief (kosten)
+        # Total result = day-ahead + imbalance + alle extra kosten
+        out['total_result_imbalance_PAP'][pos] = (opbrengst_kosten + energy_tax_costs +
+                                                  supplier_cost_values - transport_costs_per_timestep)
+        filled.append(pos)
+
+    model_params = {
+        'power_mw': power_mw,
+        'min_soc': min_soc,
+        'max_soc': max_soc,
+        'eff_ch': eff_ch,
+        'eff_dis': eff_dis,
+        'time_step_h': time_step_h,
+        'usable_capacity': usable_capacity,
+        'e_program_factor': e_program_percentage / 100.0,
+    }
+    day_templates = {}
+
+    # LP-first: los elke dag eerst zonder binaries op, MILP alleen bij gelijktijdig laden/ontladen
+    lp_first = bool(getattr(config, 'LP_FIRST', False))
+    lp_days = 0
+    milp_days = 0
+
+    # Warm start: seed elke MILP met de schedule van de vorige dag (MIPStart).
+    # WARM_START_COMPARE lost elke dag ook koud op om de besparing in nodes/iteraties te meten.
+    warm_start = bool(getattr(config, 'WARM_START', False))
+    warm_start_compare = bool(getattr(config, 'WARM_START_COMPARE', False))
+    previous_schedule = None
+    solver_stats = []
+
+    # Dag engine: 'milp' (Pyomo + config.SOLVER, standaard) of 'dp' (NumPy DP, geen solver nodig, zie dp_dispatch.py)
+    dp_engine = getattr(config, 'IMBALANCE_ENGINE', 'milp') == 'dp'
+    dp_soc_steps = int(getattr(config, 'DP_SOC_STEPS', DEFAULT_SOC_STEPS))
+
+    # --- Solver (config.SOLVER, standaard CBC) ---
+    solver = None if dp_engine else get_solver(**solver_settings(config), progress_callback=progress_callback)
+
+    for day, day_data in prepared.days:
         msg = f"Optimizing {day.strftime('%d-%m-%Y')}... Cycles used: {cumulative_cycles:.1f}/{max_cycles}"
         if progress_callback:
             progress_callback(msg)
         else:
             print(msg, end='\r')
 
-        # Zet inputdata om naar numpy arrays voor Pyomo Param
-        pv = day_data["production_PV"].values / 1000  # MWh
-        load = day_data["load"].values / 1000         # MWh
-        price_shortage = day_data["price_shortage"].values
-        price_surplus = day_data["price_surplus"].values
+        # Voorbereide dagslices (PreparedInput) voor deze dag
+        pos = day_positions[day]
+        today = prepared.day_arrays[day]
+        pv = today['pv_mwh']  # MWh
+        load = today['load_mwh']  # MWh
+        price_shortage = today['price_shortage']
+        price_surplus = today['price_surplus']
         
         # Bereken volatiliteit en dagelijks cycle budget (zoals in SAP)
         imbalance_prices = day_data[['price_shortage', 'price_surplus']].max(axis=1)
@@ -141,177 +398,40 @@ def run_battery_trading(config, progress_callback=None):
         print(f"{day.strftime('%d-%m-%Y')} | Vol={today_volatility:.2f} | Budget={daily_cycle_budget:.2f} | Remaining={remaining_cycles:.1f}")
         if progress_callback:
             progress_callback(f"{day.strftime('%d-%m-%Y')} | Vol={today_volatility:.2f} | Budget={daily_cycle_budget:.2f} | Remaining={remaining_cycles:.1f}")
-        # Create model
-        model = ConcreteModel()
         T = len(day_data)
-        model.T = RangeSet(0, T-1)
-
-        # Binary variable: 1 = charging, 0 = discharging
-        model.charge_state = Var(model.T, within=Binary)
-
-        # Determine maximum charge and discharge power per timestep (based on the available space on the grid connection)
-        def charge_bound(model, t):
-            space_mw = (day_data["space available for charging (kWh)"].iloc[t] / 0.25) / 1000
-            verplicht_laden = 0
-            space_dis = day_data["space available for discharging (kWh)"].iloc[t]
-            if space_dis < 0:
-                verplicht_laden = abs(space_dis) / 0.25 / 1000
-            upper = max(min(power_mw, space_mw), verplicht_laden)
-            return (0, upper)
-        def discharge_bound(model, t):
-            space_mw = (day_data["space available for discharging (kWh)"].iloc[t] / 0.25) / 1000
-            verplicht_ontladen = 0
-            space_ch = day_data["space available for charging (kWh)"].iloc[t]
-            if space_ch < 0:
-                verplicht_ontladen = abs(space_ch) / 0.25 / 1000
-            upper = max(min(power_mw, space_mw), verplicht_ontladen)
-            return (0, upper)
-        model.charge = Var(model.T, within=NonNegativeReals, bounds=charge_bound)
-        model.discharge = Var(model.T, within=NonNegativeReals, bounds=discharge_bound)
-        model.soc = Var(model.T, within=NonNegativeReals, bounds=(min_soc, max_soc))
-        model.soc[0].fix(current_soc)
-
-        # Constraint: never charge and discharge at the same time
-        M = power_mw
-        def no_simultaneous_charge(model, t):
-            return model.charge[t] <= M * model.charge_state[t]
-        model.no_simul_charge = Constraint(model.T, rule=no_simultaneous_charge)
-        def no_simultaneous_discharge(model, t):
-            return model.discharge[t] <= M * (1 - model.charge_state[t])
-        model.no_simul_discharge = Constraint(model.T, rule=no_simultaneous_discharge)
-
-        def soc_balance(model, t):
-            if t == 0: return Constraint.Skip
-            return model.soc[t] == model.soc[t-1] + (
-                model.charge[t-1] * time_step_h * eff_ch -
-                model.discharge[t-1] * time_step_h / eff_dis)
-        model.soc_con = Constraint(model.T, rule=soc_balance)
-
-        # Hard constraint: mandatory discharge when negative space available for charging
-        def enforce_discharge(model, t):
-            space_ch = day_data["space available for charging (kWh)"].iloc[t]
-            if space_ch < 0:
-                verplicht_ontladen = abs(space_ch) / 0.25 / 1000
-                return model.discharge[t] >= verplicht_ontladen
-            else:
-                return Constraint.Skip
-        model.enforce_discharge = Constraint(model.T, rule=enforce_discharge)
-
-        # Hard constraint: mandatory charge when negative space available for discharging
-        def enforce_charge(model, t):
-            space_dis = day_data["space available for discharging (kWh)"].iloc[t]
-            if space_dis < 0:
-                verplicht_laden = abs(space_dis) / 0.25 / 1000
-                return model.charge[t] >= verplicht_laden
+        day_arrays = {
+            'pv': pv,
+            'load': load,
+            'price_shortage': price_shortage,
+            'price_surplus': price_surplus,
+            'price_day_ahead': today['price_da'],
+            'space_ch': today['space_ch'],
+            'space_dis': today['space_dis'],
+        }
+        if dp_engine:
+            solution = solve_day_dp(day_arrays, current_soc, daily_cycle_budget, model_params, dp_soc_steps)
+            milp_used = False
+        else:
+            # Template model per daglengte (96, of 92/100 kwartieren op DST dagen), alleen de dagdata wordt bijgewerkt
+            model = day_templates.get(T)
+            if model is None:
+                model = build_day_template(T, model_params)
+                day_templates[T] = model
+            set_day_data(model, day_arrays, current_soc, daily_cycle_budget, model_params)
+
+            # Solve (solver is één keer buiten de dag-loop bepaald)
+            if warm_start:
+                seed = None
+                if previous_schedule is not None:
+                    seed = (previous_schedule[0], previous_schedule[1], current_soc, model_params)
+                result, milp_used = solve_day_recorded(solver, model, lp_first, seed, warm_start_compare,
+                                                       solver_stats, day.strftime('%d-%m-%Y'))
             else:
-                return Constraint.Skip
-        model.enforce_charge = Constraint(model.T, rule=enforce_charge)
-
-        # Cycles constraint met daily budget
-        def daily_cycles(model):
-            daily_charge = sum(model.charge[t] for t in model.T) * time_step_h * eff_ch
-            daily_discharge = sum(model.discharge[t] for t in model.T) * time_step_h * eff_dis
-            return (daily_charge + daily_discharge) / (2 * usable_capacity) <= daily_cycle_budget
-        model.cycle_con = Constraint(rule=daily_cycles)
-
-        # Netto netpositie per timestep als Pyomo variabelen
-        model.netpos = Var(model.T, within=Reals)
-        model.netpos_pos = Var(model.T, within=NonNegativeReals)
-        model.netpos_neg = Var(model.T, within=NonNegativeReals)
-        
-        # E-programma en onbalans variabelen
-        model.imbalance = Var(model.T, within=Reals)
-        model.imbalance_pos = Var(model.T, within=NonNegativeReals)  # Meer afgenomen dan voorspeld
-        model.imbalance_neg = Var(model.T, within=NonNegativeReals)  # Meer ingevoed dan voorspeld
-        
-        # Zet data om naar Pyomo Parameters
-        model.load_profile = Param(model.T, initialize={t: float(load[t]) for t in range(T)})
-        model.pv = Param(model.T, initialize={t: float(pv[t]) for t in range(T)})
-        model.price_shortage = Param(model.T, initialize={t: float(price_shortage[t]) for t in range(T)})
-        model.price_surplus = Param(model.T, initialize={t: float(price_surplus[t]) for t in range(T)})
-        
-        # Day-ahead prijzen
-        price_day_ahead = day_data["price_day_ahead"].values
-        model.price_day_ahead = Param(model.T, initialize={t: float(price_day_ahead[t]) for t in range(T)})
-        
-        # E-programma parameters (voorspelling gebaseerd op load/PV zonder batterij)
-        netpos_without_battery = load - pv
-        e_program_factor = e_program_percentage / 100.0
-        model.e_program = Param(model.T, initialize={t: float(netpos_without_battery[t] * e_program_factor) for t in range(T)})
-        
-        def netpos_def(model, t):
-            return model.netpos[t] == model.load_profile[t] - model.pv[t] + (model.charge[t] - model.discharge[t]) * time_step_h
-        model.netpos_con = Constraint(model.T, rule=netpos_def)
-        
-        def netpos_split(model, t):
-            return model.netpos[t] == model.netpos_pos[t] - model.netpos_neg[t]
-        model.netpos_split_con = Constraint(model.T, rule=netpos_split)
-        
-        # Onbalans berekening: verschil tussen werkelijke netpos en e-programma
-        def imbalance_def(model, t):
-            return model.imbalance[t] == model.netpos[t] - model.e_program[t]
-        model.imbalance_con = Constraint(model.T, rule=imbalance_def)
-        
-        def imbalance_split(model, t):
-            return model.imbalance[t] == model.imbalance_pos[t] - model.imbalance_neg[t]
-        model.imbalance_split_con = Constraint(model.T, rule=imbalance_split)
-        
-        # Objective: minimaliseer totale kosten (day-ahead kosten voor e-programma + onbalanskosten voor afwijkingen)
-        def objective(model):
-            # Day-ahead kosten voor e-programma (positief = afname = kosten, negatief = invoeding = opbrengst)
-            day_ahead_term = sum(
-                model.price_day_ahead[t] * model.e_program[t] for t in model.T
-            )
-            # Onbalanskosten voor afwijkingen (positief = shortage kosten, negatief = surplus opbrengst)
-            imbalance_term = sum(
-                model.price_shortage[t] * model.imbalance_pos[t] - model.price_surplus[t] * model.imbalance_neg[t]
-                for t in model.T
-            )
-            return day_ahead_term + imbalance_term
-        model.obj = Objective(rule=objective, sense=minimize)
-
-        # Eind-SoC constraint
-        model.final_soc_min = Constraint(expr=model.soc[T-1] + (
-            model.charge[T-1] * time_step_h * eff_ch - model.discharge[T-1] * time_step_h * eff_dis) >= min_soc)
-        model.final_soc_max = Constraint(expr=model.soc[T-1] + (
-            model.charge[T-1] * time_step_h * eff_ch - model.discharge[T-1] * time_step_h * eff_dis) <= max_soc)
-
-        # Solve
-        # --- Start of new, robust code ---
-        
-        solver = None # Initialize solver as None
-        
-        # 1. First, try to use the local Windows executable.
-        #    This might work on your local computer.
-        local_cbc_path = os.path.join(os.path.dirname(__file__), 'Cbc-releases.2.10.12-w64-msvc16-md', 'bin', 'cbc.exe')
-        
-        if os.path.exists(local_cbc_path):
-            try:
-                solver = SolverFactory('cbc', executable=local_cbc_path)
-                print("Using local CBC solver.")
-            except Exception as e:
-                print(f"Failed to use local CBC solver: {e}")
-                solver = None # Ensure solver is None if it fails
-        
-        # 2. If the first attempt failed (solver is still None), fall back to the system solver.
-        #    This will work on your web app's Linux server.
-        if solver is None:
-            try:
-                solver = SolverFactory('cbc')
-                print("Using system-wide CBC solver.")
-            except ApplicationError:
-                # This error is raised if no solver can be found at all
-                raise ValueError(
-                    "CBC solver not found. Ensure it is installed and in your system's PATH, "
-                    "or include the executable with your app."
-                )
+                result, milp_used = solve_day(solver, model, lp_first)
+            solution = extract_day_solution(model, result)
         
-        # Now, you can safely use the solver
-        result = solver.solve(model)
-        
-        # --- End of new code ---
         # Check for infeasibility
-        if (result.solver.status != SolverStatus.ok) or (result.solver.termination_condition == TerminationCondition.infeasible):
+        if solution is None:
             # Controleer eerst of het een kleine SoC overschrijding betreft die we kunnen tolereren
             soc_violation_detected = False
             soc_reset_attempted = False
@@ -374,21 +494,32 @@ def run_battery_trading(config, progress_callback=None):
                     progress_callback(warning_msg)
                 
                 # Probeer de optimalisatie opnieuw met de gereset SoC
-                # Update het model met de nieuwe start SoC
-                model.soc[0].fix(current_soc)
-                
-                # Solve opnieuw
-                result = solver.solve(model)
+                if dp_engine:
+                    solution = solve_day_dp(day_arrays, current_soc, daily_cycle_budget, model_params, dp_soc_steps)
+                else:
+                    # Update het model met de nieuwe start SoC
+                    model.soc[0].fix(current_soc)
+                    
+                    # Solve opnieuw
+                    seed = None
+                    if warm_start and previous_schedule is not None:
+                        seed = (previous_schedule[0], previous_schedule[1], current_soc, model_params)
+                    result, milp_used = solve_day(solver, model, lp_first, seed)
+                    solution = extract_day_solution(model, result)
                 
                 # Check opnieuw voor infeasibility
-                if (result.solver.status != SolverStatus.ok) or (result.solver.termination_condition == TerminationCondition.infeasible):
+                if solution is None:
                     # Als het nog steeds niet lukt, ga door naar de normale infeasible handling
                     pass  # Ga door naar de normale infeasible dagen behandeling hieronder
                 else:
                     # Het lukte nu wel! Ga door met normale verwerking
-                    charge = [model.charge[t]() for t in model.T]
-                    discharge = [model.discharge[t]() for t in model.T]
-                    soc = [model.soc[t]() for t in model.T]
+                    if milp_used:
+                        milp_days += 1
+                    else:
+                        lp_days += 1
+                    charge = solution['charge']
+                    discharge = solution['discharge']
+                    soc = solution['soc']
 
                     # Update SoC voor volgende dag
                     final_charge = charge[-1]
@@ -396,6 +527,7 @@ def run_battery_trading(config, progress_callback=None):
                     final_soc = soc[-1] + (final_charge * time_step_h * eff_ch - final_discharge * time_step_h / eff_dis)
                     final_soc = min(max(final_soc, min_soc), max_soc)
                     current_soc = final_soc
+                    previous_schedule = (charge, discharge)
 
                     # Update cycles en budget
                     charged_energy = sum(charge) * time_step_h  # in MWh
@@ -405,67 +537,7 @@ def run_battery_trading(config, progress_callback=None):
                     remaining_cycles = max(0, remaining_cycles)
                     cycle_history.append(daily_cycle)
 
-                    # Netto netpositie en opbrengst/kosten per timestep
-                    netpos = load - pv + (np.array(charge) - np.array(discharge)) * time_step_h
-                    
-                    # Bereken e-programma en onbalans
-                    netpos_without_battery = load - pv
-                    e_program_netpos = netpos_without_battery * (e_program_percentage / 100.0)
-                    imbalance = netpos - e_program_netpos
-                    
-                    # Day-ahead kosten voor e-programma
-                    price_day_ahead = day_data["price_day_ahead"].values
-                    day_ahead_costs = np.where(e_program_netpos > 0, -price_day_ahead * e_program_netpos, price_day_ahead * abs(e_program_netpos))
-                    
-                    # Onbalanskosten voor afwijkingen
-                    imbalance_costs = np.where(imbalance > 0, -price_shortage * imbalance, price_surplus * abs(imbalance))
-                    
-                    # Totale kosten
-                    opbrengst_kosten = day_ahead_costs + imbalance_costs
-
-                    # Prepare columns for output
-                    soc_kwh = [s * 1000 for s in soc]  # SoC in kWh
-                    day_data = day_data.copy()
-                    if 'space available for charging (kWh)' in day_data.columns:
-                        day_data['space_for_charging_kWh'] = day_data['space available for charging (kWh)']
-                        day_data.drop(columns=['space available for charging (kWh)'], inplace=True)
-                    if 'space available for discharging (kWh)' in day_data.columns:
-                        day_data['space_for_discharging_kWh'] = day_data['space available for discharging (kWh)']
-                        day_data.drop(columns=['space available for discharging (kWh)'], inplace=True)
-                    day_data['energy_charged_kWh'] = np.array(charge) * time_step_h * 1000
-                    day_data['energy_discharged_kWh'] = np.array(discharge) * time_step_h * 1000
-                    day_data['SoC_kWh'] = soc_kwh
-                    day_data['SoC_pct'] = [(s - min_soc) / (max_soc - min_soc) for s in soc]
-                    day_data['grid_exchange_kWh'] = netpos * 1000  # Converteer naar kWh voor export
-                    day_data['e_program_kWh'] = e_program_netpos * 1000  # Converteer naar kWh voor export
-                    day_data['day_ahead_result'] = day_ahead_costs  # Kan positief (inkomsten) of negatief (kosten) zijn
-                    day_data['imbalance_result'] = imbalance_costs  # Kan positief (inkomsten) of negatief (kosten) zijn
-                    
-                    # Bereken energy_tax en supplier_costs voor SoC reset dagen
-                    if 'load' in day_data.columns and 'production_PV' in day_data.columns:
-                        net_grid_consumption_kwh = (day_data['load'].values 
-                                                   - day_data['production_PV'].values 
-                                                   + np.array(charge) * time_step_h * 1000
-                                                   - np.array(discharge) * time_step_h * 1000)
-                        net_grid_consumption_mwh = net_grid_consumption_kwh / 1000
-                        
-                        energy_tax_costs = np.where(net_grid_consumption_mwh > 0, -net_grid_consumption_mwh * marginal_tax_rate, 0)
-                        supplier_cost_values = -np.abs(net_grid_consumption_mwh) * supply_costs
-                        
-                        day_data['energy_tax'] = energy_tax_costs
-                        day_data['supplier_costs'] = supplier_cost_values
-                    else:
-                        day_data['energy_tax'] = 0
-                        day_data['supplier_costs'] = 0
-                    day_data['transport_costs'] = -np.array(transport_costs_per_timestep)  # Altijd negatief (kosten)
-                    
-                    # Total result = day-ahead + imbalance + alle extra kosten (voor SoC reset dagen)
-                    total_result = (opbrengst_kosten + 
-                                   day_data['energy_tax'] + 
-                                   day_data['supplier_costs'] + 
-                                   day_data['transport_costs'])
-                    day_data['total_result_imbalance_PAP'] = total_result
-                    results.append(day_data)
+                    store_day(pos, charge, discharge, soc)
                     
                     # Ga door naar de volgende dag
                     continue
@@ -559,79 +631,18 @@ def run_battery_trading(config, progress_callback=None):
                 progress_callback(warning_msg_reset)
             
             # Batterij doet niets deze dag (blijft op reset_soc_used)
-            no_action_charge = [0.0] * T
-            no_action_discharge = [0.0] * T
-            no_action_soc = [reset_soc_used] * T
-            
-            # Bereken net position zonder batterij  
-            load = day_data["load"].values / 1000  # MWh
-            pv = day_data["production_PV"].values / 1000  # MWh
-            netpos = load - pv  # Geen batterij bijdrage
-            
-            # Bereken e-programma en onbalans voor infeasible dagen
-            netpos_without_battery = load - pv
-            e_program_netpos = netpos_without_battery * (e_program_percentage / 100.0)
-            imbalance = netpos - e_program_netpos
-            
-            price_shortage = day_data["price_shortage"].values
-            price_surplus = day_data["price_surplus"].values
-            price_day_ahead = day_data["price_day_ahead"].values
-            
-            # Day-ahead kosten voor e-programma
-            day_ahead_costs = np.where(e_program_netpos > 0, -price_day_ahead * e_program_netpos, price_day_ahead * abs(e_program_netpos))
-            
-            # Onbalanskosten voor afwijkingen
-            imbalance_costs = np.where(imbalance > 0, -price_shortage * imbalance, price_surplus * abs(imbalance))
-            
-            # Totale kosten
-            opbrengst_kosten = day_ahead_costs + imbalance_costs
-            
-            # Voeg resultaten toe
-            day_data = day_data.copy()
-            if 'space available for charging (kWh)' in day_data.columns:
-                day_data['space_for_charging_kWh'] = day_data['space available for charging (kWh)']
-                day_data.drop(columns=['space available for charging (kWh)'], inplace=True)
-            if 'space available for discharging (kWh)' in day_data.columns:
-                day_data['space_for_discharging_kWh'] = day_data['space available for discharging (kWh)']
-                day_data.drop(columns=['space available for discharging (kWh)'], inplace=True)
-            day_data['energy_charged_kWh'] = [c * time_step_h * 1000 for c in no_action_charge]
-            day_data['energy_discharged_kWh'] = [d * time_step_h * 1000 for d in no_action_discharge]
-            day_data['SoC_kWh'] = [s * 1000 for s in no_action_soc]
-            day_data['SoC_pct'] = [(s - min_soc) / (max_soc - min_soc) for s in no_action_soc]
-            day_data['grid_exchange_kWh'] = netpos * 1000  # Converteer naar kWh voor export
-            day_data['e_program_kWh'] = e_program_netpos * 1000  # Converteer naar kWh voor export
-            day_data['day_ahead_result'] = day_ahead_costs  # Kan positief (inkomsten) of negatief (kosten) zijn
-            day_data['imbalance_result'] = imbalance_costs  # Kan positief (inkomsten) of negatief (kosten) zijn
-            
-            # Bereken energy_tax en supplier_costs voor infeasible dagen (zonder batterij)
-            if 'load' in day_data.columns and 'production_PV' in day_data.columns:
-                net_grid_consumption_kwh = day_data['load'].values - day_data['production_PV'].values  # Zonder batterij
-                net_grid_consumption_mwh = net_grid_consumption_kwh / 1000
-                
-                energy_tax_costs = np.where(net_grid_consumption_mwh > 0, -net_grid_consumption_mwh * marginal_tax_rate, 0)
-                supplier_cost_values = -np.abs(net_grid_consumption_mwh) * supply_costs
-                
-                day_data['energy_tax'] = energy_tax_costs
-                day_data['supplier_costs'] = supplier_cost_values
-            else:
-                day_data['energy_tax'] = 0
-                day_data['supplier_costs'] = 0
-            day_data['transport_costs'] = -np.array(transport_costs_per_timestep)  # Altijd negatief (kosten)
-            
-            # Total result = day-ahead + imbalance + alle extra kosten (voor infeasible dagen)
-            total_result = (opbrengst_kosten + 
-                           day_data['energy_tax'] + 
-                           day_data['supplier_costs'] + 
-                           day_data['transport_costs'])
-            day_data['total_result_imbalance_PAP'] = total_result
-            results.append(day_data)
+            store_day(pos, np.zeros(T), np.zeros(T), np.full(T, reset_soc_used))
             
             # Ga door naar de volgende dag
             continue
 
-        charge = [model.charge[t]() for t in model.T]
-        discharge = [model.discharge[t]() for t in model.T]
-        soc = [model.soc[t]() for t in model.T]
+        if milp_used:
+            milp_days += 1
+        else:
+            lp_days += 1
+        charge = solution['charge']
+        discharge = solution['discharge']
+        soc = solution['soc']
 
         # Update SoC voor volgende dag
         final_charge = charge[-1]
@@ -639,6 +650,7 @@ def run_battery_trading(config, progress_callback=None):
         final_soc = soc[-1] + (final_charge * time_step_h * eff_ch - final_discharge * time_step_h / eff_dis)
         final_soc = min(max(final_soc, min_soc), max_soc)
         current_soc = final_soc
+        previous_schedule = (charge, discharge)
 
         # Update cycles en budget
         charged_energy = sum(charge) * time_step_h  # in MWh
@@ -648,91 +660,25 @@ def run_battery_trading(config, progress_callback=None):
         remaining_cycles = max(0, remaining_cycles)
         cycle_history.append(daily_cycle)
 
-        # Netto netpositie en opbrengst/kosten per timestep
-        netpos = load - pv + (np.array(charge) - np.array(discharge)) * time_step_h
-        
-        # Bereken e-programma (voorspelling) gebaseerd op de werkelijke load/PV zonder batterij
-        # E-programma is percentage van werkelijke afname/invoeding
-        netpos_without_battery = load - pv  # Zonder batterij invloed
-        e_program_netpos = netpos_without_battery * (e_program_percentage / 100.0)
-        
-        # Bereken onbalans: verschil tussen werkelijke netpositie en e-programma
-        imbalance = netpos - e_program_netpos
-        
-        # Bereken day-ahead kosten voor het e-programma
-        price_day_ahead = day_data["price_day_ahead"].values
-        day_ahead_costs = np.where(e_program_netpos > 0, -price_day_ahead * e_program_netpos, price_day_ahead * abs(e_program_netpos))
-        
-        # Onbalanskosten/-opbrengsten berekenen voor afwijkingen van e-programma:
-        # Positieve onbalans (meer afgenomen dan voorspeld) -> shortage prijs betalen
-        # Negatieve onbalans (meer ingevoed dan voorspeld) -> surplus prijs ontvangen
-        imbalance_costs = np.where(imbalance > 0, -price_shortage * imbalance, price_surplus * abs(imbalance))
-        
-        # Totale kosten = day-ahead kosten voor e-programma + onbalanskosten voor afwijkingen
-        opbrengst_kosten = day_ahead_costs + imbalance_costs
+        store_day(pos, charge, discharge, soc)
 
-        # Bereken transportkosten: alleen voor netto afname van het net
-        # Voor imbalance_everything_PAP: bereken op basis van netpos (netto positie na batterij)
-        # Transportkosten alleen voor positieve netpos (netto afname)
-        transport_costs_per_timestep = [max(0, net_pos) * transport_costs for net_pos in netpos]  # MWh * €/MWh
-        
-        # Prepare columns for output
-        soc_kwh = [s * 1000 for s in soc]  # SoC in kWh
-        day_data = day_data.copy()
-        if 'space available for charging (kWh)' in day_data.columns:
-            day_data['space_for_charging_kWh'] = day_data['space available for charging (kWh)']
-            day_data.drop(columns=['space available for charging (kWh)'], inplace=True)
-        if 'space available for discharging (kWh)' in day_data.columns:
-            day_data['space_for_discharging_kWh'] = day_data['space available for discharging (kWh)']
-            day_data.drop(columns=['space available for discharging (kWh)'], inplace=True)
-        day_data['energy_charged_kWh'] = np.array(charge) * time_step_h * 1000
-        day_data['energy_discharged_kWh'] = np.array(discharge) * time_step_h * 1000
-        day_data['SoC_kWh'] = soc_kwh
-        day_data['SoC_pct'] = [(s - min_soc) / (max_soc - min_soc) for s in soc]
-        day_data['grid_exchange_kWh'] = netpos * 1000  # Converteer naar kWh voor export
-        day_data['e_program_kWh'] = e_program_netpos * 1000  # Converteer naar kWh voor export
-        day_data['day_ahead_result'] = day_ahead_costs  # Kan positief (inkomsten) of negatief (kosten) zijn
-        day_data['imbalance_result'] = imbalance_costs  # Kan positief (inkomsten) of negatief (kosten) zijn
-        
-        # Bereken energy_tax en supplier_costs gebaseerd op netto grid verbruik
-        # Netto grid verbruik = load - PV + batterij laden - batterij ontladen (zoals in day-ahead algoritme)
-        if 'load' in day_data.columns and 'production_PV' in day_data.columns:
-            net_grid_consumption_kwh = (day_data['load'].values 
-                                       - day_data['production_PV'].values 
-                                       + np.array(charge) * time_step_h * 1000      # Laden = extra afname (kWh)
-                                       - np.array(discharge) * time_step_h * 1000)  # Ontladen = minder afname (kWh)
-            net_grid_consumption_mwh = net_grid_consumption_kwh / 1000  # Converteer naar MWh
-            
-            # Energiebelasting alleen voor positief verbruik (afname van net) - altijd negatief (kosten)
-            energy_tax_costs = np.where(net_grid_consumption_mwh > 0, -net_grid_consumption_mwh * marginal_tax_rate, 0)
-            # Leveringskosten gelden voor absolute waarde van afname EN invoeding - altijd negatief (kosten)
-            supplier_cost_values = -np.abs(net_grid_consumption_mwh) * supply_costs
-            
-            day_data['energy_tax'] = energy_tax_costs
-            day_data['supplier_costs'] = supplier_cost_values
-        else:
-            day_data['energy_tax'] = 0  # Geen load/PV data beschikbaar
-            day_data['supplier_costs'] = 0
-        day_data['transport_costs'] = -np.array(transport_costs_per_timestep)  # Altijd negatief (kosten)
-        
-        # Total result = day-ahead + imbalance + alle extra kosten
-        total_result = (opbrengst_kosten + 
-                       day_data['energy_tax'] + 
-                       day_data['supplier_costs'] + 
-                       day_data['transport_costs'])
-        day_data['total_result_imbalance_PAP'] = total_result
-        results.append(day_data)
-
-    final_df = pd.concat(results)
+    final_df = result_frame(df, out, filled, drop_columns=space_columns)
     total_result = final_df['total_result_imbalance_PAP'].sum()
     total_cycles = cumulative_cycles
 
-    return final_df, {
+    summary = {
         "total_result": total_result,
         "total_cycles": total_cycles,
         "cycle_history": cycle_history,
         "battery_power_MW": power_mw,
-        "infeasible_days": infeasible_days
+        "infeasible_days": infeasible_days,
+        "imbalance_engine": 'dp' if dp_engine else 'milp',
     }
+    if lp_first:
+        summary["lp_first"] = {"lp_days": lp_days, "milp_days": milp_days}
+    if warm_start:
+        summary["warm_start"] = warm_start_summary(solver_stats)
+
+    return final_df, summary
 
 
@@ -0,0 +1,207 @@
+# ingestion.py
+"""
+Gedeelde inleeslaag voor de input data van alle strategieën.
+
+De input (CSV of de Excel sheet 'Export naar Python') wordt één keer verwerkt tot een InputData:
+de Datetime kolom wordt met één vast (vooraf bepaald) formaat geparsed en wordt de index, de
+verplichte kolommen per strategie worden gecontroleerd en de numerieke kolommen staan als float
+arrays met korte namen klaar. De run_battery_trading functies accepteren zowel een InputData als
+het ruwe DataFrame (prepare_input), zodat bestaande aanroepen blijven werken.
+
+Per strategie wordt daar een PreparedInput van gemaakt (MWh arrays, dagen en dagslices). Die hangt
+niet af van de batterijgrootte en kan dus via config.prepared_input over runs gedeeld worden
+(zie sizing_sweep.py).
+"""
+import os
+
+import pandas as pd
+
+INPUT_SHEET = 'Export naar Python'
+
+SPACE_CH = 'space available for charging (kWh)'
+SPACE_DIS = 'space available for discharging (kWh)'
+
+# Kolom in de input -> korte naam in InputData.arrays (eenheden zoals in de input: kWh, €/MWh)
+SHORT_NAMES = {
+    'production_PV': 'pv',
+    'load': 'load',
+    'price_day_ahead': 'price_da',
+    'price_shortage': 'price_shortage',
+    'price_surplus': 'price_surplus',
+    'regulation_state': 'reg_state',
+    SPACE_CH: 'space_ch',
+    SPACE_DIS: 'space_dis',
+    'grid_excl_battery': 'grid_excl',
+    'max_feed_in_grid': 'max_feed_in',
+    'max_take_from_grid': 'max_take_from',
+}
+
+# kWh arrays die de algoritmes ook in MWh gebruiken (korte naam + '_mwh' in PreparedInput.arrays)
+MWH_ARRAYS = ['pv', 'load', 'grid_excl', 'max_feed_in', 'max_take_from']
+
+# Verplichte kolommen per strategie
+REQUIRED_COLUMNS = {
+    'imbalance_sap': [SPACE_CH, SPACE_DIS, 'regulation_state', 'price_surplus', 'price_shortage'],
+    'imbalance_pap': ['production_PV', 'load', 'price_day_ahead', 'price_shortage', 'price_surplus',
+                      SPACE_CH, SPACE_DIS],
+    'day_ahead': ['production_PV', 'load', 'price_day_ahead', SPACE_CH, SPACE_DIS,
+                  'grid_excl_battery', 'max_feed_in_grid', 'max_take_from_grid'],
+    'self_consumption': ['production_PV', 'load', 'price_day_ahead', SPACE_CH, SPACE_DIS,
+                         'grid_excl_battery', 'max_feed_in_grid', 'max_take_from_grid'],
+}
+
+# Strategie keuzes uit de Streamlit app (STRATEGY_CHOICE) en run_model (BATTERY_CONFIG)
+STRATEGY_KEYS = {
+    "Simple Battery Trading (Imbalance)": 'imbalance_sap',
+    "Advanced Whole-System Trading (Imbalance)": 'imbalance_pap',
+    "Optimize on Day-Ahead Market": 'day_ahead',
+    "Prioritize Self-Consumption": 'self_consumption',
+    "Onbalanshandel, alleen batterij op SAP": 'imbalance_sap',
+    "Onbalanshandel, alles op onbalansprijzen": 'imbalance_pap',
+    "Day-ahead trading, minimaliseer energiekosten": 'day_ahead',
+    "Verhogen eigen verbruik PV, alles op day-ahead": 'self_consumption',
+}
+
+# Kandidaat formaten voor de Datetime kolom; maand-eerst vóór dag-eerst zoals pd.to_datetime,
+# tenzij dayfirst=True
+ISO_FORMATS = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M', '%Y-%m-%d']
+DAYFIRST_FORMATS = ['%d-%m-%Y %H:%M:%S', '%d-%m-%Y %H:%M', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M']
+MONTHFIRST_FORMATS = ['%m/%d/%Y %H:%M:%S', '%m/%d/%Y %H:%M', '%m-%d-%Y %H:%M:%S', '%m-%d-%Y %H:%M']
+FORMAT_SAMPLE = 500  # aantal waarden (verspreid over de reeks) om een formaat op te testen
+
+
+class InputData:
+    """
+    Genormaliseerde input: frame met DatetimeIndex (originele kolomnamen) en float64 arrays
+    met korte namen (SHORT_NAMES) in dezelfde rijvolgorde.
+    """
+
+    def __init__(self, frame, arrays, datetime_format=None):
+        self.frame = frame
+        self.arrays = arrays
+        self.datetime_format = datetime_format
+
+    def __len__(self):
+        return len(self.frame)
+
+    def require(self, strategy):
+        """Controleer of alle verplichte kolommen van de strategie aanwezig (en numeriek) zijn."""
+        for col in REQUIRED_COLUMNS.get(strategy, []):
+            if col not in self.frame.columns:
+                raise ValueError(f"Column '{col}' ontbreekt in de input data.")
+            if SHORT_NAMES[col] not in self.arrays:
+                raise ValueError(f"Column '{col}' bevat niet-numerieke waarden.")
+        return self
+
+
+def read_input(source, sheet_name=INPUT_SHEET):
+    """
+    Lees het ruwe input bestand: CSV, of anders de Excel sheet sheet_name.
+    source: pad of file-object met .name (bijv. een Streamlit upload)
+    """
+    name = source if isinstance(source, (str, os.PathLike)) else getattr(source, 'name', '')
+    if str(name).lower().endswith('.csv'):
+        return pd.read_csv(source, header=0)
+    return pd.read_excel(source, sheet_name=sheet_name, header=0)
+
+
+def find_datetime_column(df):
+    for col in df.columns:
+        if str(col).strip().lower() == 'datetime':
+            return col
+    raise ValueError(f"No column 'Datetime' or 'datetime' found in the '{INPUT_SHEET}' sheet.")
+
+
+def infer_datetime_format(values, dayfirst=False):
+    """
+    Eerste kandidaat formaat dat een steekproef (verspreid over de hele reeks, zodat ook dagen
+    > 12 meedoen) foutloos parset, of None.
+    """
+    values = pd.Series(values).dropna()
+    if len(values) == 0 or pd.api.types.infer_dtype(values, skipna=True) != 'string':
+        return None
+    step = max(1, len(values) // FORMAT_SAMPLE)
+    sample = values.iloc[::step].str.strip()
+    candidates = ISO_FORMATS + (DAYFIRST_FORMATS + MONTHFIRST_FORMATS if dayfirst else MONTHFIRST_FORMATS + DAYFIRST_FORMATS)
+    for fmt in candidates:
+        try:
+            pd.to_datetime(sample, format=fmt)
+        except (ValueError, TypeError):
+            continue
+        return fmt
+    return None
+
+
+def parse_datetime(values, dayfirst=False):
+    """Parse de Datetime kolom met één vast formaat; valt terug op pd.to_datetime. Returns: (waarden, formaat)"""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values, None
+    fmt = infer_datetime_format(values, dayfirst=dayfirst)
+    if fmt is not None:
+        try:
+            return pd.to_datetime(values.str.strip(), format=fmt), fmt
+        except (ValueError, TypeError):
+            pass
+    return pd.to_datetime(values, dayfirst=dayfirst), None
+
+
+def ingest(data, strategy=None, dayfirst=False):
+    """
+    Maak een InputData van een ruw DataFrame (of controleer een bestaande InputData).
+    strategy: sleutel uit REQUIRED_COLUMNS (of None voor geen kolomcontrole)
+    """
+    if isinstance(data, InputData):
+        return data.require(strategy)
+
+    df = data.copy()
+    datetime_col = find_datetime_column(df)
+    df[datetime_col], datetime_format = parse_datetime(df[datetime_col], dayfirst=dayfirst)
+    df.set_index(datetime_col, inplace=True)
+    return from_frame(df, datetime_format).require(strategy)
+
+
+def from_frame(frame, datetime_format=None):
+    """InputData van een frame dat al een DatetimeIndex heeft (bijv. uit de cache, zie input_cache.py)."""
+    arrays = {}
+    for col, short in SHORT_NAMES.items():
+        if col in frame.columns:
+            try:
+                arrays[short] = frame[col].to_numpy(dtype=float)
+            except (ValueError, TypeError):
+                pass  # niet-numeriek; alleen een fout als de strategie de kolom nodig heeft
+    return InputData(frame, arrays, datetime_format)
+
+
+class PreparedInput:
+    """
+    Input van één strategie, onafhankelijk van POWER_MW/CAPACITY_MWH: het frame en de arrays van de
+    InputData plus de MWh arrays, de dagen (dag, frame van de dag; lege dagen overgeslagen), de
+    rijposities per dag en per dag de slices van alle arrays.
+    Wordt gedeeld tussen runs, dus de algoritmes lezen het frame en de arrays alleen.
+    """
+
+    def __init__(self, data, strategy):
+        self.strategy = strategy
+        self.frame = data.frame
+        self.arrays = dict(data.arrays)
+        for short in MWH_ARRAYS:
+            if short in data.arrays:
+                self.arrays[short + '_mwh'] = data.arrays[short] / 1000
+        day_groups = data.frame.groupby(pd.Grouper(freq='D'))
+        self.total_days = day_groups.ngroups
+        self.days = [(day, day_data) for day, day_data in day_groups if len(day_data) > 0]
+        self.day_positions = day_groups.indices
+        self.day_arrays = {day: {name: values[pos] for name, values in self.arrays.items()}
+                           for day, pos in self.day_positions.items()}
+
+
+def prepare_input(config, strategy):
+    """
+    Input voor run_battery_trading: config.prepared_input als die voor deze strategie is voorbereid,
+    anders opgebouwd uit config.input_data (een InputData of een ruw DataFrame).
+    Returns: PreparedInput
+    """
+    prepared = getattr(config, 'prepared_input', None)
+    if isinstance(prepared, PreparedInput) and prepared.strategy == strategy:
+        return prepared
+    return PreparedInput(ingest(config.input_data, strategy), strategy)
@@ -0,0 +1,122 @@
+# input_cache.py
+"""
+Lokale cache van ingelezen input bestanden (zie ingestion.py).
+
+Een Excel sheet van een jaar kwartierdata inlezen met openpyxl duurt seconden; het genormaliseerde
+frame (DatetimeIndex, originele kolommen) wordt daarom als Parquet bestand bewaard onder de SHA-256
+hash van de bestandsinhoud. Een volgende run op dezelfde workbook laadt in milliseconden, ook als
+het bestand een andere naam heeft; een gewijzigd bestand krijgt vanzelf een nieuwe sleutel.
+
+Eviction: bestanden ouder dan max_age_days worden verwijderd en daarna de minst recent gebruikte
+tot de cache onder max_mb blijft. Zonder pyarrow wordt er niet gecached.
+"""
+import hashlib
+import os
+import time
+
+import pandas as pd
+
+from ingestion import INPUT_SHEET, read_input, ingest, from_frame
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.input_cache')
+CACHE_MAX_MB = 500
+CACHE_MAX_AGE_DAYS = 30
+CACHE_VERSION = 1  # verhogen als de normalisatie in ingestion.py verandert
+
+
+def _parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _source_bytes(source):
+    """Inhoud van een pad of file-object (bijv. een Streamlit upload), zonder de positie te verplaatsen."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return f.read()
+    if hasattr(source, 'getvalue'):
+        return source.getvalue()
+    position = source.tell()
+    data = source.read()
+    source.seek(position)
+    return data
+
+
+def cache_key(data, sheet_name=INPUT_SHEET, dayfirst=False):
+    """SHA-256 van de bestandsinhoud plus de inleesopties."""
+    digest = hashlib.sha256(data)
+    digest.update(f"|{sheet_name}|{dayfirst}|v{CACHE_VERSION}".encode())
+    return digest.hexdigest()
+
+
+def evict(cache_dir=CACHE_DIR, max_mb=CACHE_MAX_MB, max_age_days=CACHE_MAX_AGE_DAYS):
+    """Verwijder verlopen bestanden en daarna de oudste (laatst gebruikt) tot de cache onder max_mb blijft."""
+    if not os.path.isdir(cache_dir):
+        return
+    now = time.time()
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        if now - stat.st_mtime > max_age_days * 86400:
+            _remove(path)
+        else:
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_mb * 1024 * 1024:
+            break
+        _remove(path)
+        total -= size
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def load_input_cached(source, strategy=None, sheet_name=INPUT_SHEET, dayfirst=False, cache_dir=CACHE_DIR,
+                      max_mb=CACHE_MAX_MB, max_age_days=CACHE_MAX_AGE_DAYS, progress_callback=None):
+    """
+    read_input() + ingest() met cache op de inhoud van het bestand.
+    Returns: InputData (gecontroleerd voor strategy)
+    """
+    if not _parquet_available():
+        return ingest(read_input(source, sheet_name=sheet_name), strategy, dayfirst=dayfirst)
+
+    key = cache_key(_source_bytes(source), sheet_name=sheet_name, dayfirst=dayfirst)
+    path = os.path.join(cache_dir, f"{key}.parquet")
+
+    if os.path.exists(path):
+        try:
+            frame = pd.read_parquet(path)
+        except Exception:
+            _remove(path)  # beschadigd bestand, opnieuw inlezen
+        else:
+            os.utime(path)  # laatst gebruikt, voor de eviction volgorde
+            if progress_callback:
+                progress_callback("Input geladen uit de cache")
+            return from_frame(frame).require(strategy)
+
+    data = ingest(read_input(source, sheet_name=sheet_name), dayfirst=dayfirst)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        data.frame.to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        # Bijv. kolommen met gemengde types die Parquet niet kan opslaan: dan zonder cache verder
+        _remove(tmp_path)
+        if progress_callback:
+            progress_callback(f"Input niet gecached: {e}")
+    evict(cache_dir, max_mb=max_mb, max_age_days=max_age_days)
+    return data.require(strategy)
@@ -0,0 +1,144 @@
+# jobs.py
+"""
+Achtergrond jobs voor run_revenue_model (Streamlit app).
+
+De app start een simulatie niet meer synchroon maar dient hem in bij een JobManager: één process
+pool per server proces, gedeeld door alle sessies en tabbladen, zodat meerdere gebruikers tegelijk
+kunnen rekenen zonder elkaar (of de browser sessie) te blokkeren. De progress_callback berichten
+komen via een Manager lijst terug; de pagina leest ze bij het pollen.
+
+Annuleren: een job die nog in de wachtrij staat wordt direct geannuleerd; een lopende job stopt
+bij het volgende progress_callback bericht (een lopende solver aanroep wordt afgemaakt).
+"""
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, CancelledError
+
+JOB_WORKERS = max(1, min(4, os.cpu_count() or 1))
+JOB_TTL_S = 6 * 3600  # afgeronde jobs worden zo lang bewaard (voor terugkeren na een refresh)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _run_job(params, input_data, messages, cancel_event):
+    """Worker: run_revenue_model met een progress_callback die berichten deelt en annuleren controleert."""
+    from revenue_logic import run_revenue_model
+
+    def progress_callback(msg):
+        if cancel_event.is_set():
+            raise JobCancelled("Simulatie geannuleerd")
+        messages.append(str(msg))
+
+    try:
+        results = run_revenue_model(params, input_data, progress_callback)
+    except JobCancelled:
+        results = None
+    if cancel_event.is_set():
+        results = {"summary": None, "output_file_bytes": None, "warnings": [], "cancelled": True,
+                   "error": "The simulation was cancelled."}
+    return results
+
+
+class Job:
+    """Een ingediende simulatie: status, voortgangsberichten en (na afloop) het resultaat."""
+
+    def __init__(self, job_id, future, messages, cancel_event, label=None):
+        self.job_id = job_id
+        self.future = future
+        self.label = label
+        self.submitted = time.time()
+        self.finished = None
+        self._messages = messages
+        self._cancel_event = cancel_event
+
+    @property
+    def status(self):
+        """'queued', 'running', 'cancelling', 'cancelled', 'done' of 'failed'"""
+        if self.future.cancelled():
+            return 'cancelled'
+        if not self.future.done():
+            if self._cancel_event.is_set():
+                return 'cancelling'
+            return 'running' if self.future.running() else 'queued'
+        if self.future.exception() is not None:
+            return 'failed'
+        results = self.future.result()
+        if results.get("cancelled"):
+            return 'cancelled'
+        return 'failed' if results.get("error") else 'done'
+
+    @property
+    def messages(self):
+        try:
+            return list(self._messages)
+        except (EOFError, ConnectionError):
+            return []  # manager al gestopt
+
+    def result(self):
+        """Resultaat dict van run_revenue_model (None zolang de job loopt)."""
+        if not self.future.done():
+            return None
+        try:
+            return self.future.result()
+        except CancelledError:
+            return {"summary": None, "output_file_bytes": None, "warnings": [], "cancelled": True,
+                    "error": "The simulation was cancelled."}
+        except Exception as e:
+            return {"summary": None, "output_file_bytes": None, "warnings": [],
+                    "error": f"The simulation process failed: {e}"}
+
+    def cancel(self):
+        if not self.future.cancel():
+            self._cancel_event.set()
+
+
+class JobManager:
+    """Process pool met job administratie; één instantie per server proces (zie get_job_manager in app.py)."""
+
+    def __init__(self, max_workers=JOB_WORKERS):
+        self._manager = multiprocessing.Manager()
+        self._pool = ProcessPoolExecutor(max_workers=max_workers)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, params, input_data, label=None):
+        """Dien een run_revenue_model run in. Returns: job_id"""
+        messages = self._manager.list()
+        cancel_event = self._manager.Event()
+        future = self._pool.submit(_run_job, params, input_data, messages, cancel_event)
+        with self._lock:
+            self._cleanup()
+            job_id = uuid.uuid4().hex  # komt in de URL (query param): niet te raden
+            job = Job(job_id, future, messages, cancel_event, label)
+            self._jobs[job_id] = job
+        future.add_done_callback(lambda f, job=job: setattr(job, 'finished', time.time()))
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+
+    def active_jobs(self):
+        with self._lock:
+            return [job for job in self._jobs.values() if not job.future.done()]
+
+    def _cleanup(self):
+        now = time.time()
+        for job_id in [k for k, job in self._jobs.items() if job.finished and now - job.finished > JOB_TTL_S]:
+            del self._jobs[job_id]
+
+    def shutdown(self):
+        for job in self.active_jobs():
+            job.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._manager.shutdown()
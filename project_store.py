@@ -0,0 +1,169 @@
+# project_store.py
+"""
+Opslag van de Business Case projecten (app.py): één bestand per project in PROJECTS_DIR.
+
+- <slug>.json: naam, type, inputs, last_saved en de resultaten zonder het result frame
+- <slug>.results.parquet: het result frame (kolomgewijs, binair; zonder pyarrow als JSON)
+
+Bij opslaan worden alleen projecten herschreven waarvan de inhoud sinds de vorige keer laden of
+opslaan veranderd is (hash van de JSON en van het frame); verwijderde of hernoemde projecten
+verdwijnen uit de map. Bij laden worden alleen de JSON bestanden gelezen: het result frame wordt
+pas ingelezen als het project geopend wordt (load_results). Het oude enkele JSON bestand
+(LEGACY_FILE) wordt de eerste keer automatisch overgenomen.
+"""
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+
+import pandas as pd
+
+from input_cache import _parquet_available, _remove
+
+PROJECTS_DIR = "flink_ems_projects"
+LEGACY_FILE = "flink_ems_projects.json"
+FRAME_KEY = 'df'
+FRAME_FILE_KEY = 'df_file'  # in de JSON: bestandsnaam van het (nog niet geladen) result frame
+
+
+def project_slug(name):
+    """Bestandsnaam voor een project: leesbare naam plus een korte hash (unieke namen, veilige tekens)."""
+    safe = re.sub(r'[^A-Za-z0-9_-]+', '_', name).strip('_')[:50] or 'project'
+    return f"{safe}-{hashlib.sha1(name.encode('utf-8')).hexdigest()[:8]}"
+
+
+def _frame_hash(df):
+    digest = hashlib.sha256(repr(list(df.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+class ProjectStore:
+    """Projecten per bestand, met administratie van wat er al op schijf staat."""
+
+    def __init__(self, directory=PROJECTS_DIR, legacy_file=LEGACY_FILE):
+        self.directory = directory
+        self.legacy_file = legacy_file
+        self._saved = {}  # projectnaam -> (hash van de JSON, hash van het frame of None)
+
+    def exists(self):
+        return os.path.isdir(self.directory) or os.path.exists(self.legacy_file)
+
+    def _paths(self, name):
+        slug = project_slug(name)
+        return os.path.join(self.directory, f"{slug}.json"), slug
+
+    def _split(self, project):
+        """JSON-deel van een project (zonder frame) en het frame (of None)."""
+        meta = dict(project)
+        results = meta.get('results')
+        frame = None
+        if isinstance(results, dict):
+            results = dict(results)
+            if isinstance(results.get(FRAME_KEY), pd.DataFrame):
+                frame = results.pop(FRAME_KEY)
+            meta['results'] = results
+        return meta, frame
+
+    def save(self, projects):
+        """Schrijf gewijzigde projecten en verwijder bestanden van projecten die niet meer bestaan. Returns: aantal geschreven"""
+        os.makedirs(self.directory, exist_ok=True)
+        written = 0
+        for name, project in projects.items():
+            meta, frame = self._split(project)
+            json_path, slug = self._paths(name)
+            frame_hash = _frame_hash(frame) if frame is not None else None
+            if frame is not None:
+                frame_file = f"{slug}.results.parquet" if _parquet_available() else f"{slug}.results.json"
+                meta['results'][FRAME_FILE_KEY] = frame_file
+            elif FRAME_FILE_KEY in meta.get('results', {}) and not meta['results'][FRAME_FILE_KEY].startswith(f"{slug}."):
+                # Hernoemd of gedupliceerd zonder het frame te openen: bestand kopiëren naar de nieuwe naam
+                old_file = meta['results'][FRAME_FILE_KEY]
+                new_file = f"{slug}.results.{old_file.rsplit('.', 1)[-1]}"
+                shutil.copyfile(os.path.join(self.directory, old_file), os.path.join(self.directory, new_file))
+                meta['results'][FRAME_FILE_KEY] = new_file
+                project['results'][FRAME_FILE_KEY] = new_file
+            meta_text = json.dumps({'name': name, **meta}, indent=4)
+            meta_hash = hashlib.sha256(meta_text.encode('utf-8')).hexdigest()
+            saved_meta, saved_frame = self._saved.get(name, (None, None))
+            if meta_hash == saved_meta and frame_hash in (saved_frame, None):
+                continue
+
+            if frame is not None and frame_hash != saved_frame:
+                frame_path = os.path.join(self.directory, frame_file)
+                tmp_path = f"{frame_path}.tmp"
+                if frame_file.endswith('.parquet'):
+                    frame.to_parquet(tmp_path)
+                else:
+                    frame.to_json(tmp_path)
+                os.replace(tmp_path, frame_path)
+            tmp_path = f"{json_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(meta_text)
+            os.replace(tmp_path, json_path)
+            self._saved[name] = (meta_hash, frame_hash if frame is not None else saved_frame)
+            written += 1
+
+        # Bestanden van verwijderde (of hernoemde) projecten opruimen
+        keep = {project_slug(name) for name in projects}
+        for file_name in os.listdir(self.directory):
+            if file_name.split('.', 1)[0] not in keep:
+                _remove(os.path.join(self.directory, file_name))
+        for name in [n for n in self._saved if n not in projects]:
+            del self._saved[name]
+        return written
+
+    def load(self):
+        """Lees alle projecten zonder result frames (die volgen via load_results). Returns: dict naam -> project"""
+        if not os.path.isdir(self.directory) and os.path.exists(self.legacy_file):
+            projects = self._load_legacy()
+            self.save(projects)
+            return projects
+
+        projects = {}
+        self._saved = {}
+        if not os.path.isdir(self.directory):
+            return projects
+        for file_name in sorted(os.listdir(self.directory)):
+            if not file_name.endswith('.json') or '.results.' in file_name:
+                continue
+            with open(os.path.join(self.directory, file_name), 'r') as f:
+                meta_text = f.read()
+            meta = json.loads(meta_text)
+            name = meta.pop('name')
+            projects[name] = meta
+            frame_hash = 'on-disk' if FRAME_FILE_KEY in meta.get('results', {}) else None
+            self._saved[name] = (hashlib.sha256(meta_text.encode('utf-8')).hexdigest(), frame_hash)
+        return projects
+
+    def load_results(self, name, project):
+        """Lees het result frame van een project in (als dat nog niet gebeurd is). Returns: project"""
+        results = project.get('results')
+        if not isinstance(results, dict) or isinstance(results.get(FRAME_KEY), pd.DataFrame):
+            return project
+        frame_file = results.get(FRAME_FILE_KEY)
+        if frame_file is None:
+            return project
+        frame_path = os.path.join(self.directory, frame_file)
+        if frame_file.endswith('.parquet'):
+            frame = pd.read_parquet(frame_path)
+        else:
+            frame = pd.read_json(frame_path)
+        results[FRAME_KEY] = frame
+        results.pop(FRAME_FILE_KEY)
+        # Het frame staat ongewijzigd op schijf: alleen opnieuw schrijven als het verandert
+        meta_hash, _ = self._saved.get(name, (None, None))
+        self._saved[name] = (meta_hash, _frame_hash(frame))
+        return project
+
+    def _load_legacy(self):
+        with open(self.legacy_file, 'r') as f:
+            if os.path.getsize(self.legacy_file) == 0:
+                return {}
+            projects = json.load(f)
+        for proj_data in projects.values():
+            if 'results' in proj_data and isinstance(proj_data['results'].get(FRAME_KEY), str):
+                proj_data['results'][FRAME_KEY] = pd.read_json(io.StringIO(proj_data['results'][FRAME_KEY]))
+        return projects
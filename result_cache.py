@@ -0,0 +1,129 @@
+# result_cache.py
+"""
+Lokale cache van modelresultaten (result frame + summary) voor run_revenue_model.
+
+Dezelfde input, parameters en strategie opnieuw doorrekenen herhaalt de hele optimalisatie. De
+uitkomst van run_strategy wordt daarom bewaard onder een SHA-256 sleutel van:
+- de inhoud van de input (het genormaliseerde frame uit ingestion.py),
+- de genormaliseerde parameters (zonder export/UI opties, getallen als float),
+- de strategie,
+- ALGORITHM_VERSION: een hash van de broncode van de algoritmes, zodat een gewijzigd algoritme
+  vanzelf nieuwe sleutels geeft (RESULT_CACHE_VERSION voor handmatig ongeldig maken).
+
+Eviction zoals input_cache.py: verlopen bestanden en daarna de minst recent gebruikte tot de cache
+onder max_mb blijft. Resultaten van de fallback heuristiek worden niet bewaard. Treffers en missers
+worden geteld (CACHE_STATS) en via progress_callback gemeld.
+"""
+import hashlib
+import json
+import os
+import pickle
+
+import pandas as pd
+
+from input_cache import evict, _remove
+from fallback_heuristic import FALLBACK_METHOD
+
+RESULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.result_cache')
+RESULT_CACHE_MAX_MB = 1000
+RESULT_CACHE_MAX_AGE_DAYS = 90
+RESULT_CACHE_VERSION = 1
+
+# Modules waarvan de uitkomst van een run afhangt
+ALGORITHM_MODULES = [
+    'imbalance_algorithm_SAP.py', 'imbalance_everything_PAP.py', 'day_ahead_trading_PAP.py',
+    'self_consumption_PV_PAP.py', 'sparse_lp.py', 'dp_dispatch.py', 'fallback_heuristic.py',
+    'solver_backends.py', 'ingestion.py',
+]
+
+# Parameters die de uitkomst van het model niet beïnvloeden
+NON_MODEL_PARAMS = {'STRATEGY_CHOICE', 'EXPORT_MODE', 'EXCEL_ENGINE', 'DATA_PATH', 'RESULT_CACHE'}
+
+CACHE_STATS = {'hits': 0, 'misses': 0}
+
+
+def _algorithm_version():
+    digest = hashlib.sha256(f"v{RESULT_CACHE_VERSION}".encode())
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in ALGORITHM_MODULES:
+        path = os.path.join(base_dir, name)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+ALGORITHM_VERSION = _algorithm_version()
+
+
+def input_hash(data):
+    """SHA-256 van een InputData (of DataFrame met DatetimeIndex): index, kolomnamen en waarden."""
+    frame = getattr(data, 'frame', data)
+    digest = hashlib.sha256(repr(list(frame.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(frame, index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+def normalise_params(params):
+    """Modelparameters als stabiele tekst: gesorteerd, zonder NON_MODEL_PARAMS, getallen als float."""
+    normalised = {}
+    for key, value in params.items():
+        if key in NON_MODEL_PARAMS:
+            continue
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = float(value)
+        normalised[key] = value
+    return json.dumps(normalised, sort_keys=True, default=str)
+
+
+def result_key(data, params, strategy):
+    digest = hashlib.sha256(input_hash(data).encode())
+    digest.update(f"|{normalise_params(params)}|{strategy}|{ALGORITHM_VERSION}".encode())
+    return digest.hexdigest()
+
+
+def cached_run(run, data, params, strategy, cache_dir=RESULT_CACHE_DIR, max_mb=RESULT_CACHE_MAX_MB,
+               max_age_days=RESULT_CACHE_MAX_AGE_DAYS, progress_callback=None):
+    """
+    run() (bijv. run_strategy met een config) met cache op input, parameters, strategie en algoritme.
+    Returns: (df, summary, hit)
+    """
+    key = result_key(data, params, strategy)
+    path = os.path.join(cache_dir, f"{key}.pkl")
+
+    if os.path.exists(path):
+        try:
+            with open(path, 'rb') as f:
+                df, summary = pickle.load(f)
+        except Exception:
+            _remove(path)  # beschadigd of van een oudere pandas versie, opnieuw rekenen
+        else:
+            os.utime(path)  # laatst gebruikt, voor de eviction volgorde
+            CACHE_STATS['hits'] += 1
+            if progress_callback:
+                progress_callback("Resultaat geladen uit de cache")
+            return df, summary, True
+
+    CACHE_STATS['misses'] += 1
+    df, summary = run()
+    if df is None:
+        return df, summary, False
+    if (summary or {}).get('optimization_method') == FALLBACK_METHOD:
+        # Heuristiek in plaats van de solver (bijv. timeout of ontbrekende solver): niet bewaren,
+        # de volgende run probeert de optimalisatie opnieuw
+        if progress_callback:
+            progress_callback("Fallback resultaat niet gecached")
+        return df, summary, False
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((df, summary), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        _remove(tmp_path)
+        if progress_callback:
+            progress_callback(f"Resultaat niet gecached: {e}")
+    evict(cache_dir, max_mb=max_mb, max_age_days=max_age_days)
+    return df, summary, False
@@ -173,10 +173,7 @@
 # revenue_logic.py (Updated for Goal-Driven UI)
 
 import pandas as pd
-import openpyxl
-from openpyxl.utils.dataframe import dataframe_to_rows
 import datetime
-import io
 import traceback
 
 # This import block is already correct and robust. No changes needed here.
@@ -187,10 +184,51 @@ try:
     from self_consumption_PV_PAP import run_battery_trading as run_battery_trading_PAP
     from day_ahead_trading_PAP import run_battery_trading as run_battery_trading_day_ahead
     from imbalance_everything_PAP import run_battery_trading as run_battery_trading_everything_PAP
+    from ingestion import ingest, STRATEGY_KEYS
+    from excel_export import export_workbook_bytes
+    from result_cache import cached_run
+    from rollups import build_rollups
     IMPORTS_OK = True
 except ImportError as e:
     IMPORT_ERROR_MESSAGE = f"Critical Error: Could not import an algorithm file. Please ensure all four trading algorithm scripts (`day_ahead_trading_PAP.py`, `imbalance_algorithm_SAP.py`, etc.) are in the correct directory. Details: {e}"
 
+from fallback_heuristic import FALLBACK_METHOD
+
+
+def run_status(output_path, optimization_method):
+    """Status van een afgeronde run: 'success', 'fallback' of 'failure'"""
+    if not output_path:
+        return 'failure'
+    if optimization_method == FALLBACK_METHOD:
+        return 'fallback'
+    return 'success'
+
+
+TOTAL_RESULT_COLUMNS = ['total_result_imbalance_PAP', 'total_result_imbalance_SAP',
+                        'total_result_day_ahead_trading', 'total_result_self_consumption']
+
+
+def total_result(df):
+    """Som van de total_result kolom van de strategie (€), of None als die ontbreekt."""
+    for col in TOTAL_RESULT_COLUMNS:
+        if col in df.columns:
+            return float(df[col].sum())
+    return None
+
+
+def run_strategy(strategy, config, progress_callback=None):
+    """Voer het algoritme van een strategie (naam uit de Streamlit app) uit. Returns: (df, summary)"""
+    if strategy == "Simple Battery Trading (Imbalance)":
+        return run_battery_trading_SAP(config, progress_callback=progress_callback)
+    elif strategy == "Advanced Whole-System Trading (Imbalance)":
+        return run_battery_trading_everything_PAP(config, progress_callback=progress_callback)
+    elif strategy == "Optimize on Day-Ahead Market":
+        return run_battery_trading_day_ahead(config, progress_callback=progress_callback)
+    elif strategy == "Prioritize Self-Consumption":
+        return run_battery_trading_PAP(config, progress_callback=progress_callback)
+    raise ValueError(f"Unknown strategy: {strategy}")
+
+
 def run_revenue_model(params, input_df, progress_callback):
     """
     This version is updated to use the new, user-friendly strategy names
@@ -210,27 +248,25 @@ def run_revenue_model(params, input_df, progress_callback):
     for k, v in params.items():
         setattr(config, k, v)
     
-    config.input_data = input_df
-
     progress_callback("Starting model run...")
 
     try:
+        # Input één keer inlezen en controleren (input_df mag al een InputData zijn)
+        config.input_data = ingest(input_df, STRATEGY_KEYS.get(params["STRATEGY_CHOICE"]))
+
         # --- 1. Run the selected battery trading algorithm ---
         # This block is updated to use the new STRATEGY_CHOICE parameter
         
         # The key is now "STRATEGY_CHOICE" instead of "BATTERY_CONFIG"
         strategy = params["STRATEGY_CHOICE"] # <-- CHANGED
-
-        if strategy == "Simple Battery Trading (Imbalance)": # <-- CHANGED
-            df, summary = run_battery_trading_SAP(config, progress_callback=progress_callback)
-        elif strategy == "Advanced Whole-System Trading (Imbalance)": # <-- CHANGED
-            df, summary = run_battery_trading_everything_PAP(config, progress_callback=progress_callback)
-        elif strategy == "Optimize on Day-Ahead Market": # <-- CHANGED
-            df, summary = run_battery_trading_day_ahead(config, progress_callback=progress_callback)
-        elif strategy == "Prioritize Self-Consumption": # <-- CHANGED
-            df, summary = run_battery_trading_PAP(config, progress_callback=progress_callback)
+        # Zelfde input, parameters en strategie: resultaat uit de cache (result_cache.py)
+        if params.get("RESULT_CACHE", True):
+            df, summary, cache_hit = cached_run(lambda: run_strategy(strategy, config, progress_callback),
+                                                config.input_data, params, strategy,
+                                                progress_callback=progress_callback)
         else:
-            raise ValueError(f"Unknown strategy: {strategy}")
+            df, summary = run_strategy(strategy, config, progress_callback)
+            cache_hit = False
 
         if df is None or not isinstance(df, pd.DataFrame):
             raise ValueError("Model run failed to return a valid DataFrame.")
@@ -277,17 +313,7 @@ def run_revenue_model(params, input_df, progress_callback):
         existing_columns = [col for col in desired_columns if col in df.columns]
         df_export = df[existing_columns]
 
-        # --- 3. Create a new workbook and populate it correctly ---
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Import uit Python"
-
-        rows = dataframe_to_rows(df_export, index=True, header=True)
-        for r_idx, row in enumerate(rows, start=7):
-            for c_idx, value in enumerate(row, start=2):
-                ws.cell(row=r_idx, column=c_idx, value=value)
-        
-        ws.merge_cells('C6:M6')
+        # --- 3. Create the workbook (header at B7, summary in C6:M6, parameters in W2-W9) ---
         datum_str = now.strftime('%d-%m-%Y %Hu%M')
         optimization_method = summary.get('optimization_method', 'Pyomo optimalisatie')
         summary_text = (
@@ -296,21 +322,11 @@ def run_revenue_model(params, input_df, progress_callback):
             f"Algoritme: {params['STRATEGY_CHOICE']}     " # <-- CHANGED
             f"Optimalisatie: {optimization_method}"
         )
-        ws['C6'] = summary_text
-        
-        ws['W2'] = params['POWER_MW']
-        ws['W3'] = params['CAPACITY_MWH']
-        ws['W4'] = params['MIN_SOC']
-        ws['W5'] = params['MAX_SOC']
-        ws['W6'] = params['EFF_CH']
-        ws['W7'] = params['EFF_DIS']
-        ws['W8'] = params['SUPPLY_COSTS']
-        ws['W9'] = params['TRANSPORT_COSTS']
-
-        # --- 4. Save workbook to in-memory buffer for download ---
-        output_buffer = io.BytesIO()
-        wb.save(output_buffer)
-        output_buffer.seek(0)
+
+        # --- 4. Write workbook to bytes for download ---
+        # EXPORT_MODE 'stream' (default, write-only) or 'cells' (cell by cell); same layout, see excel_export.py
+        output_file_bytes = export_workbook_bytes(df_export, summary_text, params,
+                                                  mode=params.get('EXPORT_MODE', 'stream'))
         
         if 'warning_message' in summary and summary['warning_message']:
             warnings.append(summary['warning_message'])
@@ -321,9 +337,11 @@ def run_revenue_model(params, input_df, progress_callback):
         
         return {
             "df": df,
+            "rollups": build_rollups(df),  # uur/dag/maand/jaar, één keer berekend (rollups.py)
             "summary": summary,
-            "output_file_bytes": output_buffer.getvalue(),
+            "output_file_bytes": output_file_bytes,
             "warnings": warnings,
+            "cache_hit": cache_hit,
             "error": None
         }
 
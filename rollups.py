@@ -0,0 +1,53 @@
+# rollups.py
+"""
+Rollups van een result frame naar uur, dag, maand en jaar, één keer berekend per simulatie.
+
+Niet elke kolom mag opgeteld worden: energie (kWh) en euro's worden gesommeerd, maar SoC, prijzen,
+beschikbare ruimte en netlimieten zijn toestanden of tarieven en worden gemiddeld; de
+onbalansregelstatus is een categorie en neemt de laatste waarde. run_revenue_model levert de
+rollups mee (results["rollups"]), zodat de resolutie keuze in app.py alleen een opzoekactie is.
+"""
+import pandas as pd
+
+ORIGINAL_RESOLUTION = '15 Min (Original)'
+
+# Resolutie (zoals in de selectbox van app.py) -> pandas frequentie (periode-einde, zoals voorheen 'M'/'Y')
+ROLLUP_RULES = {
+    'Hourly': 'h',
+    'Daily': 'D',
+    'Monthly': 'ME',
+    'Yearly': 'YE',
+}
+
+# Kolommen (op prefix) die gemiddeld of als laatste waarde genomen worden; de rest wordt opgeteld
+MEAN_PREFIXES = ('price', 'SoC', 'space', 'max_feed_in', 'max_take_from', 'battery_soc')
+LAST_PREFIXES = ('regulation_state',)
+
+
+def column_aggregation(col):
+    """'sum', 'mean' of 'last' voor een kolom van het result frame."""
+    name = str(col)
+    if name.startswith(LAST_PREFIXES):
+        return 'last'
+    if name.startswith(MEAN_PREFIXES):
+        return 'mean'
+    return 'sum'
+
+
+def rollup(df, resolution):
+    """df (DatetimeIndex) geaggregeerd naar resolution, met de juiste aggregatie per kolom."""
+    if resolution == ORIGINAL_RESOLUTION or resolution not in ROLLUP_RULES:
+        return df
+    numeric = df.select_dtypes('number')
+    aggregation = {col: column_aggregation(col) for col in numeric.columns}
+    return numeric.resample(ROLLUP_RULES[resolution]).agg(aggregation)
+
+
+def build_rollups(df):
+    """Alle resoluties van een result frame. Returns: dict resolutie -> DataFrame"""
+    rollups = {ORIGINAL_RESOLUTION: df}
+    if not isinstance(df.index, pd.DatetimeIndex) or df.empty:
+        return rollups
+    for resolution in ROLLUP_RULES:
+        rollups[resolution] = rollup(df, resolution)
+    return rollups
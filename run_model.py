@@ -5,17 +5,25 @@ import csv
 from imbalance_algorithm_SAP import run_battery_trading as run_battery_trading_SAP
 from self_consumption_PV_PAP import run_battery_trading as run_battery_trading_PAP
 from day_ahead_trading_PAP import run_battery_trading as run_battery_trading_day_ahead
+from ingestion import STRATEGY_KEYS
+from input_cache import load_input_cached
+from excel_export import fill_template
+from revenue_logic import FALLBACK_METHOD, run_status
 import pandas as pd
 import os
 import openpyxl
 from openpyxl.utils.dataframe import dataframe_to_rows
-import xlwings as xw
 import threading
 import queue
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 
 VERSION = "5.8"
 # Current version
 
+# Aantal processen voor parallelle model runs (aanpasbaar in het venster; 1 = na elkaar)
+DEFAULT_WORKERS = max(1, min(4, os.cpu_count() or 1))
+
 class ParamWindow:
     def __init__(self, master):
         self.master = master
@@ -227,6 +235,14 @@ class ParamWindow:
                               font=("Arial", 11, "bold"), bg="#4CAF50", fg="white", width=25, height=2)
         run_button.grid(row=3, column=0, columnspan=3, pady=(5,10))
         
+        # Aantal parallelle processen voor de model runs
+        workers_frame = tk.Frame(self.master)
+        workers_frame.grid(row=5, column=0, columnspan=3, sticky="w", pady=(5,0))
+        tk.Label(workers_frame, text="Parallelle runs (processen):").pack(side=tk.LEFT)
+        self.workers_var = tk.StringVar(value=str(DEFAULT_WORKERS))
+        tk.Spinbox(workers_frame, from_=1, to=os.cpu_count() or 1, textvariable=self.workers_var,
+                   width=5).pack(side=tk.LEFT, padx=(5,0))
+
         # Progress text
         self.progress_text = tk.Text(self.master, height=8, width=70, fg="blue", wrap=tk.WORD, state=tk.DISABLED)
         self.progress_text.grid(row=4, column=0, columnspan=3, sticky="ew", pady=(10,0))
@@ -390,6 +406,13 @@ class ParamWindow:
             # Schedule update in main thread
             self.master.after(0, _add_message)
 
+    def show_warning(self, title, message):
+        """Toon een waarschuwing in de main thread (thread-safe)"""
+        if threading.current_thread() == threading.main_thread():
+            messagebox.showwarning(title, message)
+        else:
+            self.master.after(0, lambda: messagebox.showwarning(title, message))
+
     def submit(self):
         """Voer alle model runs uit in een separate thread"""
         try:
@@ -411,6 +434,14 @@ class ParamWindow:
                 except Exception as e:
                     messagebox.showerror("Error", f"Model Run {i+1}: Ongeldige input - {e}")
                     return
+
+            try:
+                max_workers = int(self.workers_var.get())
+                if max_workers < 1:
+                    raise ValueError
+            except ValueError:
+                messagebox.showerror("Fout", "Parallelle runs: geef een geheel getal van 1 of meer.")
+                return
             
             # Disable de Uitvoeren knop om dubbele clicks te voorkomen
             for widget in self.master.winfo_children():
@@ -420,43 +451,52 @@ class ParamWindow:
             
             # Start optimalisatie in separate thread
             self.add_progress_message("Start optimalisatie...")
-            thread = threading.Thread(target=self.run_models_thread, args=(all_params,))
+            thread = threading.Thread(target=self.run_models_thread, args=(all_params, max_workers))
             thread.daemon = True  # Thread stopt als main programma stopt
             thread.start()
             
         except Exception as e:
             messagebox.showerror("Error", f"Algemene fout: {e}")
     
-    def run_models_thread(self, all_params):
-        """Voer model runs uit in background thread"""
+    def run_models_thread(self, all_params, max_workers=1):
+        """Voer model runs uit in background thread (na elkaar, of parallel in max_workers processen)"""
         try:
             total_runs = len(all_params)
             self.add_progress_message(f"Start van {total_runs} model run(s)")
-            
+
+            if max_workers > 1 and total_runs > 1:
+                self.add_progress_message(f"Parallel uitvoeren in {min(max_workers, total_runs)} processen")
+                outcomes = run_models_parallel(all_params, self, max_workers)
+            else:
+                outcomes = []
+                for i, params in enumerate(all_params):
+                    try:
+                        outcomes.append(run_single_model(params, self, i + 1, total_runs))
+                    except Exception as e:
+                        error_msg = f"Run {i + 1}/{total_runs} gefaald: FOUT - {str(e)}"
+                        self.add_progress_message(error_msg)
+                        outcomes.append((error_msg, None, None))
+
             results = []
             successful_runs = 0
             failed_runs = 0
             fallback_runs = 0
-            
-            for i, params in enumerate(all_params):
-                run_number = i + 1
-                try:
-                    result_message, output_path, optimization_method = run_single_model(params, self, run_number, total_runs)
-                    if output_path:  # Succesvolle run
-                        if optimization_method == 'Fallback heuristiek (Pyomo gefaald)':
-                            results.append(f"⚠️ Run {run_number}: {output_path} (Fallback gebruikt)")
-                            fallback_runs += 1
-                        else:
-                            results.append(f"✓ Run {run_number}: {output_path}")
-                        successful_runs += 1
-                    else:  # Gefaalde run
-                        # Gebruik de specifieke foutmelding die door run_single_model wordt teruggegeven
-                        results.append(f"✗ Run {run_number}: {result_message.split(': ', 1)[-1] if ': ' in result_message else result_message}")
-                        failed_runs += 1
-                except Exception as e:
-                    error_msg = f"✗ Run {run_number}: FOUT - {str(e)}"
-                    results.append(error_msg)
-                    self.add_progress_message(error_msg)
+            # Status per run: 'success', 'fallback' of 'failure'
+            self.run_statuses = {}
+
+            for run_number, (result_message, output_path, optimization_method) in enumerate(outcomes, 1):
+                status = run_status(output_path, optimization_method)
+                self.run_statuses[run_number] = status
+                if status == 'fallback':
+                    results.append(f"⚠️ Run {run_number}: {output_path} (Fallback gebruikt)")
+                    fallback_runs += 1
+                    successful_runs += 1
+                elif status == 'success':
+                    results.append(f"✓ Run {run_number}: {output_path}")
+                    successful_runs += 1
+                else:  # Gefaalde run
+                    # Gebruik de specifieke foutmelding die door run_single_model wordt teruggegeven
+                    results.append(f"✗ Run {run_number}: {result_message.split(': ', 1)[-1] if ': ' in result_message else result_message}")
                     failed_runs += 1
             
             # Toon eindresultaat
@@ -535,6 +575,57 @@ def extract_project_name(input_filename):
         # Geen specifieke projectnaam gevonden, gebruik hele bestandsnaam zonder extensie
         return base_name
 
+def write_results_xlwings(data_path, new_path, df_export, summary_text, params):
+    """Schrijf de resultaten via een onzichtbare Excel instantie (xlwings, alleen Windows)."""
+    import xlwings as xw
+    import time
+
+    app_xl = xw.App(visible=False)
+    wb = app_xl.books.open(data_path)
+    if 'Import uit Python' not in [s.name for s in wb.sheets]:
+        wb.close()
+        app_xl.quit()
+        raise ValueError("Tabblad 'Import uit Python' niet gevonden in het geselecteerde bestand.")
+    ws = wb.sheets['Import uit Python']
+    # Kolomnamen schrijven: B7 = indexnaam ('Datetime'), C7 = eerste kolom van df, etc.
+    start_row = 7
+    start_col = 2
+    ws.range((start_row, start_col)).value = df_export.index.name or 'Datetime'
+    ws.range((start_row, start_col+1)).options(transpose=False).value = list(df_export.columns)
+    # Data schrijven
+    data = [[row.Index] + list(row[1:]) for row in df_export.itertuples(index=True)]
+    ws.range((start_row+1, start_col)).value = data
+    # Samengevoegde cel C6:M6 vullen met samenvattende tekst
+    merge_range = ws.range('C6:M6')
+    merge_range.merge()
+    merge_range.value = summary_text
+    # Belangrijkste inputwaarden exporteren naar W2-W9
+    ws.range('W2').value = params['POWER_MW']
+    ws.range('W3').value = params['CAPACITY_MWH']
+    ws.range('W4').value = params['MIN_SOC']
+    ws.range('W5').value = params['MAX_SOC']
+    ws.range('W6').value = params['EFF_CH']
+    ws.range('W7').value = params['EFF_DIS']
+    ws.range('W8').value = params['SUPPLY_COSTS']
+    ws.range('W9').value = params['TRANSPORT_COSTS']
+    # Opslaan als nieuw bestand
+    wb.save(new_path)
+    
+    # Robuuste afsluiting van Excel om COM/OLE fouten te voorkomen
+    try:
+        wb.close()
+    except Exception as close_error:
+        print(f"Waarschuwing bij sluiten workbook: {close_error}")
+    
+    try:
+        app_xl.quit()
+    except Exception as quit_error:
+        print(f"Waarschuwing bij afsluiten Excel: {quit_error}")
+    
+    # Forceer cleanup van Excel processen indien nodig
+    time.sleep(0.5)  # Korte pauze om Excel tijd te geven om af te sluiten
+
+
 def run_single_model(params, app, run_number, total_runs):
     """Voer een enkele model run uit"""
     now = datetime.datetime.now()
@@ -555,6 +646,11 @@ def run_single_model(params, app, run_number, total_runs):
     app.add_progress_message(f"Start van Model Run {run_number}/{total_runs} ({params['BATTERY_CONFIG']})")
     
     try:
+        # Input inlezen (CSV of sheet 'Export naar Python') en controleren; herhaalde runs op
+        # dezelfde workbook laden uit de cache (input_cache.py)
+        config.input_data = load_input_cached(params["DATA_PATH"], STRATEGY_KEYS.get(params["BATTERY_CONFIG"], 'self_consumption'),
+                                              progress_callback=progress_callback)
+
         if params["BATTERY_CONFIG"] == "Onbalanshandel, alleen batterij op SAP":
             df, summary = run_battery_trading_SAP(config, progress_callback=progress_callback)
         elif params["BATTERY_CONFIG"] == "Onbalanshandel, alles op onbalansprijzen":
@@ -598,14 +694,6 @@ def run_single_model(params, app, run_number, total_runs):
         new_path = os.path.join(input_dir, filename)
         # Voortgangsupdate voor het opslaan
         app.add_progress_message(f"Run {run_number}/{total_runs}: Opslaan van het nieuwe bestand. Dit kan een minuutje duren")
-        # Open met xlwings en schrijf resultaten
-        app_xl = xw.App(visible=False)
-        wb = app_xl.books.open(params["DATA_PATH"])
-        if 'Import uit Python' not in [s.name for s in wb.sheets]:
-            wb.close()
-            app_xl.quit()
-            raise ValueError("Tabblad 'Import uit Python' niet gevonden in het geselecteerde bestand.")
-        ws = wb.sheets['Import uit Python']
         # Alleen de gewenste kolommen exporteren
         if params["BATTERY_CONFIG"] == "Onbalanshandel, alleen batterij op SAP":
             gewenste_kolommen = [
@@ -717,17 +805,6 @@ def run_single_model(params, app, run_number, total_runs):
             raise ValueError(f"Geen van de verwachte kolommen gevonden in de output. Verwacht: {gewenste_kolommen}, Aanwezig: {list(df.columns)}")
         
         df_export = df[kolommen_aanwezig].copy()
-        # Kolomnamen schrijven: B7 = indexnaam ('Datetime'), C7 = eerste kolom van df, etc.
-        start_row = 7
-        start_col = 2
-        ws.range((start_row, start_col)).value = df_export.index.name or 'Datetime'
-        ws.range((start_row, start_col+1)).options(transpose=False).value = list(df_export.columns)
-        # Data schrijven
-        data = [[row.Index] + list(row[1:]) for row in df_export.itertuples(index=True)]
-        ws.range((start_row+1, start_col)).value = data
-        # Samengevoegde cel C6:M6 vullen met samenvattende tekst
-        merge_range = ws.range('C6:M6')
-        merge_range.merge()
         # Formatteren volgens voorbeeld: 'Python run 07-07-2025 10u56      0.2 MW      0.4 MWh     562.2 cycli per jaar.'
         datum_str = now.strftime('%d-%m-%Y %Hu%M')
         optimization_method = summary.get('optimization_method', 'Pyomo optimalisatie')
@@ -737,33 +814,13 @@ def run_single_model(params, app, run_number, total_runs):
             f"Algoritme: {params['BATTERY_CONFIG']}      "
             f"Optimalisatie: {optimization_method}"
         )
-        merge_range.value = summary_text
-        # Belangrijkste inputwaarden exporteren naar W2-W9
-        ws.range('W2').value = params['POWER_MW']
-        ws.range('W3').value = params['CAPACITY_MWH']
-        ws.range('W4').value = params['MIN_SOC']
-        ws.range('W5').value = params['MAX_SOC']
-        ws.range('W6').value = params['EFF_CH']
-        ws.range('W7').value = params['EFF_DIS']
-        ws.range('W8').value = params['SUPPLY_COSTS']
-        ws.range('W9').value = params['TRANSPORT_COSTS']
-        # Opslaan als nieuw bestand
-        wb.save(new_path)
-        
-        # Robuuste afsluiting van Excel om COM/OLE fouten te voorkomen
-        try:
-            wb.close()
-        except Exception as close_error:
-            print(f"Waarschuwing bij sluiten workbook: {close_error}")
-        
-        try:
-            app_xl.quit()
-        except Exception as quit_error:
-            print(f"Waarschuwing bij afsluiten Excel: {quit_error}")
-        
-        # Forceer cleanup van Excel processen indien nodig
-        import time
-        time.sleep(0.5)  # Korte pauze om Excel tijd te geven om af te sluiten
+        # Resultaten in 'Import uit Python' van de template schrijven en opslaan als nieuw bestand.
+        # Standaard zonder Excel (openpyxl, werkt ook op Linux en parallel); EXCEL_ENGINE 'xlwings'
+        # gebruikt een onzichtbare Excel instantie (Windows, neemt ook grafieken/afbeeldingen mee)
+        if params.get("EXCEL_ENGINE", "openpyxl") == "xlwings":
+            write_results_xlwings(params["DATA_PATH"], new_path, df_export, summary_text, params)
+        else:
+            fill_template(params["DATA_PATH"], new_path, df_export, summary_text, params)
 
         
         # Toon waarschuwing voor netwerkoverschrijdingen als die er zijn
@@ -771,7 +828,7 @@ def run_single_model(params, app, run_number, total_runs):
             'warning_message' in summary and 
             summary['warning_message'] is not None and 
             "WAARSCHUWING" in summary['warning_message']):
-            messagebox.showwarning("Netwerkoverschrijdingen Gedetecteerd", summary['warning_message'])
+            app.show_warning("Netwerkoverschrijdingen Gedetecteerd", summary['warning_message'])
         
         # Toon waarschuwing voor infeasible dagen als die er zijn
         if 'infeasible_days' in summary and len(summary['infeasible_days']) > 0:
@@ -781,12 +838,12 @@ def run_single_model(params, app, run_number, total_runs):
                              f"{infeasible_list}\n\n"
                              f"Voor deze dagen werd de batterij SoC gereset en bleef de batterij inactief.\n"
                              f"Overweeg om het batterijvermogen te verhogen of de data te controleren.")
-            messagebox.showwarning("Infeasible Dagen Gedetecteerd", warning_message)
+            app.show_warning("Infeasible Dagen Gedetecteerd", warning_message)
         
         success_message = f"Model Run {run_number}/{total_runs} voltooid!\nResultaten opgeslagen in:\n{new_path}"
         
         # Controleer of fallback heuristiek werd gebruikt
-        if summary.get('optimization_method') == 'Fallback heuristiek (Pyomo gefaald)':
+        if summary.get('optimization_method') == FALLBACK_METHOD:
             success_message += f"\n\n⚠️  BELANGRIJK: Fallback heuristiek gebruikt"
             success_message += f"\nDe Pyomo optimalisatie is gefaald, daarom werd een vereenvoudigde heuristiek gebruikt."
             success_message += f"\nDe resultaten zijn minder optimaal dan bij succesvolle Pyomo optimalisatie."
@@ -843,6 +900,73 @@ def run_single_model(params, app, run_number, total_runs):
         return error_message, None, None
 
 
+class QueueReporter:
+    """
+    Vervangt het venster in een worker proces: voortgang en waarschuwingen van run_single_model
+    gaan via een queue naar het hoofdproces, dat ze in het venster toont.
+    """
+
+    def __init__(self, message_queue):
+        self.message_queue = message_queue
+
+    def add_progress_message(self, message):
+        self.message_queue.put(('progress', message))
+
+    def show_warning(self, title, message):
+        self.message_queue.put(('warning', title, message))
+
+
+def _run_single_model_worker(params, message_queue, run_number, total_runs):
+    """Worker voor run_models_parallel (top-level zodat het gepickled kan worden)"""
+    return run_single_model(params, QueueReporter(message_queue), run_number, total_runs)
+
+
+def _forward_messages(message_queue, app):
+    """Geef alle berichten uit de queue door aan het venster"""
+    while True:
+        try:
+            item = message_queue.get_nowait()
+        except queue.Empty:
+            return
+        if item[0] == 'warning':
+            app.show_warning(item[1], item[2])
+        else:
+            app.add_progress_message(item[1])
+
+
+def run_models_parallel(all_params, app, max_workers, poll_interval=0.2):
+    """
+    Voer de model runs uit in max_workers aparte processen (Pyomo opbouw en de nabewerking zijn
+    CPU- en GIL-gebonden, threads helpen dus niet). Voortgang komt via een Manager queue terug
+    naar app.add_progress_message.
+    Returns: lijst (result_message, output_path, optimization_method) in run volgorde
+    """
+    total_runs = len(all_params)
+    outcomes = [None] * total_runs
+    with multiprocessing.Manager() as manager:
+        message_queue = manager.Queue()
+        with ProcessPoolExecutor(max_workers=min(max_workers, total_runs)) as pool:
+            futures = {
+                pool.submit(_run_single_model_worker, params, message_queue, i + 1, total_runs): i
+                for i, params in enumerate(all_params)
+            }
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                _forward_messages(message_queue, app)
+                for future in done:
+                    i = futures[future]
+                    try:
+                        outcomes[i] = future.result()
+                    except Exception as e:
+                        # Bijv. een worker proces dat onverwacht is gestopt
+                        error_msg = f"Run {i + 1}/{total_runs} gefaald: FOUT - {str(e)}"
+                        app.add_progress_message(error_msg)
+                        outcomes[i] = (error_msg, None, None)
+        _forward_messages(message_queue, app)
+    return outcomes
+
+
 def main():
     """Hoofdfunctie die de GUI start"""
     root = tk.Tk()
@@ -858,4 +982,5 @@ def main():
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # nodig voor de worker processen in een gebundelde .exe
     main()
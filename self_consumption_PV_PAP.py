@@ -1,8 +1,9 @@
-import pandas as pd
 import numpy as np
-import os
 from pyomo.environ import *
-from pyomo.opt import SolverFactory
+from ingestion import prepare_input
+from solver_backends import get_solver, solver_settings, solve_model
+from fallback_heuristic import simulate_fallback, FALLBACK_METHOD
+from sparse_lp import build_self_consumption_lp, run_sparse_engine, run_rolling_horizon
 
 def get_energy_tax_table():
     """
@@ -27,96 +28,33 @@ def calculate_energy_tax(total_consumption_mwh, tax_table):
             return bracket['tax_eur_per_mwh']
     return tax_table['consumption_brackets'][-1]['tax_eur_per_mwh']
 
-def run_battery_trading(config, progress_callback=None):
-    # Read Excel sheet
-    df = config.input_data.copy()
-    datetime_col = None
-    for col in df.columns:
-        if col.strip().lower() == 'datetime':
-            datetime_col = col
-            break
-    if not datetime_col:
-        raise ValueError("No column 'Datetime' of 'datetime' gevonden in het 'Export naar Python' sheet.")
-    df[datetime_col] = pd.to_datetime(df[datetime_col])
-    df.set_index(datetime_col, inplace=True)
-
-    # Check of benodigde kolommen aanwezig zijn
-    required_columns = ["production_PV", "load", "price_day_ahead", "space available for charging (kWh)", "space available for discharging (kWh)", 
-                       "grid_excl_battery", "max_feed_in_grid", "max_take_from_grid"]
-    for col in required_columns:
-        if col not in df.columns:
-            raise ValueError(f"Column '{col}' ontbreekt in de input data.")
-
-    # Configuratie
-    power_mw = config.POWER_MW
-    capacity_mwh = config.CAPACITY_MWH
-    eff_ch = config.EFF_CH
-    eff_dis = config.EFF_DIS
-    min_soc_frac = config.MIN_SOC
-    max_soc_frac = config.MAX_SOC
-    min_soc = min_soc_frac * capacity_mwh
-    max_soc = max_soc_frac * capacity_mwh
-    time_step_h = config.TIME_STEP_H
-    max_cycles = config.MAX_CYCLES
-    if hasattr(config, 'INIT_SOC'):
-        start_soc = float(config.INIT_SOC) * capacity_mwh  # We bepalen dit later per dag
-    else:
-        start_soc = 0.5 * capacity_mwh
-    usable_capacity = capacity_mwh * (max_soc_frac - min_soc_frac)
-    
-    # Energiebelasting tabel en leveringskosten
-    tax_table = get_energy_tax_table()
-    
-    # Haal leveringskosten uit config
-    if hasattr(config, 'SUPPLY_COSTS'):
-        supply_costs = config.SUPPLY_COSTS
-    else:
-        supply_costs = 20.0  # Default waarde voor backward compatibility
-    
-    # Haal transportkosten uit config
-    if hasattr(config, 'TRANSPORT_COSTS'):
-        transport_costs = config.TRANSPORT_COSTS
-    else:
-        transport_costs = 15.0  # Default waarde voor backward compatibility
-    
-    # Schat jaarverbruik voor belastingberekening (simpele benadering)
-    if len(df) > 0:
-        # Bereken gemiddeld verbruik per tijdstap en extrapoleer naar jaar
-        avg_load_kwh = df['load'].mean()
-        hours_per_year = 8760
-        estimated_annual_consumption_mwh = (avg_load_kwh * hours_per_year) / 1000
-        
-        # Bereken marginale energiebelasting
-        marginal_tax_rate = calculate_energy_tax(estimated_annual_consumption_mwh, tax_table)
-        
-        if progress_callback:
-            progress_callback(f"Geschat jaarverbruik: {estimated_annual_consumption_mwh:.1f} MWh")
-            progress_callback(f"Energiebelasting: €{marginal_tax_rate:.2f}/MWh")
-            progress_callback(f"Leveringskosten: €{supply_costs:.2f}/MWh (voor afname en invoeding)")
-            progress_callback(f"Transportkosten: €{transport_costs:.2f}/MWh (alleen voor afname)")
-    else:
-        marginal_tax_rate = tax_table['consumption_brackets'][0]['tax_eur_per_mwh']
-
-    # Converteer input data van kWh naar MWh voor Pyomo
-    df_mw = df.copy()
-    # Converteer alle energie kolommen van kWh naar MWh
-    df_mw['production_PV_mwh'] = df['production_PV'] / 1000  # kWh -> MWh
-    df_mw['load_mwh'] = df['load'] / 1000  # kWh -> MWh
-    df_mw['space_charging_mwh'] = df['space available for charging (kWh)'] / 1000  # kWh -> MWh
-    df_mw['space_discharging_mwh'] = df['space available for discharging (kWh)'] / 1000  # kWh -> MWh
-    df_mw['grid_excl_battery_mwh'] = df['grid_excl_battery'] / 1000  # kWh -> MWh
-    df_mw['max_feed_in_grid_mwh'] = df['max_feed_in_grid'] / 1000  # kWh -> MWh
-    df_mw['max_take_from_grid_mwh'] = df['max_take_from_grid'] / 1000  # kWh -> MWh
-    
-    # Initialisatie
-    network_violations = []
+def _solve_pyomo(arrays, model_params, settings, progress_callback=None):
+    """
+    Bouw en los het jaar model op via Pyomo + CBC.
+    arrays: dict met 'grid_excl_mwh', 'max_feed_in_mwh', 'max_take_from_mwh' (MWh)
+    Returns: (oplossing dict per variabele blok, objectief) of (None, None) als de solver faalt
+    """
+    power_mw = model_params['power_mw']
+    min_soc = model_params['min_soc']
+    max_soc = model_params['max_soc']
+    time_step_h = model_params['time_step_h']
+    eff_ch = model_params['eff_ch']
+    eff_dis = model_params['eff_dis']
+    start_soc = model_params['start_soc']
+    max_cycles = model_params['max_cycles']
+    usable_capacity = model_params['usable_capacity']
     
     # Maak Pyomo model voor jaar-optimalisatie
     if progress_callback:
         progress_callback("Pyomo model opbouwen...")
     
+    # Eén keer naar Python floats, zodat de constraint regels alleen lijst lookups doen
+    grid_excl_mwh = np.asarray(arrays['grid_excl_mwh'], dtype=float).tolist()
+    max_feed_in_mwh = np.asarray(arrays['max_feed_in_mwh'], dtype=float).tolist()
+    max_take_from_mwh = np.asarray(arrays['max_take_from_mwh'], dtype=float).tolist()
+
     # Maak tijdstappen index
-    timesteps = list(range(len(df)))
+    timesteps = list(range(len(grid_excl_mwh)))
     
     # Maak Pyomo model
     model = ConcreteModel()
@@ -150,15 +88,15 @@ def run_battery_trading(config, progress_callback=None):
     
     # Netwerk grenzen met slack variabelen - ALLES IN MWh
     def network_feed_in_rule(model, t):
-        grid_excl = df_mw.iloc[t]['grid_excl_battery_mwh']  # MWh
-        max_feed_in = df_mw.iloc[t]['max_feed_in_grid_mwh']  # MWh
+        grid_excl = grid_excl_mwh[t]  # MWh
+        max_feed_in = max_feed_in_mwh[t]  # MWh
         net_battery_exchange = (model.charge[t] - model.discharge[t]) * time_step_h  # MWh (positief=laden, negatief=ontladen)
         grid_incl = grid_excl + net_battery_exchange
         return grid_incl >= max_feed_in - model.feed_in_violation[t]
     
     def network_take_from_rule(model, t):
-        grid_excl = df_mw.iloc[t]['grid_excl_battery_mwh']  # MWh
-        max_take_from = df_mw.iloc[t]['max_take_from_grid_mwh']  # MWh
+        grid_excl = grid_excl_mwh[t]  # MWh
+        max_take_from = max_take_from_mwh[t]  # MWh
         net_battery_exchange = (model.charge[t] - model.discharge[t]) * time_step_h  # MWh (positief=laden, negatief=ontladen)
         grid_incl = grid_excl + net_battery_exchange
         return grid_incl <= max_take_from + model.take_from_violation[t]
@@ -168,7 +106,7 @@ def run_battery_trading(config, progress_callback=None):
     
     # Grid feed-in constraint - ALLES IN MWh
     def grid_feed_in_rule(model, t):
-        grid_excl = df_mw.iloc[t]['grid_excl_battery_mwh']  # MWh
+        grid_excl = grid_excl_mwh[t]  # MWh
         net_battery_exchange = (model.charge[t] - model.discharge[t]) * time_step_h  # MWh
         grid_incl = grid_excl + net_battery_exchange
         return model.grid_feed_in[t] >= -grid_incl
@@ -197,7 +135,7 @@ def run_battery_trading(config, progress_callback=None):
         # Beloning voor laden bij PV overschot
         pv_self_consumption_reward = 0
         for t in timesteps:
-            if df_mw.iloc[t]['grid_excl_battery_mwh'] < 0:  # Er is PV netlevering (MWh)
+            if grid_excl_mwh[t] < 0:  # Er is PV netlevering (MWh)
                 pv_self_consumption_reward -= model.charge[t] * time_step_h * 500  # Beloning - MWh * 10 voor juiste schaling
         
         return violation_penalty + grid_feed_in_penalty + total_activity_penalty + pv_self_consumption_reward
@@ -208,48 +146,24 @@ def run_battery_trading(config, progress_callback=None):
     if progress_callback:
         progress_callback("Pyomo optimalisatie uitvoeren...")
     
-    # Probeer eerst de lokale CBC solver
-    cbc_path = os.path.join(os.path.dirname(__file__), 'Cbc-releases.2.10.12-w64-msvc16-md', 'bin', 'cbc.exe')
-    solver = None
-    
-    if os.path.exists(cbc_path):
-        try:
-            solver = SolverFactory('cbc', executable=cbc_path)
-            if progress_callback:
-                progress_callback(f"Lokale CBC solver gevonden: {cbc_path}")
-        except Exception as e:
-            if progress_callback:
-                progress_callback(f"Fout bij laden lokale CBC: {e}")
-    
-    if solver is None:
-        try:
-            solver = SolverFactory('cbc')
-            if progress_callback:
-                progress_callback("Standaard CBC solver gebruikt")
-        except Exception as e:
-            if progress_callback:
-                progress_callback(f"Fout bij laden standaard CBC: {e}")
-            raise ValueError("Geen CBC solver beschikbaar")
-    
+    # Solver via de centrale solver laag (settings = solver_settings(config), standaard CBC)
+    # CBC-specifieke LP instellingen blijven gelijk aan voorheen
     try:
-        # Configureer solver voor lineair probleem (LP)
-        solver.options['presolve'] = 'on'
-        solver.options['scaling'] = 'on'
-        solver.options['primalT'] = 1e-6
-        solver.options['dualT'] = 1e-6
-        solver.options['timeLimit'] = 300  # 5 minuten timeout
-        
+        # Binnen de try: een ontbrekende solver (ValueError) leidt ook naar de fallback heuristiek
+        solver = get_solver(**settings,
+                            options={'cbc': {'presolve': 'on', 'scaling': 'on', 'primalT': 1e-6, 'dualT': 1e-6}},
+                            progress_callback=progress_callback)
         if progress_callback:
             progress_callback(f"Model statistieken: {len(timesteps)} tijdstappen")
         
-        results_pyomo = solver.solve(model, tee=False)
+        results_pyomo = solve_model(solver, model, tee=False)
         
         if progress_callback and results_pyomo:
             progress_callback(f"Solver status: {results_pyomo.solver.status}")
             progress_callback(f"Termination condition: {results_pyomo.solver.termination_condition}")
     except Exception as e:
         if progress_callback:
-            progress_callback(f"CBC solver fout: {str(e)}. Gebruik fallback heuristiek...")
+            progress_callback(f"Solver fout: {str(e)}. Gebruik fallback heuristiek...")
         results_pyomo = None
     
     # Accepteer optimale en feasible oplossingen
@@ -262,16 +176,131 @@ def run_battery_trading(config, progress_callback=None):
         TerminationCondition.userInterrupt
     ]
     
-    if results_pyomo and results_pyomo.solver.termination_condition in acceptable_conditions:
-        if progress_callback:
-            progress_callback("Pyomo optimalisatie succesvol! Resultaten verwerken...")
+    if not (results_pyomo and results_pyomo.solver.termination_condition in acceptable_conditions):
+        return None, None
+    if model.charge[timesteps[0]].value is None:
+        # Geen oplossing geladen (bijv. tijdslimiet zonder feasible oplossing)
+        return None, None
+    
+    if progress_callback:
+        progress_callback("Pyomo optimalisatie succesvol! Resultaten verwerken...")
+    
+    solution = {
+        name: [value(getattr(model, name)[t]) for t in timesteps]
+        for name in ('charge', 'discharge', 'soc', 'feed_in_violation', 'take_from_violation')
+    }
+    return solution, value(model.objective)
+
+def run_battery_trading(config, progress_callback=None):
+    # Input (datetime index en kolomcontrole) via de gedeelde inleeslaag
+    prepared = prepare_input(config, 'self_consumption')
+    df, inputs = prepared.frame, prepared.arrays
+
+    # Configuratie
+    power_mw = config.POWER_MW
+    capacity_mwh = config.CAPACITY_MWH
+    eff_ch = config.EFF_CH
+    eff_dis = config.EFF_DIS
+    min_soc_frac = config.MIN_SOC
+    max_soc_frac = config.MAX_SOC
+    min_soc = min_soc_frac * capacity_mwh
+    max_soc = max_soc_frac * capacity_mwh
+    time_step_h = config.TIME_STEP_H
+    max_cycles = config.MAX_CYCLES
+    if hasattr(config, 'INIT_SOC'):
+        start_soc = float(config.INIT_SOC) * capacity_mwh  # We bepalen dit later per dag
+    else:
+        start_soc = 0.5 * capacity_mwh
+    usable_capacity = capacity_mwh * (max_soc_frac - min_soc_frac)
+    
+    # Energiebelasting tabel en leveringskosten
+    tax_table = get_energy_tax_table()
+    
+    # Haal leveringskosten uit config
+    if hasattr(config, 'SUPPLY_COSTS'):
+        supply_costs = config.SUPPLY_COSTS
+    else:
+        supply_costs = 20.0  # Default waarde voor backward compatibility
+    
+    # Haal transportkosten uit config
+    if hasattr(config, 'TRANSPORT_COSTS'):
+        transport_costs = config.TRANSPORT_COSTS
+    else:
+        transport_costs = 15.0  # Default waarde voor backward compatibility
+    
+    # Schat jaarverbruik voor belastingberekening (simpele benadering)
+    if len(df) > 0:
+        # Bereken gemiddeld verbruik per tijdstap en extrapoleer naar jaar
+        avg_load_kwh = df['load'].mean()
+        hours_per_year = 8760
+        estimated_annual_consumption_mwh = (avg_load_kwh * hours_per_year) / 1000
         
+        # Bereken marginale energiebelasting
+        marginal_tax_rate = calculate_energy_tax(estimated_annual_consumption_mwh, tax_table)
+        
+        if progress_callback:
+            progress_callback(f"Geschat jaarverbruik: {estimated_annual_consumption_mwh:.1f} MWh")
+            progress_callback(f"Energiebelasting: €{marginal_tax_rate:.2f}/MWh")
+            progress_callback(f"Leveringskosten: €{supply_costs:.2f}/MWh (voor afname en invoeding)")
+            progress_callback(f"Transportkosten: €{transport_costs:.2f}/MWh (alleen voor afname)")
+    else:
+        marginal_tax_rate = tax_table['consumption_brackets'][0]['tax_eur_per_mwh']
+
+    # MWh arrays (één keer voorbereid in PreparedInput, zie ingestion.py) voor Pyomo en de sparse LP
+    arrays = {
+        'grid_excl_mwh': inputs['grid_excl_mwh'],  # MWh
+        'max_feed_in_mwh': inputs['max_feed_in_mwh'],  # MWh
+        'max_take_from_mwh': inputs['max_take_from_mwh'],  # MWh
+    }
+    
+    # Initialisatie
+    network_violations = []
+    
+    # Maak tijdstappen index
+    timesteps = list(range(len(df)))
+    
+    model_params = {
+        'power_mw': power_mw,
+        'min_soc': min_soc,
+        'max_soc': max_soc,
+        'time_step_h': time_step_h,
+        'eff_ch': eff_ch,
+        'eff_dis': eff_dis,
+        'start_soc': start_soc,
+        'max_cycles': max_cycles,
+        'usable_capacity': usable_capacity,
+    }
+    
+    # LP engine: 'pyomo' (standaard), 'sparse' (directe sparse matrix, zie sparse_lp.py)
+    # of 'rolling' (sparse LP in rolling-horizon vensters)
+    if hasattr(config, 'LP_ENGINE'):
+        lp_engine = config.LP_ENGINE
+    else:
+        lp_engine = 'pyomo'
+    
+    solution = None
+    lp_objective = None
+    rolling_report = None
+    
+    if lp_engine in ('sparse', 'rolling'):
+        if lp_engine == 'rolling':
+            solution, lp_objective, rolling_report = run_rolling_horizon(build_self_consumption_lp, arrays, model_params, config, progress_callback)
+        else:
+            solution, lp_objective = run_sparse_engine(build_self_consumption_lp, arrays, model_params, config, progress_callback)
+        if solution is not None and progress_callback:
+            progress_callback("Sparse LP optimalisatie succesvol! Resultaten verwerken...")
+    else:
+        solution, lp_objective = _solve_pyomo(arrays, model_params,
+                                              solver_settings(config, time_limit=300), progress_callback)  # 5 minuten timeout
+    
+    optimization_method = "Jaarlijkse lineaire optimalisatie"
+    if solution is not None:
         # Haal resultaten op (in MW/MWh)
-        charge_list = [value(model.charge[t]) for t in timesteps]  # MW
-        discharge_list = [value(model.discharge[t]) for t in timesteps]  # MW
-        soc_list = [value(model.soc[t]) for t in timesteps]  # MWh
-        feed_in_violations = [value(model.feed_in_violation[t]) for t in timesteps]  # MWh
-        take_from_violations = [value(model.take_from_violation[t]) for t in timesteps]  # MWh
+        charge_list = list(solution['charge'])  # MW
+        discharge_list = list(solution['discharge'])  # MW
+        soc_list = list(solution['soc'])  # MWh
+        feed_in_violations = list(solution['feed_in_violation'])  # MWh
+        take_from_violations = list(solution['take_from_violation'])  # MWh
         
         # Converteer resultaten terug naar kWh voor output compatibiliteit
         energy_charged_list = [charge_list[i] * time_step_h * 1000 for i in range(len(timesteps))]  # MW * h * 1000 = kWh
@@ -284,8 +313,8 @@ def run_battery_trading(config, progress_callback=None):
                 violation = {
                     'datetime': df.index[i],
                     'type': 'feed_in',
-                    'max_allowed': abs(df.iloc[i]['max_feed_in_grid']),  # kWh
-                    'actual': abs(df.iloc[i]['grid_excl_battery'] + (energy_charged_list[i] - energy_discharged_list[i])),  # kWh
+                    'max_allowed': abs(inputs['max_feed_in'][i]),  # kWh
+                    'actual': abs(inputs['grid_excl'][i] + (energy_charged_list[i] - energy_discharged_list[i])),  # kWh
                     'violation': feed_in_violations[i] * 1000  # MWh -> kWh
                 }
                 network_violations.append(violation)
@@ -294,8 +323,8 @@ def run_battery_trading(config, progress_callback=None):
                 violation = {
                     'datetime': df.index[i],
                     'type': 'take_from',
-                    'max_allowed': df.iloc[i]['max_take_from_grid'],  # kWh
-                    'actual': df.iloc[i]['grid_excl_battery'] + (energy_charged_list[i] - energy_discharged_list[i]),  # kWh
+                    'max_allowed': inputs['max_take_from'][i],  # kWh
+                    'actual': inputs['grid_excl'][i] + (energy_charged_list[i] - energy_discharged_list[i]),  # kWh
                     'violation': take_from_violations[i] * 1000  # MWh -> kWh
                 }
                 network_violations.append(violation)
@@ -388,6 +417,7 @@ def run_battery_trading(config, progress_callback=None):
         if progress_callback:
             progress_callback("Pyomo optimalisatie gefaald. Gebruik fallback heuristiek...")
         final_df, total_cycles, network_violations = run_heuristic_fallback(df, config, progress_callback)
+        optimization_method = FALLBACK_METHOD
     
     # Progress update
     if progress_callback:
@@ -402,7 +432,10 @@ def run_battery_trading(config, progress_callback=None):
         "battery_power_MW": power_mw,
         "revenue_per_MW": 0,
         "network_violations": len(network_violations),
-        "optimization_method": "Jaarlijkse lineaire optimalisatie",
+        "optimization_method": optimization_method,
+        "lp_engine": lp_engine,
+        "lp_objective": lp_objective,
+        "rolling_horizon": rolling_report,
         "warning_message": None
     }
     
@@ -452,167 +485,23 @@ def run_heuristic_fallback(df, config, progress_callback=None):
     else:
         marginal_tax_rate = tax_table['consumption_brackets'][0]['tax_eur_per_mwh']
 
-    # Initialisatie
-    network_violations = []
-    cycle_history = []
-    cumulative_cycles = 0
-    results = []
-
-    # Verwerk elke dag
-    total_days = len(df.groupby(pd.Grouper(freq='D')))
-    day_count = 0
-    
-    for day, day_data in df.groupby(pd.Grouper(freq='D')):
-        if len(day_data) == 0:
-            continue
-        
-        day_count += 1
-        # Toon alleen elke 10e dag of de laatste dag
-        if day_count % 10 == 0 or day_count == total_days:
-            msg = f"Fallback heuristiek: {day_count}/{total_days} dagen verwerkt... Cycli gebruikt: {cumulative_cycles:.1f}/{max_cycles}"
-            if progress_callback:
-                progress_callback(msg)
-            else:
-                print(msg, end='\r')
-
-        soc_list = []
-        charge_list = []
-        discharge_list = []
-        energy_charged_list = []
-        energy_discharged_list = []
-        soc_frac_list = []
-        
-        for i, (idx, row) in enumerate(day_data.iterrows()):
-            grid_excl_battery = row['grid_excl_battery']  # kWh
-            max_feed_in = row['max_feed_in_grid']  # kWh (negatief)
-            max_take_from = row['max_take_from_grid']  # kWh (positief)
-            
-            charge_possible = 0
-            discharge_possible = 0
-            
-            # Bepaal welke actie nodig is (laden OF ontladen, niet beide)
-            action_needed = "none"
-            required_charge_mw = 0
-            required_discharge_mw = 0
-            
-            # Stap 1: Als er netlevering van PV is (grid_excl_battery negatief), laad om de PV op te slaan
-            if grid_excl_battery < 0:
-                # Bereken hoeveel we kunnen laden om de PV op te slaan
-                available_pv_kwh = abs(grid_excl_battery)  # kWh
-                required_charge_kwh = available_pv_kwh
-                required_charge_mw = required_charge_kwh / time_step_h / 1000  # MW
-                action_needed = "charge"
-            
-            # Stap 2: Los vermogensoverschrijdingen op (alleen als we nog geen actie hebben)
-            if action_needed == "none":
-                # Overschrijding afname: grid_excl_battery > max_take_from_grid
-                if grid_excl_battery > max_take_from:
-                    # We moeten ontladen om afname te verminderen
-                    overschrijding_kwh = grid_excl_battery - max_take_from
-                    required_discharge_kwh = overschrijding_kwh
-                    required_discharge_mw = required_discharge_kwh / time_step_h / 1000  # MW
-                    action_needed = "discharge"
-                
-                # Overschrijding invoeding: grid_excl_battery < max_feed_in_grid
-                elif grid_excl_battery < max_feed_in:
-                    # We moeten laden om invoeding te verminderen
-                    overschrijding_kwh = abs(grid_excl_battery - max_feed_in)
-                    required_charge_kwh = overschrijding_kwh
-                    required_charge_mw = required_charge_kwh / time_step_h / 1000  # MW
-                    action_needed = "charge"
-            
-            # Stap 3: Proactieve acties om toekomstige overschrijdingen te voorkomen
-            if action_needed == "none":
-                # Als we dicht bij de grenzen zitten, handel proactief
-                margin_kwh = 10  # 10 kWh marge
-                
-                # Als we dicht bij afname overschrijding zitten
-                if grid_excl_battery > (max_take_from - margin_kwh):
-                    # Laad proactief om ruimte te maken
-                    required_charge_kwh = margin_kwh
-                    required_charge_mw = required_charge_kwh / time_step_h / 1000  # MW
-                    action_needed = "charge"
-                
-                # Als we dicht bij invoeding overschrijding zitten
-                elif grid_excl_battery < (max_feed_in + margin_kwh):
-                    # Ontlaad proactief om ruimte te maken
-                    required_discharge_kwh = margin_kwh
-                    required_discharge_mw = required_discharge_kwh / time_step_h / 1000  # MW
-                    action_needed = "discharge"
-            
-            # Voer de gekozen actie uit
-            if action_needed == "charge":
-                # Beperk door batterij vermogen en SoC
-                max_charge_mw = min(power_mw, (max_soc - current_soc) / (time_step_h * eff_ch))
-                charge_possible = min(required_charge_mw, max_charge_mw)
-                discharge_possible = 0
-            elif action_needed == "discharge":
-                # Beperk door batterij vermogen en SoC
-                max_discharge_mw = min(power_mw, (current_soc - min_soc) * eff_dis / time_step_h)
-                discharge_possible = min(required_discharge_mw, max_discharge_mw)
-                charge_possible = 0
-            else:
-                # Geen actie nodig
-                charge_possible = 0
-                discharge_possible = 0
-            
-            # Update SoC
-            current_soc = current_soc + charge_possible * time_step_h * eff_ch - discharge_possible * time_step_h / eff_dis
-            current_soc = min(max(current_soc, min_soc), max_soc)
-            
-            soc_list.append(current_soc)
-            charge_list.append(charge_possible)
-            discharge_list.append(discharge_possible)
-            energy_charged_list.append(charge_possible * time_step_h * 1000)  # kWh
-            energy_discharged_list.append(discharge_possible * time_step_h * 1000)  # kWh
-            soc_frac_list.append((current_soc - min_soc) / (max_soc - min_soc))
-        
-        # Bereken cycli voor deze dag
-        total_charged_energy = sum(energy_charged_list) / 1000  # MWh
-        daily_cycle = (total_charged_energy * eff_ch) / usable_capacity if usable_capacity > 0 else 0
-        cumulative_cycles += daily_cycle
-        cycle_history.append(daily_cycle)
-        
-        day_data = day_data.copy()
-        day_data['energy_charged_kWh'] = energy_charged_list
-        day_data['energy_discharged_kWh'] = energy_discharged_list
-        day_data['SoC_kWh'] = [s * 1000 for s in soc_list]
-        day_data['SoC_pct'] = soc_frac_list
-        
-        # Controleer op netwerkoverschrijdingen na batterij acties
-        for i, (idx, row) in enumerate(day_data.iterrows()):
-            grid_excl_battery = row['grid_excl_battery']  # kWh
-            max_feed_in = row['max_feed_in_grid']  # kWh
-            max_take_from = row['max_take_from_grid']  # kWh
-            
-            # Netto uitwisseling met batterij
-            net_battery_exchange = (energy_charged_list[i] - energy_discharged_list[i])  # kWh
-            grid_incl_battery = grid_excl_battery + net_battery_exchange
-            
-            # Check overschrijdingen
-            if max_feed_in < 0 and grid_incl_battery < max_feed_in:
-                violation = {
-                    'datetime': idx,
-                    'type': 'feed_in',
-                    'max_allowed': abs(max_feed_in),
-                    'actual': abs(grid_incl_battery),
-                    'violation': abs(grid_incl_battery) - abs(max_feed_in)
-                }
-                network_violations.append(violation)
-            
-            if max_take_from > 0 and grid_incl_battery > max_take_from:
-                violation = {
-                    'datetime': idx,
-                    'type': 'take_from',
-                    'max_allowed': max_take_from,
-                    'actual': grid_incl_battery,
-                    'violation': grid_incl_battery - max_take_from
-                }
-                network_violations.append(violation)
-        
-        results.append(day_data)
-
-    final_df = pd.concat(results)
+    # Heuristiek over jaar-arrays; dagen via index offsets (zie fallback_heuristic.py)
+    fallback_params = {
+        'power_mw': power_mw,
+        'min_soc': min_soc,
+        'max_soc': max_soc,
+        'eff_ch': eff_ch,
+        'eff_dis': eff_dis,
+        'time_step_h': time_step_h,
+        'usable_capacity': usable_capacity,
+        'max_cycles': max_cycles,
+        'init_soc': current_soc,
+    }
+    final_df, columns, cumulative_cycles, cycle_history, network_violations = simulate_fallback(
+        df, fallback_params, 'self_consumption', progress_callback, check_violations=False)
+    final_df = final_df.copy()
+    for col, values in columns.items():
+        final_df[col] = values
     total_cycles = cumulative_cycles
     
     # Voeg ontbrekende kolommen toe zoals in de hoofdfunctie
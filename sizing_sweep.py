@@ -0,0 +1,121 @@
+# sizing_sweep.py
+"""
+Power x capacity sizing sweep voor de revenue strategieën.
+
+In plaats van per combinatie een volledige run_revenue_model (input inlezen, model, Excel export)
+wordt de input één keer ingelezen (InputData) en per strategie één keer voorbereid (PreparedInput met
+MWh arrays, dagen en dagslices, zie ingestion.py), en gaat dat één keer naar elk worker proces
+(pool initializer). Elk gridpunt draait daarna alleen het algoritme op de gedeelde voorbereide input
+(config.prepared_input), zonder Excel export, en levert omzet, cycli en infeasible dagen op. De LP engine is dezelfde
+als bij run_revenue_model (LP_ENGINE, standaard pyomo), zodat de omzet per gridpunt gelijk is aan een
+losse run. LP_ENGINE='sparse' via base_params is ~10x sneller met hetzelfde optimum, maar kan een ander
+gelijkwaardig schema kiezen, waardoor de gerapporteerde omzet licht van een losse run kan afwijken;
+de gebruikte engine staat per gridpunt in de kolom lp_engine. De uitkomst is per strategie een oppervlak (rijen POWER_MW, kolommen
+CAPACITY_MWH), zie show_sizing_sweep in app.py.
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from batch_run import DEFAULT_PARAMS
+from ingestion import STRATEGY_KEYS, PreparedInput, ingest
+from revenue_logic import run_strategy, total_result
+
+SWEEP_METRICS = {
+    'revenue': 'Net result (€)',
+    'cycles': 'Cycles per year',
+    'infeasible_days': 'Infeasible days',
+}
+
+# Voorbereide input per strategie in elk worker proces (gezet door _init_worker)
+_SWEEP_PREPARED = None
+
+
+def sweep_grid(start, stop, steps):
+    """Gelijk verdeelde waarden van start t/m stop (afgerond op 3 decimalen)."""
+    return [round(float(v), 3) for v in np.linspace(start, stop, int(steps))]
+
+
+def _init_worker(prepared):
+    global _SWEEP_PREPARED
+    _SWEEP_PREPARED = prepared
+
+
+def prepare_strategies(data, strategies):
+    """PreparedInput per strategie (naam uit STRATEGY_CHOICE), één keer voor alle gridpunten."""
+    return {strategy: PreparedInput(data.require(STRATEGY_KEYS.get(strategy)), STRATEGY_KEYS.get(strategy))
+            for strategy in strategies}
+
+
+def run_point(strategy, params, prepared=None):
+    """
+    Eén gridpunt: algoritme zonder export op de voorbereide input van de strategie
+    (prepared, of anders die van _init_worker).
+    Returns: dict met strategy, POWER_MW, CAPACITY_MWH en de metrics
+    """
+    class Cfg: pass
+    config = Cfg()
+    for k, v in params.items():
+        setattr(config, k, v)
+    config.prepared_input = prepared if prepared is not None else _SWEEP_PREPARED[strategy]
+
+    start = time.time()
+    row = {'strategy': strategy, 'POWER_MW': params['POWER_MW'], 'CAPACITY_MWH': params['CAPACITY_MWH'],
+           'lp_engine': params.get('LP_ENGINE', 'pyomo'), 'revenue': np.nan, 'cycles': np.nan, 'infeasible_days': np.nan, 'error': None}
+    try:
+        df, summary = run_strategy(strategy, config, progress_callback=lambda msg: None)
+        row.update(revenue=total_result(df), cycles=summary.get('total_cycles', np.nan),
+                   infeasible_days=len(summary.get('infeasible_days', [])))
+    except Exception as e:
+        row['error'] = str(e)
+    row['runtime_s'] = round(time.time() - start, 2)
+    return row
+
+
+def surfaces(runs):
+    """Per strategie een DataFrame (index POWER_MW, kolommen CAPACITY_MWH) per metric uit SWEEP_METRICS."""
+    result = {}
+    for strategy, group in runs.groupby('strategy', sort=False):
+        result[strategy] = {metric: group.pivot(index='POWER_MW', columns='CAPACITY_MWH', values=metric)
+                            for metric in SWEEP_METRICS}
+    return result
+
+
+def run_sweep(input_data, strategies, powers, capacities, base_params=None, workers=None, progress_callback=None):
+    """
+    Draai alle (strategy, power, capacity) combinaties parallel.
+    input_data: InputData of ruw DataFrame (wordt één keer ingelezen en per strategie één keer voorbereid)
+    strategies: strategienamen zoals in de Streamlit app (STRATEGY_CHOICE)
+    base_params: overige modelparameters (aanvulling op DEFAULT_PARAMS, bv. LP_ENGINE='sparse')
+    workers: aantal processen (None = alle cores, 1 = in dit proces)
+    Returns: (runs DataFrame met één rij per gridpunt, surfaces(runs))
+    """
+    prepared = prepare_strategies(ingest(input_data), strategies)
+
+    points = []
+    for strategy in strategies:
+        for power in powers:
+            for capacity in capacities:
+                params = {**DEFAULT_PARAMS, **(base_params or {}), 'STRATEGY_CHOICE': strategy,
+                          'POWER_MW': float(power), 'CAPACITY_MWH': float(capacity)}
+                points.append((strategy, params))
+
+    rows = []
+    if workers == 1:
+        for strategy, params in points:
+            rows.append(run_point(strategy, params, prepared[strategy]))
+            if progress_callback:
+                progress_callback(f"Sweep: {len(rows)}/{len(points)} punten")
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(prepared,)) as pool:
+            futures = [pool.submit(run_point, strategy, params) for strategy, params in points]
+            for future in as_completed(futures):
+                rows.append(future.result())
+                if progress_callback:
+                    progress_callback(f"Sweep: {len(rows)}/{len(points)} punten")
+
+    runs = pd.DataFrame(rows).sort_values(['strategy', 'POWER_MW', 'CAPACITY_MWH'], kind='stable')
+    runs = runs.reset_index(drop=True)
+    return runs, surfaces(runs)
@@ -0,0 +1,156 @@
+# solver_backends.py
+"""
+Centrale solver laag voor de Pyomo modellen en de sparse LP engine.
+
+Een backend wordt gekozen op naam (config.SOLVER) en krijgt uniforme opties: tijdslimiet,
+MIP gap en threads. De executable wordt één keer per proces opgezocht. Modellen worden opgelost
+via solve_model(solver, model), zodat elke backend de tijdslimiet krijgt.
+
+Backends:
+    'cbc'   - CBC executable (eerst de lokale Windows cbc.exe, daarna de systeem cbc),
+              via bestanden (subprocess)
+    'highs' - HiGHS in-process via highspy (Pyomo appsi), geen tijdelijke bestanden
+"""
+import os
+import shutil
+
+from pyomo.environ import SolverFactory
+
+DEFAULT_SOLVER = 'cbc'
+
+LOCAL_CBC_PATH = os.path.join(os.path.dirname(__file__), 'Cbc-releases.2.10.12-w64-msvc16-md', 'bin', 'cbc.exe')
+
+
+def _find_cbc():
+    # Zelfde volgorde als voorheen in elk model: eerst lokale Windows CBC, dan systeem CBC
+    if os.path.exists(LOCAL_CBC_PATH):
+        return LOCAL_CBC_PATH
+    return shutil.which('cbc')
+
+
+def _cbc_solver(executable):
+    return SolverFactory('cbc', executable=executable)
+
+
+def _cbc_options(solver, time_limit, mip_gap, threads):
+    if time_limit is not None:
+        solver.options['sec'] = time_limit
+    if mip_gap is not None:
+        solver.options['ratio'] = mip_gap
+    if threads is not None:
+        solver.options['threads'] = threads
+
+
+def _find_highs():
+    try:
+        import highspy  # noqa: F401
+    except ImportError:
+        return None
+    return 'highspy'
+
+
+def _highs_solver(executable):
+    return SolverFactory('appsi_highs')
+
+
+def _highs_options(solver, time_limit, mip_gap, threads):
+    # De tijdslimiet gaat per aanroep mee (solve_model): appsi's legacy solve() zet
+    # config.time_limit zelf op zijn timelimit argument
+    if mip_gap is not None:
+        solver.config.mip_gap = mip_gap
+    if threads is not None:
+        solver.options['threads'] = threads
+
+
+def _highs_statistics(solver, result):
+    # appsi's legacy resultaat bevat geen nodes/iteraties: lees ze uit de HiGHS instantie (-1 = onbekend)
+    info = solver._solver_model.getInfo()
+    stats = result.solver.statistics
+    if info.mip_node_count >= 0:
+        stats.branch_and_bound.number_of_created_subproblems = info.mip_node_count
+    if info.simplex_iteration_count >= 0:
+        stats.black_box.number_of_iterations = info.simplex_iteration_count
+
+
+# naam -> functie die de solver statistieken in een resultaat aanvult (in-process backends)
+SOLVER_STATISTICS = {
+    'highs': _highs_statistics,
+}
+
+# naam -> (zoek functie, solver factory, opties zetten, in-process)
+SOLVER_BACKENDS = {
+    'cbc': (_find_cbc, _cbc_solver, _cbc_options, False),
+    'highs': (_find_highs, _highs_solver, _highs_options, True),
+}
+
+_resolved = {}  # naam -> executable / module, per proces
+
+
+def resolve_backend(name):
+    """Zoek de executable (of module) van een backend op, één keer per proces. None als niet beschikbaar."""
+    if name not in SOLVER_BACKENDS:
+        raise ValueError(f"Onbekende solver '{name}'. Kies uit: {', '.join(SOLVER_BACKENDS)}")
+    if name not in _resolved:
+        _resolved[name] = SOLVER_BACKENDS[name][0]()
+    return _resolved[name]
+
+
+def is_in_process(name):
+    return SOLVER_BACKENDS[name][3]
+
+
+def solver_settings(config, time_limit=None, mip_gap=None, threads=None):
+    """
+    Solver keuze en opties uit de config, als dict voor get_solver(**settings).
+    De argumenten zijn de standaardwaarden van het model als de config niets opgeeft.
+    """
+    return {
+        'name': getattr(config, 'SOLVER', DEFAULT_SOLVER),
+        'time_limit': getattr(config, 'SOLVER_TIME_LIMIT', time_limit),
+        'mip_gap': getattr(config, 'SOLVER_MIP_GAP', mip_gap),
+        'threads': getattr(config, 'SOLVER_THREADS', threads),
+    }
+
+
+def get_solver(name=DEFAULT_SOLVER, time_limit=None, mip_gap=None, threads=None, options=None, progress_callback=None):
+    """
+    Pyomo solver voor de gekozen backend met de uniforme opties gezet.
+
+    options: optioneel {backend naam: {optie: waarde}} met extra backend-specifieke opties
+    """
+    executable = resolve_backend(name)
+    if executable is None:
+        if name == 'cbc':
+            raise ValueError(
+                "CBC solver not found. Ensure it is installed and in your system's PATH, "
+                "or include the executable with your app."
+            )
+        raise ValueError(f"Solver '{name}' niet beschikbaar")
+    _, factory, set_options, in_process = SOLVER_BACKENDS[name]
+    solver = factory(executable)
+    for key, val in (options or {}).get(name, {}).items():
+        solver.options[key] = val
+    set_options(solver, time_limit, mip_gap, threads)
+    solver._backend_name = name
+    solver._backend_time_limit = time_limit
+    if progress_callback:
+        progress_callback(f"Solver: {name} ({'in-process' if in_process else executable})")
+    return solver
+
+
+def solve_model(solver, model, **kwargs):
+    """
+    solver.solve(model, **kwargs) voor een solver van get_solver(). In-process backends krijgen de
+    tijdslimiet per aanroep mee (timelimit) en laden alleen een oplossing als die er is: een
+    infeasible model geeft dan, net als bij CBC, een resultaat met status in plaats van een exception.
+    Nodes en iteraties staan zoals bij CBC in result.solver.statistics.
+    """
+    name = getattr(solver, '_backend_name', None)
+    if name is None or not is_in_process(name):
+        return solver.solve(model, **kwargs)
+    result = solver.solve(model, timelimit=solver._backend_time_limit, load_solutions=False, **kwargs)
+    if len(result.solution) > 0:  # alleen gevuld als er een feasible oplossing is
+        model.solutions.load_from(result)
+    if name in SOLVER_STATISTICS:
+        SOLVER_STATISTICS[name](solver, result)
+    return result
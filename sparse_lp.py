@@ -0,0 +1,538 @@
+# sparse_lp.py
+"""
+Directe sparse-matrix LP opbouw voor de jaar-modellen (day-ahead en zelfconsumptie).
+
+De jaar-LP's hebben een vaste, gebande structuur (SoC keten, abs-waarde splitsing,
+netwerk slacks). In plaats van ~250k Pyomo variabelen en expressies bouwen we de
+constraint matrix direct als scipy.sparse arrays. Het probleem kan in-memory naar
+HiGHS (scipy.optimize.linprog) of als MPS bestand naar CBC.
+
+Variabelen staan in blokken van n tijdstappen, in deze volgorde:
+charge, discharge, soc, feed_in_violation, take_from_violation, grid_feed_in
+(+ grid_exchange_pos, grid_exchange_neg voor day-ahead).
+"""
+import os
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from solver_backends import resolve_backend
+
+try:
+    import scipy.sparse as sp
+    from scipy.optimize import linprog
+    SCIPY_OK = True
+except ImportError:
+    SCIPY_OK = False
+
+BASE_BLOCKS = ['charge', 'discharge', 'soc', 'feed_in_violation', 'take_from_violation', 'grid_feed_in']
+DAY_AHEAD_BLOCKS = BASE_BLOCKS + ['grid_exchange_pos', 'grid_exchange_neg']
+
+VIOLATION_PENALTY = 100000
+
+
+class SparseLP:
+    """Container voor min c'x + constant  s.t.  A_ub x <= b_ub, A_eq x == b_eq, lb <= x <= ub."""
+
+    def __init__(self, n, blocks, c, constant, A_ub, b_ub, A_eq, b_eq, lb, ub):
+        self.n = n
+        self.blocks = blocks
+        self.c = c
+        self.constant = constant
+        self.A_ub = A_ub
+        self.b_ub = b_ub
+        self.A_eq = A_eq
+        self.b_eq = b_eq
+        self.lb = lb
+        self.ub = ub
+
+    @property
+    def num_vars(self):
+        return self.n * len(self.blocks)
+
+    def offset(self, block):
+        return self.blocks.index(block) * self.n
+
+    def split(self, x):
+        """Splits een oplossingsvector in een dict {blok: array van lengte n}."""
+        return {b: x[i * self.n:(i + 1) * self.n] for i, b in enumerate(self.blocks)}
+
+
+def _check_scipy():
+    if not SCIPY_OK:
+        raise ImportError("scipy is nodig voor de sparse LP engine (pip install scipy)")
+
+
+def _rows(n, entries):
+    """
+    Bouw n rijen uit (blok_offset, coëfficiënten) paren: rij t krijgt coef[t] op kolom offset + t.
+    """
+    rows = []
+    cols = []
+    vals = []
+    t = np.arange(n)
+    for col_offset, coefs in entries:
+        rows.append(t)
+        cols.append(col_offset + t)
+        vals.append(np.broadcast_to(np.asarray(coefs, dtype=float), (n,)))
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(vals)
+
+
+def _build_base(arrays, params, blocks):
+    """Gedeelde structuur: bounds, SoC keten, vermogen, netwerk slacks, grid feed-in en cycli."""
+    _check_scipy()
+    grid_excl = np.asarray(arrays['grid_excl_mwh'], dtype=float)
+    max_feed_in = np.asarray(arrays['max_feed_in_mwh'], dtype=float)
+    max_take_from = np.asarray(arrays['max_take_from_mwh'], dtype=float)
+    n = len(grid_excl)
+    nv = n * len(blocks)
+    off = {b: i * n for i, b in enumerate(blocks)}
+
+    dt = params['time_step_h']
+    dt_ch = dt * params['eff_ch']
+    dt_dis = dt / params['eff_dis']
+    power_mw = params['power_mw']
+
+    # Bounds (zelfde als in de Pyomo modellen)
+    lb = np.zeros(nv)
+    ub = np.empty(nv)
+    ub[off['charge']:off['charge'] + n] = power_mw
+    ub[off['discharge']:off['discharge'] + n] = power_mw
+    lb[off['soc']:off['soc'] + n] = params['min_soc']
+    ub[off['soc']:off['soc'] + n] = params['max_soc']
+    for b in ('feed_in_violation', 'take_from_violation', 'grid_feed_in'):
+        ub[off[b]:off[b] + n] = 1.0
+    for b in ('grid_exchange_pos', 'grid_exchange_neg'):
+        if b in off:
+            ub[off[b]:off[b] + n] = 10.0
+    # soc[0] is gefixeerd op de start SoC
+    lb[off['soc']] = ub[off['soc']] = params['start_soc']
+
+    # Ongelijkheden (<=), per blok van n rijen
+    ub_parts = []
+    b_ub_parts = []
+    # charge + discharge <= P
+    ub_parts.append(_rows(n, [(off['charge'], 1.0), (off['discharge'], 1.0)]))
+    b_ub_parts.append(np.full(n, power_mw))
+    # grid_excl + (ch - dis) * dt >= max_feed_in - fi   ->   -dt ch + dt dis - fi <= grid_excl - max_feed_in
+    ub_parts.append(_rows(n, [(off['charge'], -dt), (off['discharge'], dt), (off['feed_in_violation'], -1.0)]))
+    b_ub_parts.append(grid_excl - max_feed_in)
+    # grid_excl + (ch - dis) * dt <= max_take_from + tf   ->   dt ch - dt dis - tf <= max_take_from - grid_excl
+    ub_parts.append(_rows(n, [(off['charge'], dt), (off['discharge'], -dt), (off['take_from_violation'], -1.0)]))
+    b_ub_parts.append(max_take_from - grid_excl)
+    # grid_feed_in >= -(grid_excl + (ch - dis) * dt)   ->   -dt ch + dt dis - gfi <= grid_excl
+    ub_parts.append(_rows(n, [(off['charge'], -dt), (off['discharge'], dt), (off['grid_feed_in'], -1.0)]))
+    b_ub_parts.append(grid_excl.copy())
+
+    row_offset = 0
+    r_list, c_list, v_list = [], [], []
+    for r, c, v in ub_parts:
+        r_list.append(r + row_offset)
+        c_list.append(c)
+        v_list.append(v)
+        row_offset += n
+    b_ub = np.concatenate(b_ub_parts)
+
+    # Cycli limiet: sum(ch) * dt * eff_ch <= max_cycles * usable
+    if params['max_cycles'] > 0 and params['usable_capacity'] > 0:
+        r_list.append(np.full(n, row_offset))
+        c_list.append(off['charge'] + np.arange(n))
+        v_list.append(np.full(n, dt_ch))
+        b_ub = np.append(b_ub, params['max_cycles'] * params['usable_capacity'])
+        row_offset += 1
+
+    A_ub = sp.csr_matrix((np.concatenate(v_list), (np.concatenate(r_list), np.concatenate(c_list))),
+                         shape=(row_offset, nv))
+
+    # SoC balans (t >= 1): soc[t] - soc[t-1] - dt_ch ch[t-1] + dt_dis dis[t-1] == 0
+    t = np.arange(1, n)
+    m = n - 1
+    eq_rows = np.tile(np.arange(m), 4)
+    eq_cols = np.concatenate([off['soc'] + t, off['soc'] + t - 1, off['charge'] + t - 1, off['discharge'] + t - 1])
+    eq_vals = np.concatenate([np.ones(m), -np.ones(m), np.full(m, -dt_ch), np.full(m, dt_dis)])
+
+    return {
+        'n': n, 'off': off, 'lb': lb, 'ub': ub, 'A_ub': A_ub, 'b_ub': b_ub,
+        'eq': (eq_rows, eq_cols, eq_vals, m), 'b_eq': [np.zeros(m)],
+    }
+
+
+def build_day_ahead_lp(arrays, params):
+    """
+    Sparse variant van day_ahead_trading_PAP.build_day_ahead_model (zelfde arrays en params).
+    """
+    base = _build_base(arrays, params, DAY_AHEAD_BLOCKS)
+    n, off = base['n'], base['off']
+    dt = params['time_step_h']
+    price = np.asarray(arrays['price'], dtype=float)
+    load_minus_pv = np.asarray(arrays['load_mwh'], dtype=float) - np.asarray(arrays['pv_mwh'], dtype=float)
+
+    # Grid uitwisseling: dt ch - dt dis - pos + neg == -(load - pv)
+    eq_rows, eq_cols, eq_vals, m = base['eq']
+    r, c, v = _rows(n, [(off['charge'], dt), (off['discharge'], -dt),
+                        (off['grid_exchange_pos'], -1.0), (off['grid_exchange_neg'], 1.0)])
+    A_eq = sp.csr_matrix((np.concatenate([eq_vals, v]), (np.concatenate([eq_rows, r + m]), np.concatenate([eq_cols, c]))),
+                         shape=(m + n, n * len(DAY_AHEAD_BLOCKS)))
+    b_eq = np.concatenate(base['b_eq'] + [-load_minus_pv])
+
+    # Doel: 1e5 * violations + (load - pv + (ch - dis) * dt) * prijs + pos * (supply + tax + transport) + neg * supply
+    c_vec = np.zeros(n * len(DAY_AHEAD_BLOCKS))
+    c_vec[off['charge']:off['charge'] + n] = dt * price
+    c_vec[off['discharge']:off['discharge'] + n] = -dt * price
+    c_vec[off['grid_exchange_pos']:off['grid_exchange_pos'] + n] = (
+        params['supply_costs'] + params['marginal_tax_rate'] + params['transport_costs'])
+    c_vec[off['grid_exchange_neg']:off['grid_exchange_neg'] + n] = params['supply_costs']
+    c_vec[off['feed_in_violation']:off['feed_in_violation'] + n] = VIOLATION_PENALTY
+    c_vec[off['take_from_violation']:off['take_from_violation'] + n] = VIOLATION_PENALTY
+    constant = float(np.dot(load_minus_pv, price))
+
+    return SparseLP(n, DAY_AHEAD_BLOCKS, c_vec, constant, base['A_ub'], base['b_ub'], A_eq, b_eq,
+                    base['lb'], base['ub'])
+
+
+def build_self_consumption_lp(arrays, params):
+    """
+    Sparse variant van het zelfconsumptie jaar-model in self_consumption_PV_PAP.
+
+    arrays: 'grid_excl_mwh', 'max_feed_in_mwh', 'max_take_from_mwh'
+    params: power_mw, min_soc, max_soc, time_step_h, eff_ch, eff_dis, start_soc, max_cycles, usable_capacity
+    """
+    base = _build_base(arrays, params, BASE_BLOCKS)
+    n, off = base['n'], base['off']
+    dt = params['time_step_h']
+    grid_excl = np.asarray(arrays['grid_excl_mwh'], dtype=float)
+
+    eq_rows, eq_cols, eq_vals, m = base['eq']
+    A_eq = sp.csr_matrix((eq_vals, (eq_rows, eq_cols)), shape=(m, n * len(BASE_BLOCKS)))
+    b_eq = np.concatenate(base['b_eq'])
+
+    # Doel: 1e5 * violations + 1000 * grid_feed_in + (ch + dis) - 500 * ch * dt bij PV overschot
+    c_vec = np.zeros(n * len(BASE_BLOCKS))
+    c_vec[off['feed_in_violation']:off['feed_in_violation'] + n] = VIOLATION_PENALTY
+    c_vec[off['take_from_violation']:off['take_from_violation'] + n] = VIOLATION_PENALTY
+    c_vec[off['grid_feed_in']:off['grid_feed_in'] + n] = 1000
+    c_vec[off['charge']:off['charge'] + n] = 1 - np.where(grid_excl < 0, dt * 500, 0.0)
+    c_vec[off['discharge']:off['discharge'] + n] = 1
+
+    return SparseLP(n, BASE_BLOCKS, c_vec, 0.0, base['A_ub'], base['b_ub'], A_eq, b_eq,
+                    base['lb'], base['ub'])
+
+
+def write_mps(lp, path):
+    """
+    Schrijf het LP als (free) MPS bestand. De objectief constante wordt niet meegeschreven.
+    """
+    _check_scipy()
+    n_ub = lp.A_ub.shape[0]
+    n_eq = lp.A_eq.shape[0]
+    A = sp.vstack([lp.A_ub, lp.A_eq]).tocsc()
+    rhs = np.concatenate([lp.b_ub, lp.b_eq])
+
+    names = []
+    for b in lp.blocks:
+        names.extend(f"{b}({t})" for t in range(lp.n))
+
+    lines = ["NAME SPARSELP", "ROWS", " N obj"]
+    lines.extend(f" L r{i}" for i in range(n_ub))
+    lines.extend(f" E r{n_ub + i}" for i in range(n_eq))
+    lines.append("COLUMNS")
+    indptr, indices, data = A.indptr, A.indices, A.data
+    for j in range(lp.num_vars):
+        name = names[j]
+        if lp.c[j] != 0:
+            lines.append(f" {name} obj {lp.c[j]:.17g}")
+        for k in range(indptr[j], indptr[j + 1]):
+            lines.append(f" {name} r{indices[k]} {data[k]:.17g}")
+    lines.append("RHS")
+    lines.extend(f" rhs r{i} {rhs[i]:.17g}" for i in np.flatnonzero(rhs))
+    lines.append("BOUNDS")
+    for j in range(lp.num_vars):
+        lo, up = lp.lb[j], lp.ub[j]
+        if lo == up:
+            lines.append(f" FX bnd {names[j]} {lo:.17g}")
+            continue
+        if lo != 0:
+            lines.append(f" LO bnd {names[j]} {lo:.17g}")
+        if np.isfinite(up):
+            lines.append(f" UP bnd {names[j]} {up:.17g}")
+    lines.append("ENDATA")
+
+    with open(path, 'w') as f:
+        f.write("\n".join(lines))
+        f.write("\n")
+    return names
+
+
+def _solve_cbc(lp, time_limit, mps_path=None):
+    cbc = resolve_backend('cbc')
+    if cbc is None:
+        raise ValueError("Geen CBC solver beschikbaar")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = mps_path or os.path.join(tmp, 'model.mps')
+        names = write_mps(lp, path)
+        sol_path = os.path.join(tmp, 'model.sol')
+        subprocess.run([cbc, path, '-sec', str(time_limit), '-solve', '-solu', sol_path],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        if not os.path.exists(sol_path):
+            return 'error', None
+
+        x = np.zeros(lp.num_vars)
+        index = {name: j for j, name in enumerate(names)}
+        with open(sol_path) as f:
+            header = f.readline().strip().lower()
+            for line in f:
+                parts = line.replace('**', '').split()
+                if len(parts) >= 3 and parts[1] in index:
+                    x[index[parts[1]]] = float(parts[2])
+        # CBC laat variabelen met waarde 0 weg, behalve gefixeerde
+        fixed = lp.lb == lp.ub
+        x[fixed] = lp.lb[fixed]
+
+    if header.startswith('optimal'):
+        return 'optimal', x
+    if header.startswith('infeasible') or header.startswith('integer infeasible'):
+        return 'infeasible', None
+    if header.startswith('stopped'):
+        return 'maxTimeLimit', x
+    return 'other', x
+
+
+def solve_lp(lp, solver='highs', time_limit=300, mps_path=None):
+    """
+    Los het sparse LP op.
+
+    solver: 'highs' (in-memory via scipy) of 'cbc' (via MPS bestand)
+    Returns: (status, oplossing dict per blok of None, objectief incl. constante of None)
+    """
+    _check_scipy()
+    if solver == 'cbc':
+        status, x = _solve_cbc(lp, time_limit, mps_path)
+    else:
+        if mps_path:
+            write_mps(lp, mps_path)
+        res = linprog(lp.c, A_ub=lp.A_ub, b_ub=lp.b_ub, A_eq=lp.A_eq, b_eq=lp.b_eq,
+                      bounds=np.column_stack([lp.lb, lp.ub]), method='highs',
+                      options={'time_limit': time_limit, 'presolve': True})
+        # linprog status: 0 optimaal, 1 iteratie/tijd limiet, 2 infeasible, 3 unbounded, 4 numeriek
+        status = {0: 'optimal', 1: 'maxTimeLimit', 2: 'infeasible', 3: 'unbounded'}.get(res.status, 'error')
+        x = res.x if res.x is not None and status in ('optimal', 'maxTimeLimit') else None
+
+    if x is None:
+        return status, None, None
+    return status, lp.split(x), float(lp.c @ x) + lp.constant
+
+
+def check_consistency(run_function, config, result_column, columns=None, rel_tol=1e-6, progress_callback=None):
+    """
+    Draai een jaar-model met de Pyomo en met de sparse engine en vergelijk de uitkomsten.
+
+    Het LP objectief moet gelijk zijn. De dispatch kolommen en result_column kunnen bij
+    alternatieve optima verschillen (bv. zelfconsumptie, waar de prijs niet in het doel zit),
+    daarvan rapporteren we de afwijking.
+    """
+    columns = columns or ['energy_charged_kWh', 'energy_discharged_kWh', 'SoC_kWh', 'grid_exchange_kWh']
+    had_engine = hasattr(config, 'LP_ENGINE')
+    original = getattr(config, 'LP_ENGINE', None)
+    try:
+        config.LP_ENGINE = 'pyomo'
+        df_pyomo, summary_pyomo = run_function(config, progress_callback)
+        config.LP_ENGINE = 'sparse'
+        df_sparse, summary_sparse = run_function(config, progress_callback)
+    finally:
+        if had_engine:
+            config.LP_ENGINE = original
+        else:
+            del config.LP_ENGINE
+
+    objective_pyomo = summary_pyomo.get('lp_objective')
+    objective_sparse = summary_sparse.get('lp_objective')
+    report = {
+        'objective_pyomo': objective_pyomo,
+        'objective_sparse': objective_sparse,
+        'total_pyomo': float(df_pyomo[result_column].sum()),
+        'total_sparse': float(df_sparse[result_column].sum()),
+        'cycles_pyomo': summary_pyomo.get('total_cycles'),
+        'cycles_sparse': summary_sparse.get('total_cycles'),
+        'max_column_diff': {col: float(np.max(np.abs(df_pyomo[col].to_numpy() - df_sparse[col].to_numpy())))
+                            for col in columns if col in df_pyomo.columns and col in df_sparse.columns},
+    }
+    if objective_pyomo is None or objective_sparse is None:
+        # Een van beide routes viel terug op de heuristiek
+        report['match'] = False
+    else:
+        report['objective_diff'] = abs(objective_pyomo - objective_sparse)
+        report['match'] = bool(report['objective_diff'] <= rel_tol * max(1.0, abs(objective_pyomo)))
+    return report
+
+
+def run_sparse_engine(build_function, arrays, params, config, progress_callback=None):
+    """
+    Bouw en los een jaar-LP op via de sparse engine, voor gebruik vanuit de modellen.
+
+    config.SPARSE_SOLVER: 'highs' (standaard, in-memory) of 'cbc' (via MPS)
+    config.MPS_EXPORT_PATH: optioneel pad om het MPS bestand te bewaren
+    Returns: (oplossing dict per blok of None, objectief of None)
+    """
+    solver = getattr(config, 'SPARSE_SOLVER', 'highs')
+    mps_path = getattr(config, 'MPS_EXPORT_PATH', None)
+    time_limit = 300  # 5 minuten, zelfde als de Pyomo route
+
+    if progress_callback:
+        progress_callback("Sparse LP matrix opbouwen...")
+    build_start = time.perf_counter()
+    lp = build_function(arrays, params)
+    if progress_callback:
+        progress_callback(f"Sparse LP opgebouwd in {time.perf_counter() - build_start:.1f} s "
+                          f"({lp.num_vars} variabelen, {lp.A_ub.shape[0] + lp.A_eq.shape[0]} constraints)")
+        progress_callback(f"Sparse LP oplossen met {solver}...")
+
+    try:
+        status, solution, objective = solve_lp(lp, solver=solver, time_limit=time_limit, mps_path=mps_path)
+    except Exception as e:
+        if progress_callback:
+            progress_callback(f"Sparse LP solver fout: {str(e)}")
+        return None, None
+
+    if progress_callback:
+        progress_callback(f"Termination condition: {status}")
+    if solution is None:
+        return None, None
+    return solution, objective
+
+
+def _solve_window(build_function, arrays, params, charge_budget_mwh, end_soc, solver, time_limit):
+    """
+    Los één rolling-horizon venster op. charge_budget_mwh vervangt de rechterkant van de
+    cycli constraint (laatste rij van A_ub), end_soc fixeert de SoC op de laatste tijdstap.
+    """
+    lp = build_function(arrays, params)
+    if charge_budget_mwh is not None:
+        lp.b_ub[-1] = max(charge_budget_mwh, 0.0)
+    if end_soc is not None:
+        soc_end = lp.offset('soc') + lp.n - 1
+        lp.lb[soc_end] = lp.ub[soc_end] = end_soc
+    status, solution, _ = solve_lp(lp, solver=solver, time_limit=time_limit)
+    return status, solution
+
+
+def run_rolling_horizon(build_function, arrays, params, config, progress_callback=None):
+    """
+    Rolling-horizon variant van run_sparse_engine: het jaar wordt in vensters opgelost.
+
+    config.ROLLING_WINDOW_DAYS: dagen per venster die worden vastgelegd (standaard 7)
+    config.ROLLING_OVERLAP_DAYS: extra vooruitkijk-dagen per venster, niet vastgelegd (standaard 1)
+    config.ROLLING_PARALLEL: vensters onafhankelijk (en parallel) oplossen; de SoC op elke
+        venstergrens wordt dan op de start SoC vastgezet (standaard False)
+    config.ROLLING_WORKERS: aantal processen voor ROLLING_PARALLEL (standaard alle cores)
+    config.ROLLING_GAP_REPORT: ook het volledige jaar-LP oplossen en de optimality gap rapporteren
+
+    Sequentieel wordt de eind SoC van het vastgelegde deel de start SoC van het volgende venster.
+    De jaarlijkse cycli limiet loopt mee als budget (MWh geladen): elk venster krijgt een
+    evenredig deel van wat nog over is.
+    Returns: (oplossing dict per blok of None, objectief of None, rapport dict)
+    """
+    solver = getattr(config, 'SPARSE_SOLVER', 'highs')
+    window_days = int(getattr(config, 'ROLLING_WINDOW_DAYS', 7))
+    overlap_days = int(getattr(config, 'ROLLING_OVERLAP_DAYS', 1))
+    parallel = bool(getattr(config, 'ROLLING_PARALLEL', False))
+    time_limit = 300  # per venster
+
+    arrays = {k: np.asarray(v, dtype=float) for k, v in arrays.items()}
+    n = len(next(iter(arrays.values())))
+    steps_per_day = int(round(24 / params['time_step_h']))
+    window = max(1, window_days) * steps_per_day
+    overlap = max(0, overlap_days) * steps_per_day
+    starts = list(range(0, n, window))
+
+    has_cycle_limit = params['max_cycles'] > 0 and params['usable_capacity'] > 0
+    total_budget = params['max_cycles'] * params['usable_capacity'] if has_cycle_limit else None
+    dt_ch = params['time_step_h'] * params['eff_ch']
+
+    def window_arrays(a, b):
+        return {k: v[a:b] for k, v in arrays.items()}
+
+    if progress_callback:
+        mode = "parallel" if parallel else "sequentieel"
+        progress_callback(f"Rolling horizon: {len(starts)} vensters van {window_days} dagen "
+                          f"(+{0 if parallel else overlap_days} overlap), {mode}, solver {solver}")
+
+    solve_start = time.perf_counter()
+    parts = []
+    if parallel:
+        # Onafhankelijke vensters: start en eind SoC vast op de start SoC. Het venster loopt één
+        # tijdstap door tot de start van het volgende venster, zodat de grenzen op elkaar aansluiten.
+        jobs = []
+        for a in starts:
+            b = min(a + window, n)
+            end = b + 1 if b < n else b
+            budget = total_budget * (b - a) / n if has_cycle_limit else None
+            jobs.append((window_arrays(a, end), budget, params['start_soc'] if b < n else None, b - a))
+        with ProcessPoolExecutor(max_workers=getattr(config, 'ROLLING_WORKERS', None)) as pool:
+            futures = [pool.submit(_solve_window, build_function, w, params, budget, end_soc, solver, time_limit)
+                       for w, budget, end_soc, _ in jobs]
+            for k, (future, job) in enumerate(zip(futures, jobs), 1):
+                status, solution = future.result()
+                if solution is None:
+                    if progress_callback:
+                        progress_callback(f"Rolling horizon venster {k}/{len(jobs)} faalde: {status}")
+                    return None, None, None
+                parts.append({blk: v[:job[3]] for blk, v in solution.items()})
+                if progress_callback:
+                    progress_callback(f"Rolling horizon venster {k}/{len(jobs)}: {status}")
+    else:
+        current_soc = params['start_soc']
+        remaining_budget = total_budget
+        for k, a in enumerate(starts, 1):
+            b = min(a + window, n)
+            end = min(b + overlap, n)
+            budget = None
+            if has_cycle_limit:
+                budget = remaining_budget * min(1.0, (end - a) / (n - a))
+            window_params = dict(params, start_soc=current_soc)
+            status, solution = _solve_window(build_function, window_arrays(a, end), window_params,
+                                             budget, None, solver, time_limit)
+            if solution is None:
+                if progress_callback:
+                    progress_callback(f"Rolling horizon venster {k}/{len(starts)} faalde: {status}")
+                return None, None, None
+            committed = {blk: v[:b - a] for blk, v in solution.items()}
+            parts.append(committed)
+            if has_cycle_limit:
+                remaining_budget -= float(np.sum(committed['charge'])) * dt_ch
+            # SoC aan het begin van het volgende venster
+            if b < n:
+                current_soc = float(solution['soc'][b - a])
+            if progress_callback:
+                progress_callback(f"Rolling horizon venster {k}/{len(starts)}: {status}")
+    solve_time = time.perf_counter() - solve_start
+
+    # Aan elkaar knopen en het objectief op het volledige jaar-LP uitrekenen
+    full_lp = build_function(arrays, params)
+    solution = {blk: np.concatenate([part[blk] for part in parts]) for blk in full_lp.blocks}
+    x = np.concatenate([solution[blk] for blk in full_lp.blocks])
+    objective = float(full_lp.c @ x) + full_lp.constant
+
+    report = {
+        'windows': len(starts),
+        'window_days': window_days,
+        'overlap_days': 0 if parallel else overlap_days,
+        'parallel': parallel,
+        'solve_time_s': solve_time,
+        'objective': objective,
+    }
+    if getattr(config, 'ROLLING_GAP_REPORT', False):
+        full_start = time.perf_counter()
+        status, _, full_objective = solve_lp(full_lp, solver=solver, time_limit=time_limit)
+        report['full_solve_time_s'] = time.perf_counter() - full_start
+        report['full_status'] = status
+        report['full_objective'] = full_objective
+        if full_objective is not None:
+            report['gap'] = objective - full_objective
+            report['gap_pct'] = report['gap'] / max(1.0, abs(full_objective)) * 100
+            if progress_callback:
+                progress_callback(f"Rolling horizon gap t.o.v. volledig LP: {report['gap']:.2f} "
+                                  f"({report['gap_pct']:.3f}%), {solve_time:.1f} s vs {report['full_solve_time_s']:.1f} s")
+    return solution, objective, report